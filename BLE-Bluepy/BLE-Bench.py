@@ -0,0 +1,1209 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:       BLE-Bench
+# Purpose:      Micro-benchmarks for the BLE service hot paths
+#               Run without Bluetooth hardware: python3 BLE-Bench.py <bench>
+#
+# Created:     18/10/2026
+# Copyright:   (c) Sterwen Technology 2019
+# Licence:     Eclipse 1.0
+#-------------------------------------------------------------------------------
+
+import os, sys
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../bluepy")))
+
+import time
+import struct
+import binascii
+import argparse
+import tempfile
+import subprocess
+import threading
+import select
+
+import btle
+from btle import BluepyHelper
+
+
+def timeit(label, func, count):
+    start = time.perf_counter()
+    func(count)
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed
+    print("%-40s %10d ops %8.3f s %12.0f ops/s" % (label, count, elapsed, rate))
+    return rate
+
+#
+#   scan response decoding
+#
+def scanSamples(nbdev=200):
+    '''
+    Builds scan reports as sent by bluepy-helper, in text and in binary frame
+    '''
+    adv = bytes.fromhex('0201060303AAFE1116AAFE10EB0373736C696E6B6573730707FF99040312345678')
+    lines = []
+    frames = []
+    for i in range(nbdev):
+        addr = bytes((0xC0, 0xFF, 0xEE, 0, i >> 8, i & 0xFF))
+        lines.append('rsp=$scan\x1eaddr=b%s\x1etype=h1\x1erssi=h%X\x1eflag=h0\x1ed=b%s\n' %
+                     (addr.hex().upper(), 40 + (i % 50), adv.hex().upper()))
+        body = b'\x00$\x04scan' + b'\x0fb\x06\x00' + addr
+        body += b'\x10h' + struct.pack('<I', 1) + b'\x11h' + struct.pack('<I', 40 + (i % 50))
+        body += b'\x12h' + struct.pack('<I', 0) + b'\x06b' + struct.pack('<H', len(adv)) + adv
+        frames.append(b'\x02' + struct.pack('<H', len(body)) + body)
+    return lines, frames
+
+def legacyAddr(resp):
+    # address formatting as done by Scanner.process before the ScanResp record
+    addr = binascii.b2a_hex(resp['addr'][0]).decode('utf-8')
+    return ':'.join([addr[i:i+2] for i in range(0,12,2)])
+
+def benchScanParse(count):
+    lines, frames = scanSamples()
+    nb = len(lines)
+
+    def textLegacy(n):
+        for i in range(n):
+            resp = BluepyHelper.parseResp(lines[i % nb])
+            legacyAddr(resp)
+
+    def textFast(n):
+        for i in range(n):
+            BluepyHelper.parseScanLine(lines[i % nb])
+
+    def frameGeneric(n):
+        for i in range(n):
+            resp = BluepyHelper.parseFrame(frames[i % nb], 3)
+            legacyAddr(resp)
+
+    def frameFast(n):
+        for i in range(n):
+            BluepyHelper.parseScanFrame(frames[i % nb])
+
+    ref = timeit("text parseResp + address join", textLegacy, count)
+    fast = timeit("text parseScanLine", textFast, count)
+    print("   speedup x%.2f" % (fast / ref))
+    ref_f = timeit("frame parseFrame + address join", frameGeneric, count)
+    fast_f = timeit("frame parseScanFrame", frameFast, count)
+    print("   speedup x%.2f (x%.2f against text parseResp)" % (fast_f / ref_f, fast_f / ref))
+
+#
+#   stand-in for bluepy-helper, answers the commands without any Bluetooth hardware
+#   started through a 'bluepy-helper' wrapper created by helperDir()
+#
+fakeTags = ( 'rsp', 'code', 'estat', 'emsg', 'hnd', 'uuid', 'd', 'state',
+             'sec', 'mtu', 'dst', 'hstart', 'hend', 'props', 'vhnd', 'addr',
+             'type', 'rssi', 'flag', 'fwd', 'supp', 'nb' )
+
+def fullUUID(short):
+    return "%08x-0000-1000-8000-00805f9b34fb" % short
+
+# GATT database of the stand-in peripherals
+# (uuid, hstart, hend, [(uuid, handle, properties, value handle), ...])
+fakeServices = (
+    (0x1800, 0x01, 0x07, [(0x2A00, 0x02, 0x02, 0x03), (0x2A01, 0x04, 0x02, 0x05)]),
+    (0x1801, 0x08, 0x0F, [(0x2A05, 0x09, 0x20, 0x0A), (0x2B2A, 0x0C, 0x02, 0x0D)]),
+    (0x181A, 0x20, 0x30, [(0x2A6E, 0x21, 0x02, 0x22), (0x2A6F, 0x24, 0x1A, 0x25), (0x2A6D, 0x27, 0x02, 0x28)]),
+)
+fakeDatabaseHash = bytes(range(16))
+
+class FakeHelper:
+
+    def __init__(self):
+        self._binary = os.environ.get('BLUEPY_FRAMING') == 'binary'
+        self._out = sys.stdout.buffer
+        self._state = 'disc'
+        self._mtu = 0
+        self._nbadv = int(os.environ.get('BENCH_NADV', '50'))
+        self._adv = scanSamples(1)[0][0].split('d=b')[1].strip()
+        # notifications sent after the first write on a connection
+        self._nbntfy = int(os.environ.get('BENCH_NTFY', '0'))
+        rate = float(os.environ.get('BENCH_NTFY_RATE', '0'))
+        self._ntfyPeriod = 1.0 / rate if rate > 0 else 0.0
+        self._ntfySent = 0
+        self._ntfyNext = None
+        # emulated radio round trip of the GATT commands
+        self._latency = float(os.environ.get('BENCH_LATENCY', '0'))
+        self._written = 0
+        self._exchanges = 0
+        # scan filter rules (filt command), only rssi, addr and mfg are emulated
+        self._filter = {}
+        # advertisements sent BENCH_ROUNDS times, deduplicated after the dedup command
+        self._rounds = int(os.environ.get('BENCH_ROUNDS', '1'))
+        self._dedup = None
+        self._forwarded = {}
+        # each advertisement followed by a scan response with the name
+        self._scanrsp = os.environ.get('BENCH_SCANRSP') is not None
+        # new addresses on each round
+        self._unique = os.environ.get('BENCH_UNIQUE') is not None
+
+    def send(self, fields):
+        if self._binary:
+            body = bytearray()
+            for tag, t, v in fields:
+                body += bytes((fakeTags.index(tag), ord(t)))
+                if t == 'h':
+                    body += struct.pack('<I', v)
+                elif t == 'b':
+                    body += struct.pack('<H', len(v)) + v
+                else:
+                    e = v.encode('utf-8')
+                    body += bytes((len(e),)) + e
+            self._out.write(b'\x02' + struct.pack('<H', len(body)) + bytes(body))
+        else:
+            items = []
+            for tag, t, v in fields:
+                if t == 'h':
+                    items.append('%s=h%X' % (tag, v))
+                elif t == 'b':
+                    items.append('%s=b%s' % (tag, v.hex().upper()))
+                else:
+                    items.append('%s=%s%s' % (tag, t, v))
+            self._out.write(('\x1e'.join(items) + '\n').encode('utf-8'))
+        self._out.flush()
+
+    def exchange(self, n):
+        # n ATT request / response exchanges
+        self._exchanges += n
+        if self._latency > 0:
+            time.sleep(self._latency * n)
+
+    def segments(self, value):
+        # prepared writes needed for a value
+        return (len(value) // 2 + self.mtu() - 6) // (self.mtu() - 5)
+
+    def mtu(self):
+        return max(self._mtu, 23)
+
+    def value(self, hnd):
+        # characteristic values: 16 bytes hash, 2 bytes elsewhere
+        return fakeDatabaseHash if hnd == 0x0D else struct.pack('<H', hnd)
+
+    def status(self):
+        self.send([('rsp', '$', 'stat'), ('state', '$', self._state), ('mtu', 'h', self._mtu), ('sec', "'", 'low')])
+
+    def mgmt(self):
+        self.send([('rsp', '$', 'mgmt'), ('code', '$', 'success')])
+
+    def filter(self, args):
+        rule = args[0] if len(args) > 0 else None
+        if rule == 'clear':
+            self._filter = {}
+        elif rule == 'addrclr':
+            self._filter['addr'] = set()
+        elif rule in ('addr', 'addrdel'):
+            addrs = set(bytes.fromhex(a.replace(':', '')) for a in args[1:])
+            current = self._filter.setdefault('addr', set())
+            if rule == 'addr':
+                current |= addrs
+            else:
+                current -= addrs
+        elif rule in ('rssi', 'mfg') and len(args) == 2:
+            self._filter[rule] = int(args[1], 0)
+        else:
+            self.send([('rsp', '$', 'filt'), ('code', '$', 'badparam')])
+            return
+        self.send([('rsp', '$', 'filt'), ('code', '$', 'success')])
+
+    def accept(self, addr, rssi, adv):
+        f = self._filter
+        if 'rssi' in f and rssi < f['rssi']:
+            return False
+        if 'addr' in f and addr not in f['addr']:
+            return False
+        if 'mfg' in f:
+            pos = 0
+            while pos + 1 < len(adv):
+                if adv[pos + 1] == 0xFF and adv[pos + 2:pos + 4] == struct.pack('<H', f['mfg']):
+                    return True
+                pos += adv[pos] + 1
+            return False
+        return True
+
+    def forward(self, addr, rssi, adv):
+        # same decision as the helper dedup_forward
+        now = time.time()
+        last = self._forwarded.get(addr)
+        delta, interval = self._dedup
+        if last is not None and last[0] == adv:
+            if not (delta > 0 and abs(rssi - last[1]) >= delta) and not (interval > 0 and now - last[2] >= interval):
+                return False
+        self._forwarded[addr] = (adv, rssi, now)
+        return True
+
+    def scan(self):
+        adv = bytes.fromhex(self._adv)
+        forwarded = suppressed = 0
+        for r in range(self._rounds):
+            for i in range(self._nbadv):
+                if self._unique:
+                    addr = bytes((0xC0, 0xFF, r >> 8, r & 0xFF, i >> 8, i & 0xFF))
+                else:
+                    addr = bytes((0xC0, 0xFF, 0xEE, 0, i >> 8, i & 0xFF))
+                if not self.accept(addr, -(40 + (i % 50)), adv):
+                    continue
+                if self._dedup is not None and not self.forward(addr, -(40 + (i % 50)), adv):
+                    suppressed += 1
+                    continue
+                forwarded += 1
+                # with scan responses, one device out of two is a non connectable beacon
+                beacon = self._scanrsp and (i & 1) == 1
+                self.send([('rsp', '$', 'scan'), ('addr', 'b', addr), ('type', 'h', 1),
+                           ('rssi', 'h', 40 + (i % 50)), ('flag', 'h', 4 if beacon else 0), ('d', 'b', adv)])
+                if self._scanrsp and not beacon:
+                    self.send([('rsp', '$', 'scan'), ('addr', 'b', addr), ('type', 'h', 1),
+                               ('rssi', 'h', 40 + (i % 50)), ('flag', 'h', 0), ('d', 'b', b'\x07\x09SSTAG1')])
+        if self._dedup is not None:
+            self.send([('rsp', '$', 'dstat'), ('fwd', 'h', forwarded), ('supp', 'h', suppressed),
+                       ('nb', 'h', len(self._forwarded))])
+
+    def notify(self):
+        # sends the notifications that are due, returns the delay to the next one
+        now = time.time()
+        while self._ntfySent < self._nbntfy and self._ntfyNext <= now:
+            self.send([('rsp', '$', 'ntfy'), ('hnd', 'h', 0x25), ('d', 'b', struct.pack('<IH', self._ntfySent, 0x1234))])
+            self._ntfySent += 1
+            self._ntfyNext += self._ntfyPeriod
+        if self._ntfySent >= self._nbntfy:
+            self._ntfyNext = None
+            return None
+        return max(0.0, self._ntfyNext - time.time())
+
+    def run(self):
+        self._out.write(b'# bench stand-in helper\n')
+        self._out.flush()
+        fd = sys.stdin.fileno()
+        buf = b''
+        while True:
+            timeout = None if self._ntfyNext is None else self.notify()
+            if len(select.select([fd], [], [], timeout)[0]) == 0:
+                continue
+            data = os.read(fd, 4096)
+            if len(data) == 0:
+                break
+            buf += data
+            while b'\n' in buf:
+                line, buf = buf.split(b'\n', 1)
+                if self.command(line.decode('utf-8').split()):
+                    return
+
+    def command(self, args):
+        # executes one command, returns True on quit
+        if len(args) == 0:
+            return False
+        cmd = args[0]
+        if cmd == 'quit':
+            return True
+        elif cmd == 'stat':
+            self.status()
+        elif cmd in ('le', 'pasvend', 'scanend'):
+            self.mgmt()
+            if cmd != 'le':
+                self._state = 'disc'
+                self.status()
+        elif cmd in ('scan', 'pasv'):
+            self.mgmt()
+            self._state = 'scan'
+            self.status()
+            self.scan()
+        elif cmd == 'conn':
+            self._state = 'tryconn'
+            self.status()
+            self._state = 'conn'
+            self.status()
+        elif cmd == 'disc':
+            self._state = 'disc'
+            self._ntfyNext = None
+            self.status()
+        elif cmd == 'secu':
+            if self._state == 'conn':
+                self.status()
+        elif cmd == 'mtu':
+            self.exchange(1)
+            self._mtu = int(args[1], 16)
+            self.status()
+        elif cmd == 'svcs':
+            self.exchange(len(fakeServices))
+            fields = [('rsp', '$', 'find')]
+            for uuid, hstart, hend, chars in fakeServices:
+                if len(args) < 2 or args[1] == fullUUID(uuid):
+                    fields += [('hstart', 'h', hstart), ('hend', 'h', hend), ('uuid', "'", fullUUID(uuid))]
+            self.send(fields)
+        elif cmd == 'char':
+            self.exchange(2)
+            start, end = int(args[1], 16), int(args[2], 16)
+            fields = [('rsp', '$', 'find')]
+            for svc in fakeServices:
+                for uuid, hnd, props, vhnd in svc[3]:
+                    if start <= hnd <= end:
+                        fields += [('hnd', 'h', hnd), ('props', 'h', props), ('vhnd', 'h', vhnd), ('uuid', "'", fullUUID(uuid))]
+            self.send(fields)
+        elif cmd == 'wrs' and os.environ.get('BENCH_NO_WRS') is None:
+            self._written += len(args[2]) // 2
+            self.send([('rsp', '$', 'wrs')])
+        elif cmd == 'wrq' and os.environ.get('BENCH_NO_WRQ') is None:
+            for value in args[2::2]:
+                self._written += len(value) // 2
+                self.exchange(self.segments(value))
+            self.exchange(1)
+            self.send([('rsp', '$', 'wr')])
+        elif cmd in ('wr', 'wrr'):
+            if len(args) > 2:
+                self._written += len(args[2]) // 2
+                if cmd == 'wrr':
+                    # long values: prepared writes then execute
+                    self.exchange(1 if len(args[2]) // 2 <= self.mtu() - 3 else self.segments(args[2]) + 1)
+            self.send([('rsp', '$', 'wr')])
+            if self._state == 'conn' and self._nbntfy > 0 and self._ntfySent == 0 and self._ntfyNext is None:
+                self._ntfyNext = time.time()
+        elif cmd == 'rd':
+            self.exchange(1)
+            hnd = int(args[1], 16)
+            if hnd == 0xFFFF:
+                # bytes received by write commands
+                self.send([('rsp', '$', 'rd'), ('d', 'b', struct.pack('<I', self._written))])
+            elif hnd == 0xFFFE:
+                # ATT exchanges so far
+                self.send([('rsp', '$', 'rd'), ('d', 'b', struct.pack('<I', self._exchanges))])
+            else:
+                self.send([('rsp', '$', 'rd'), ('d', 'b', self.value(hnd))])
+        elif cmd == 'filt' and os.environ.get('BENCH_NO_FILT') is None:
+            self.filter(args[1:])
+        elif cmd == 'dedup':
+            self._dedup = None if args[1] == 'off' else (int(args[1]), int(args[2]) / 1000.)
+            self.send([('rsp', '$', 'filt'), ('code', '$', 'success')])
+        elif cmd == 'rdm' and os.environ.get('BENCH_NO_RDM') is None:
+            self.exchange(1)
+            data = b''.join([self.value(int(h, 16)) for h in args[1:]])
+            self.send([('rsp', '$', 'rdm'), ('d', 'b', data[:max(self._mtu, 23) - 1])])
+        else:
+            self.send([('rsp', '$', 'err'), ('code', '$', 'badcmd')])
+        return False
+
+def helperDir():
+    '''
+    Creates a directory with bluepy-helper wrappers starting the stand-in helper
+    to be used as btle.solidsense_path
+    '''
+    path = tempfile.mkdtemp(prefix='ble-bench-')
+    for exe in ('bluepy-helper', 'bluepy-helper-dbg'):
+        fn = os.path.join(path, exe)
+        with open(fn, 'w') as fp:
+            fp.write('#!/bin/sh\nexec "%s" "%s" --fake-helper "$@"\n' % (sys.executable, os.path.abspath(__file__)))
+        os.chmod(fn, 0o755)
+    return path
+
+#
+#   startup: process start to first advertisement callback
+#
+startupChild = '''
+import sys, time, os
+sys.path.insert(0, sys.argv[2])
+from BLE_Client import *
+from BLE_Data import *
+t_import = time.time()
+btle.solidsense_path = sys.argv[1]
+
+class StartupCallback(BLE_Service_Callbacks):
+    def advertisementCallback(self, dev):
+        print("%f %f" % (t_import, time.time()), flush=True)
+        os._exit(0)
+
+registerDataServices()
+service = BLE_Service('hci0')
+service.setCallbacks(StartupCallback())
+service.scanAsynch(5.0, False)
+service.scanAsynchWait()
+os._exit(1)
+'''
+
+def benchStartup(count):
+    path = helperDir()
+    here = os.path.dirname(os.path.abspath(__file__))
+    nb = min(count, 20)
+    imports = []
+    first = []
+    for i in range(nb):
+        start = time.time()
+        child = subprocess.run([sys.executable, '-c', startupChild, path, here],
+                               stdout=subprocess.PIPE, universal_newlines=True)
+        if child.returncode != 0:
+            print("startup run failed")
+            return
+        t_import, t_adv = [float(v) for v in child.stdout.split()]
+        imports.append(t_import - start)
+        first.append(t_adv - start)
+    imports.sort()
+    first.sort()
+    print("%-40s %8.1f ms (median of %d runs)" % ("process start to imports done", imports[nb // 2] * 1000., nb))
+    print("%-40s %8.1f ms (median of %d runs)" % ("process start to first advertisement", first[nb // 2] * 1000., nb))
+
+#
+#   notifications: one reactor thread against one listener thread per device
+#
+class CountingDelegate(btle.DefaultDelegate):
+
+    def __init__(self, counter):
+        btle.DefaultDelegate.__init__(self)
+        self._counter = counter
+
+    def handleNotification(self, cHandle, data):
+        with self._counter['lock']:
+            self._counter['n'] += 1
+            if self._counter['n'] >= self._counter['target']:
+                self._counter['done'].set()
+
+def notificationRun(nbdev, nbntfy, rate, reactor):
+    '''
+    Connects nbdev stand-in peripherals each sending nbntfy notifications at rate/s
+    Returns (elapsed, cpu seconds of this process, notifications received)
+    '''
+    from BLE_Client import BLE_Notification_Reactor
+    os.environ['BENCH_NTFY'] = str(nbntfy)
+    os.environ['BENCH_NTFY_RATE'] = str(rate)
+    counter = {'n': 0, 'target': nbdev * nbntfy, 'lock': threading.Lock(), 'done': threading.Event()}
+    peripherals = [btle.Peripheral("c0:ff:ee:00:00:%02x" % i, btle.ADDR_TYPE_RANDOM).withDelegate(CountingDelegate(counter))
+                   for i in range(nbdev)]
+    stopFlag = [False]
+    threads = []
+    start = time.time()
+    cpu = time.process_time()
+    # the write enabling the notifications is done before listening
+    for p in peripherals:
+        p.writeCharacteristic(0x26, b'\x01\x00', True)
+    if reactor:
+        r = BLE_Notification_Reactor.instance()
+        for p in peripherals:
+            r.addPeripheral(p)
+    else:
+        def listen(p):
+            while not stopFlag[0]:
+                p.waitForNotifications(5.0)
+        threads = [threading.Thread(target=listen, args=(p,)) for p in peripherals]
+        for t in threads:
+            t.start()
+    counter['done'].wait(60.0)
+    elapsed = time.time() - start
+    cpu = time.process_time() - cpu
+    stopFlag[0] = True
+    if reactor:
+        for p in peripherals:
+            r.removePeripheral(p)
+    # a listener thread only sees the stop flag after its 5 s wait
+    for t in threads:
+        t.join()
+    for p in peripherals:
+        p.disconnect()
+    return elapsed, cpu, counter['n']
+
+def benchNotifications(count):
+    btle.solidsense_path = helperDir()
+    nbntfy = max(10, min(count, 2000))
+    rate = 100
+    print("%-10s %6s %12s %12s %12s %12s" % ("devices", "", "burst ntf/s", "burst cpu%", "100/s cpu%", "received"))
+    for nbdev in (1, 5, 10, 30):
+        for reactor in (False, True):
+            elapsed, cpu, n = notificationRun(nbdev, nbntfy, 0, reactor)
+            burst = n / elapsed
+            burstCpu = 100. * cpu / elapsed
+            elapsed, cpu, n2 = notificationRun(nbdev, rate, rate, reactor)
+            print("%-10d %6s %12.0f %12.1f %12.1f %12s" % (nbdev, "reactor" if reactor else "thread", burst, burstCpu,
+                                                          100. * cpu / elapsed, "%d/%d" % (n + n2, nbdev * (nbntfy + rate))))
+
+#
+#   timers: re-arming a device idle timeout on each notification
+#
+def benchTimers(count):
+    from BLE_Client import BLE_Timer
+
+    def noop(*args):
+        pass
+
+    def threadTimers(n):
+        timer = None
+        for i in range(n):
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(10.0, noop)
+            timer.start()
+        timer.cancel()
+
+    def schedulerTimers(n):
+        timer = BLE_Timer(noop)
+        for i in range(n):
+            timer.arm(10.0)
+        timer.cancel()
+
+    ref = timeit("threading.Timer cancel + start", threadTimers, min(count, 20000))
+    fast = timeit("BLE_Timer.arm", schedulerTimers, count)
+    print("   speedup x%.1f" % (fast / ref))
+
+#
+#   connect: connection setup with a new helper process or a pooled one
+#
+def benchConnect(count):
+    btle.solidsense_path = helperDir()
+    count = max(10, min(count, 200))
+
+    def connectLoop(n):
+        for i in range(n):
+            p = btle.Peripheral("c0:ff:ee:00:00:%02x" % (i & 0xFF), btle.ADDR_TYPE_RANDOM, 0)
+            p.disconnect()
+
+    ref = timeit("new helper per connection", connectLoop, count)
+    btle.Bluepy_helper_pool(2, 0)
+    pool = btle.HelperPool.instance()
+    while pool.nbIdle(0) < 2:
+        time.sleep(0.01)
+    fast = timeit("pooled helper", connectLoop, count)
+    btle.HelperPool.shutdown()
+    print("   speedup x%.1f  helpers started:%d reused:%d replaced:%d" % (fast / ref, pool.started, pool.reused, pool.replaced))
+
+#
+#   discovery: GATT discovery on each connection against the GATT cache
+#
+def benchDiscovery(count):
+    btle.solidsense_path = helperDir()
+    os.environ['BENCH_LATENCY'] = '0.015'
+    count = max(5, min(count, 50))
+    p = btle.Peripheral("c0:ff:ee:00:00:01", btle.ADDR_TYPE_RANDOM, 0)
+    description = p.servicesDescription()
+
+    def discover(n):
+        for i in range(n):
+            p._serviceMap = None
+            for svc in p.getServices():
+                svc.chars = None
+                svc.getCharacteristics()
+
+    def cached(n):
+        for i in range(n):
+            p.loadServices(description)
+            # Database Hash check
+            p.readCharacteristic(0x0D)
+
+    ref = timeit("discovery, 15 ms round trips", discover, count)
+    fast = timeit("cache + Database Hash read", cached, count)
+    p.disconnect()
+    del os.environ['BENCH_LATENCY']
+    print("   speedup x%.1f" % (fast / ref))
+
+#
+#   reads: one 'rd' per characteristic against ATT Read Multiple
+#
+def benchReads(count):
+    btle.solidsense_path = helperDir()
+    os.environ['BENCH_LATENCY'] = '0.015'
+    count = max(5, min(count, 50))
+    handles = [0x03, 0x05, 0x22, 0x25, 0x28, 0x0A]
+    p = btle.Peripheral("c0:ff:ee:00:00:01", btle.ADDR_TYPE_RANDOM, 0, 63)
+
+    def single(n):
+        for i in range(n):
+            for h in handles:
+                p.readCharacteristic(h)
+
+    def multiple(n):
+        for i in range(n):
+            p.readCharacteristics(handles, [2] * len(handles))
+
+    ref = timeit("6 x rd, 15 ms round trips", single, count)
+    fast = timeit("rdm of 6 handles", multiple, count)
+    p.disconnect()
+    del os.environ['BENCH_LATENCY']
+    print("   latency %.1f ms -> %.1f ms" % (1000. / ref, 1000. / fast))
+
+#
+#   stream: bulk transfer with one write at a time against pipelined writes
+#
+def benchStream(count):
+    btle.solidsense_path = helperDir()
+    size = max(4096, min(count, 1 << 20))
+    blob = os.urandom(size)
+    p = btle.Peripheral("c0:ff:ee:00:00:01", btle.ADDR_TYPE_RANDOM, 0, 247)
+    chunk = p.getMTU() - 3
+
+    def sequential(n):
+        for i in range(n):
+            for pos in range(0, size, chunk):
+                p.writeCharacteristic(0x28, blob[pos:pos + chunk])
+
+    def streamed(n):
+        for i in range(n):
+            p.writeStream(0x28, blob, 16)
+
+    ref = timeit("wr per packet, %d bytes" % size, sequential, 1)
+    fast = timeit("writeStream window 16", streamed, 1)
+    received = struct.unpack('<I', p.readCharacteristic(0xFFFF))[0]
+    p.disconnect()
+    print("   %.0f kB/s -> %.0f kB/s  (received %d/%d)" % (size * ref / 1024., size * fast / 1024., received, 2 * size))
+
+#
+#   longwrites: long values with one prepared write sequence each against queued writes
+#
+def benchLongWrites(count):
+    btle.solidsense_path = helperDir()
+    os.environ['BENCH_LATENCY'] = '0.0075'
+    count = max(2, min(count, 20))
+    values = [(h, os.urandom(300)) for h in (0x22, 0x25, 0x28, 0x0A)]
+
+    def exchanges(p):
+        return struct.unpack('<I', p.readCharacteristic(0xFFFE))[0]
+
+    def run(label, mtu, queued):
+        p = btle.Peripheral("c0:ff:ee:00:00:01", btle.ADDR_TYPE_RANDOM, 0, mtu)
+        start = exchanges(p)
+
+        def write(n):
+            for i in range(n):
+                if queued:
+                    p.writeCharacteristics(values)
+                else:
+                    for h, v in values:
+                        p.writeCharacteristic(h, v, True)
+
+        rate = timeit(label, write, count)
+        print("   %d ATT exchanges per transaction" % ((exchanges(p) - start - 1) // count))
+        p.disconnect()
+        return rate
+
+    ref = run("4 x 300 bytes, wrr each, MTU 63", 63, False)
+    fast = run("4 x 300 bytes, wrq, MTU 247", 247, True)
+    del os.environ['BENCH_LATENCY']
+    print("   latency %.0f ms -> %.0f ms" % (1000. / ref, 1000. / fast))
+
+#
+#   ruuvi: Data Format 3 decoding advert by advert against the batch decoder
+#
+def ruuviPayloads(n):
+    payloads = []
+    for i in range(n):
+        payloads.append(struct.pack('>BBBBHhhhH', 3, i % 200, (i % 40) | (0x80 if i & 1 else 0), i % 100,
+                                    i * 7 % 65536, i % 1000 - 500, -i % 1000, 1000, 2900 + i % 200))
+    return payloads
+
+def benchRuuvi(count):
+    from Ruuvi import RuuviRaw
+    payloads = ruuviPayloads(500)
+    decoder = RuuviRaw(None)
+    count = max(1, count // 1000)
+
+    def single(n):
+        for i in range(n):
+            [decoder.decode_payload(p) for p in payloads]
+
+    def batch(n):
+        for i in range(n):
+            RuuviRaw.decode_batch(payloads)
+
+    ref = timeit("decode_payload x 500", single, count)
+    try:
+        fast = timeit("decode_batch of 500", batch, count)
+    except ImportError as err:
+        print("   %s" % err)
+        return
+    print("   speedup x%.1f" % (fast / ref))
+
+#
+#   ruuvidecoder: advert by advert decoding with RuuviRaw against RuuviDecoder (Data Format 3 and 5)
+#
+def ruuviDF5Payloads(n):
+    payloads = []
+    for i in range(n):
+        payloads.append(struct.pack('>BhHHhhhHBH6s', 5, i * 37 % 20000 - 10000, i * 11 % 40000, i * 7 % 65535,
+                                    i % 1000 - 500, -i % 1000, 1000, ((1400 + i % 200) << 5) | 22, i % 255, i,
+                                    bytes([0xc0, 0xff, 0xee, 0, i >> 8, i & 0xff])))
+    return payloads
+
+def benchRuuviDecoder(count):
+    from Ruuvi import RuuviRaw, RuuviDecoder, RuuviRecord
+    df3 = ruuviPayloads(500)
+    df5 = ruuviDF5Payloads(500)
+    raw = RuuviRaw(None)
+    decoder = RuuviDecoder()
+    record = RuuviRecord()
+    count = max(1, count // 1000)
+
+    def single(n):
+        for i in range(n):
+            for p in df3:
+                raw.decode_payload(p)
+
+    def decode(payloads):
+        def run(n):
+            for i in range(n):
+                for p in payloads:
+                    decoder.decode(p, record)
+        return run
+
+    ref = timeit("RuuviRaw.decode_payload DF3 x 500", single, count)
+    fast = timeit("RuuviDecoder.decode DF3 x 500", decode(df3), count)
+    print("   speedup x%.1f" % (fast / ref))
+    fast = timeit("RuuviDecoder.decode DF5 x 500", decode(df5), count)
+    print("   %.0f DF5 adverts/s" % (fast * 500))
+
+#
+#   servicedata: service data records decoded from the hexadecimal string against the struct registry
+#
+def benchServiceData(count):
+    from BLE_Data import BLE_DataService, registerDataServices
+    registerDataServices()
+    kinds = [(0x2A6E, b'\x29\x09'), (0x2A19, b'\x55'), (0x2AA1, b'\x01\x00\x02\x00\x03\x00'), (0x2A06, b'\x05\x03')]
+    records = [kinds[i % len(kinds)] for i in range(1000)]
+    # 1M records with the default count
+    count = max(1, count // 200)
+
+    def strings(n):
+        for i in range(n):
+            for sid, data in records:
+                BLE_DataService.decode(sid, binascii.b2a_hex(data).decode('ascii'))
+
+    def native(n):
+        for i in range(n):
+            for sid, data in records:
+                BLE_DataService.decodeNative(sid, data)
+
+    ref = timeit("hex string converters x 1000", strings, count)
+    fast = timeit("struct registry x 1000", native, count)
+    print("   %d records: %.2f s -> %.2f s" % (count * 1000, count / ref, count / fast))
+
+#
+#   filters: scan filters evaluated one by one against the compiled predicate
+#
+class FilterResp:
+    # scan report fields used by ScanEntry._update
+    def __init__(self, data, rssi):
+        self.addrType = 1
+        self.rssi = rssi
+        self.flag = 0
+        self.data = data
+
+def benchFilters(count):
+    from BLE_Client import (BLE_Filter_RSSI, BLE_Filter_Whitelist, BLE_Filter_MfgID, BLE_Filter_NameStart,
+                            compileFilters)
+    adv = bytes.fromhex('0201060303AAFE') + b'\x07\x09SSTAG1' + bytes.fromhex('07FF990403123456')
+    entries = []
+    for i in range(500):
+        # the devices are at the end of the whitelist
+        j = 49500 + i
+        e = btle.LazyScanEntry("c0:ff:ee:00:%02x:%02x" % (j >> 8, j & 0xff), 0)
+        e._update(FilterResp(adv, -40 - (i % 50)))
+        entries.append(e)
+    whitelist = ["c0:ff:ee:%02x:%02x:%02x" % (i >> 16, (i >> 8) & 0xff, i & 0xff) for i in range(50000)]
+    listed = BLE_Filter_Whitelist()
+    # former behaviour: linear search in a list
+    listed._auth_addresses = [btle.addrToMac(a) for a in whitelist]
+    filters = [BLE_Filter_NameStart("SSTAG"), BLE_Filter_MfgID(0x0499), BLE_Filter_RSSI(-80)]
+    count = max(1, count // 5000)
+
+    def oneByOne(n):
+        allf = filters + [listed]
+        for i in range(n):
+            for e in entries:
+                for f in allf:
+                    if not f.inFilter(e):
+                        break
+
+    check = compileFilters(filters + [BLE_Filter_Whitelist(whitelist)])
+
+    for e in entries:
+        if check(e) != all(f.inFilter(e) for f in filters + [listed]):
+            print("   compiled filters result differs for %s" % e.addr)
+            return
+
+    def compiled(n):
+        for i in range(n):
+            for e in entries:
+                check(e)
+
+    ref = timeit("inFilter, whitelist of 50000 x 500", oneByOne, count)
+    fast = timeit("compiled filters x 500", compiled, count)
+    print("   speedup x%.1f" % (fast / ref))
+
+#
+#   pushdown: scan with a whitelist of 5% of the advertising devices, filtered in Python against the helper
+#
+def benchPushDown(count):
+    from BLE_Client import BLE_Service, BLE_Service_Callbacks, BLE_Filter_Whitelist
+    from BLE_Data import registerDataServices
+    registerDataServices()
+    btle.solidsense_path = helperDir()
+    nadv = 2000
+    os.environ['BENCH_NADV'] = str(nadv)
+    whitelist = ["c0:ff:ee:00:%02x:%02x" % (i >> 8, i & 0xff) for i in range(0, nadv, 20)]
+    count = max(1, min(count // 20000, 10))
+
+    class Counter(BLE_Service_Callbacks):
+        def __init__(self):
+            BLE_Service_Callbacks.__init__(self)
+            self.nb = 0
+
+        def advertisementCallback(self, dev):
+            self.nb += 1
+
+        def scanEndCallback(self, service):
+            pass
+
+    def run(label):
+        service = BLE_Service('hci0')
+        callbacks = Counter()
+        service.setCallbacks(callbacks)
+        service.addFilter(BLE_Filter_Whitelist(whitelist))
+        cpu = 0.0
+        for i in range(count):
+            start = time.process_time()
+            service.scanSynch(0.3, False)
+            cpu += time.process_time() - start
+        received = len(service._scanner.scanned)
+        print("%-40s %8.1f ms CPU per scan, %d reports received, %d devices reported" %
+              (label, cpu * 1000. / count, received, callbacks.nb // count))
+        return cpu
+
+    os.environ['BENCH_NO_FILT'] = '1'
+    ref = run("filtered in Python")
+    del os.environ['BENCH_NO_FILT']
+    fast = run("filtered by the helper")
+    del os.environ['BENCH_NADV']
+    print("   CPU x%.1f" % (ref / fast))
+
+#
+#   dedup: beacons repeating the same advertisement, all forwarded against deduplicated by the helper
+#
+def benchDedup(count):
+    btle.solidsense_path = helperDir()
+    os.environ['BENCH_NADV'] = '200'
+    os.environ['BENCH_ROUNDS'] = '50'
+
+    class Counter(btle.DefaultDelegate):
+        def __init__(self):
+            btle.DefaultDelegate.__init__(self)
+            self.reports = 0
+
+        def handleDiscovery(self, scanEntry, isNewDev, isNewData):
+            self.reports += 1
+
+    def run(label, dedup):
+        scanner = btle.Scanner(0, lazy=True)
+        counter = Counter()
+        scanner.withDelegate(counter)
+        if dedup:
+            scanner.setDeduplication(3, 10.0, 60)
+        start = time.process_time()
+        scanner.scan(0.5)
+        cpu = time.process_time() - start
+        print("%-40s %8.1f ms CPU, %d reports handled" % (label, cpu * 1000., counter.reports))
+        if dedup:
+            print("   helper: %(forwarded)d forwarded %(suppressed)d suppressed %(addresses)d addresses" % scanner.dedupStats)
+        return cpu
+
+    ref = run("200 beacons x 50 adverts", False)
+    fast = run("deduplicated by the helper", True)
+    del os.environ['BENCH_NADV']
+    del os.environ['BENCH_ROUNDS']
+    print("   CPU x%.1f" % (ref / fast))
+
+#
+#   coalesce: active scan reports dispatched one by one against merged advertisement and scan response
+#
+def benchCoalesce(count):
+    btle.solidsense_path = helperDir()
+    os.environ['BENCH_NADV'] = '500'
+    os.environ['BENCH_ROUNDS'] = '4'
+    os.environ['BENCH_SCANRSP'] = '1'
+
+    class Counter(btle.DefaultDelegate):
+        def __init__(self):
+            btle.DefaultDelegate.__init__(self)
+            self.updates = 0
+            self.partial = 0
+
+        def handleDiscovery(self, scanEntry, isNewDev, isNewData):
+            self.updates += 1
+            if scanEntry.connectable and (scanEntry.getRawValue(0x09) is None or scanEntry.getRawValue(0x16) is None):
+                self.partial += 1
+
+    def run(label, window):
+        scanner = btle.Scanner(0, lazy=True)
+        counter = Counter()
+        scanner.withDelegate(counter)
+        scanner.setCoalescing(window)
+        start = time.process_time()
+        scanner.scan(0.5)
+        cpu = time.process_time() - start
+        print("%-40s %8.1f ms CPU, %d updates dispatched, %d partial" % (label, cpu * 1000., counter.updates, counter.partial))
+        return counter.updates
+
+    ref = run("500 devices x 4 adverts, 250 scan responses", 0.0)
+    merged = run("coalescing window 50 ms", 0.05)
+    for v in ('BENCH_NADV', 'BENCH_ROUNDS', 'BENCH_SCANRSP'):
+        del os.environ[v]
+    print("   callbacks x%.2f" % (merged / ref))
+
+#
+#   devicestore: continuous scan of random addresses, unbounded device table against max_devices
+#
+def benchDeviceStore(count):
+    import tracemalloc
+    import BLE_Client
+    from BLE_Client import BLE_Service, BLE_Service_Callbacks
+    from BLE_Data import registerDataServices
+    registerDataServices()
+    btle.solidsense_path = helperDir()
+    os.environ['BENCH_NADV'] = '1000'
+    os.environ['BENCH_ROUNDS'] = str(max(2, min(count // 20000, 20)))
+    os.environ['BENCH_UNIQUE'] = '1'
+
+    class Lost(BLE_Service_Callbacks):
+        def __init__(self):
+            BLE_Service_Callbacks.__init__(self)
+            self.lost = 0
+
+        def advertisementCallback(self, dev):
+            pass
+
+        def deviceLostCallback(self, dev):
+            self.lost += 1
+
+        def scanEndCallback(self, service):
+            pass
+
+    def run(label, max_devices):
+        BLE_Client.blegw_parameters = {'max_devices': max_devices}
+        service = BLE_Service('hci0')
+        callbacks = Lost()
+        service.setCallbacks(callbacks)
+        tracemalloc.start()
+        start = time.process_time()
+        # long enough for all the reports under tracemalloc
+        service.scanSynch(1.0 + int(os.environ['BENCH_ROUNDS']) * 0.5, False)
+        cpu = time.process_time() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        stats = {}
+        service.deviceStoreDict(stats)
+        print("%-40s %8.1f ms CPU %8.0f kB, %d devices %d scan entries, %d lost" %
+              (label, cpu * 1000., size / 1024., stats['devices'], len(service._scanner.scanned), callbacks.lost))
+
+    nb = int(os.environ['BENCH_NADV']) * int(os.environ['BENCH_ROUNDS'])
+    run("%d random addresses, unbounded" % nb, 0)
+    run("%d random addresses, max_devices 1000" % nb, 1000)
+    BLE_Client.blegw_parameters = None
+    for v in ('BENCH_NADV', 'BENCH_ROUNDS', 'BENCH_UNIQUE'):
+        del os.environ[v]
+
+
+#
+#   memory: bytes per tracked device (scan entry, device and table entry)
+#
+class LegacyScanEntry:
+    # dict backed LazyScanEntry with the address string, as before __slots__
+    addrTypes = btle.ScanEntry.addrTypes
+    maxPayloads = btle.LazyScanEntry.maxPayloads
+    _update = btle.LazyScanEntry._update
+    _fields = btle.LazyScanEntry._fields
+    scanData = btle.LazyScanEntry.scanData
+    getValue = btle.ScanEntry.getValue
+    _decodeValue = btle.ScanEntry._decodeValue
+    getServiceDataRaw = btle.LazyScanEntry.getServiceDataRaw
+
+    def __init__(self, addr, iface):
+        self.addr = addr
+        self.iface = iface
+        self.addrType = None
+        self.rssi = None
+        self.connectable = False
+        self.rawData = None
+        self.scanData = {}
+        self.updateCount = 0
+        self._raw = {}
+        self._serviceRaw = {}
+        self._seen = 0.0
+        self._payloads = {}
+        self._scanData = None
+        self._scanList = None
+
+def benchMemory(count):
+    import tracemalloc
+    import collections
+    from BLE_Client import BLE_Device, BLE_Device_Store
+    from BLE_Data import registerDataServices
+    registerDataServices()
+    adv = bytes.fromhex('020106') + b'\x07\x09SSTAG1' + bytes.fromhex('07FF990403123456')
+
+    class LegacyDevice:
+        # BLE_Device attributes before __slots__, synchronization objects created upfront
+        fromScanData = BLE_Device.fromScanData
+
+        def __init__(self, scan_entry, ble_s):
+            self._p = None
+            self._ble_s = ble_s
+            self._connectable = False
+            self._connected = False
+            self._addr = scan_entry.addr
+            self._addrType = scan_entry.addrType
+            self._name = None
+            self._flags = 0
+            self._rssi = -200
+            self._services = None
+            self._channels = None
+            self._service_data = None
+            self._adv_time_stamp = 0.0
+            self._adv_last_report = 0.0
+            self._mfgID = None
+            self._discovered = False
+            self._advType = 0
+            self._notifListener = False
+            self._disconnectTimer = None
+            self._serviceChanged = None
+            self._valueLengths = {}
+            self._readMultiple = True
+            self._transacLock = threading.Lock()
+            self._transacEvent = threading.Event()
+            self._transacEvent.set()
+
+    def legacy(n):
+        scanned = {}
+        devices = collections.OrderedDict()
+        for i in range(n):
+            addr = btle.macToAddr(0xC0FFEE000000 + i)
+            e = LegacyScanEntry(addr, 0)
+            e._update(FilterResp(adv[:-1] + bytes((i & 0xff,)), -40 - (i % 50)))
+            scanned[addr] = e
+            dev = LegacyDevice(e, None)
+            dev.fromScanData(e)
+            devices[addr] = [time.monotonic(), dev]
+        return scanned, devices
+
+    def compact(n):
+        scanned = {}
+        devices = BLE_Device_Store()
+        for i in range(n):
+            mac = 0xC0FFEE000000 + i
+            e = btle.LazyScanEntry(mac, 0)
+            e._update(FilterResp(adv[:-1] + bytes((i & 0xff,)), -40 - (i % 50)))
+            scanned[mac] = e
+            dev = BLE_Device(e, None)
+            dev.fromScanData(e)
+            devices.add(dev)
+        return scanned, devices
+
+    def measure(label, build, n):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        tables = build(n)
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del tables
+        print("%-40s %8.0f bytes per device" % (label, size / n))
+
+    for n in (10000, 100000):
+        measure("%d devices, dict based" % n, legacy, n)
+        measure("%d devices, __slots__" % n, compact, n)
+
+
+#
+#   snapshot: aggregates over the device table, list of dicts against the columns
+#
+def benchSnapshot(count):
+    import collections
+    from BLE_Client import BLE_Device, BLE_Device_Store
+    import BLE_Client
+    from BLE_Data import registerDataServices
+    registerDataServices()
+    store = BLE_Device_Store()
+    for i in range(10000):
+        adv = bytes.fromhex('020106') + bytes.fromhex('05FF') + struct.pack('<HH', 0x0499 + (i % 8), i & 0xffff)
+        e = btle.LazyScanEntry(0xC0FFEE000000 + i, 0)
+        e._update(FilterResp(adv, -40 - (i % 50)))
+        dev = BLE_Device(e, None)
+        dev.fromScanData(e)
+        store.add(dev)
+    nbdev = len(store)
+    count = max(1, count // 20000)
+    numpy = BLE_Client.numpy
+
+    def dicts(n):
+        # as devicesDict then the uplink aggregates
+        for i in range(n):
+            devs = []
+            for addr, dev in store.items():
+                devs.append({'address': addr, 'rssi': dev.rssi(), 'mfg_id': dev.mfgID(),
+                             'connectable': dev.isConnectable(), 'timestamp': dev.getAdvTS()})
+            mean = sum(d['rssi'] for d in devs) / len(devs)
+            connectable = sum(1 for d in devs if d['connectable'])
+            mfgs = collections.Counter(d['mfg_id'] for d in devs)
+            strongest = sorted(devs, key=lambda d: d['rssi'], reverse=True)[:100]
+
+    def columns(n):
+        for i in range(n):
+            snap = store.snapshot()
+            rssi = snap['rssi']
+            mean = sum(rssi) / len(rssi)
+            connectable = sum(snap['connectable'])
+            mfgs = collections.Counter(snap['mfg_id'])
+            strongest = sorted(range(len(rssi)), key=rssi.__getitem__, reverse=True)[:100]
+
+    def vectorized(n):
+        for i in range(n):
+            snap = store.snapshot(True)
+            rssi = snap['rssi']
+            mean = rssi.mean()
+            connectable = snap['connectable'].sum()
+            mfgs = numpy.unique(snap['mfg_id'], return_counts=True)
+            strongest = snap['address'][numpy.argsort(-rssi.astype(numpy.int16), kind='stable')[:100]]
+
+    ref = timeit("%d devices, list of dicts" % nbdev, dicts, count)
+    fast = timeit("%d devices, array snapshot" % nbdev, columns, count)
+    print("   speedup x%.1f" % (fast / ref))
+    if numpy is not None:
+        fast = timeit("%d devices, numpy snapshot" % nbdev, vectorized, count)
+        print("   speedup x%.1f" % (fast / ref))
+    devs = store.values()
+
+    def sync(n):
+        for i in range(n):
+            store.updated(devs[i % nbdev])
+
+    timeit("column update per report", sync, count * 10000)
+
+
+benchmarks = {
+    'scanparse': benchScanParse,
+    'startup': benchStartup,
+    'notifications': benchNotifications,
+    'timers': benchTimers,
+    'connect': benchConnect,
+    'discovery': benchDiscovery,
+    'reads': benchReads,
+    'stream': benchStream,
+    'longwrites': benchLongWrites,
+    'ruuvi': benchRuuvi,
+    'ruuvidecoder': benchRuuviDecoder,
+    'servicedata': benchServiceData,
+    'filters': benchFilters,
+    'pushdown': benchPushDown,
+    'dedup': benchDedup,
+    'coalesce': benchCoalesce,
+    'devicestore': benchDeviceStore,
+    'memory': benchMemory,
+    'snapshot': benchSnapshot,
+}
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--fake-helper':
+        FakeHelper().run()
+        return
+    parser = argparse.ArgumentParser(description="BLE service micro-benchmarks")
+    parser.add_argument('bench', nargs='*', help="benchmarks to run among: %s (all by default)" % ", ".join(sorted(benchmarks.keys())))
+    parser.add_argument('-n', '--count', type=int, default=200000, help="number of iterations")
+    args = parser.parse_args()
+    names = args.bench if args.bench else sorted(benchmarks.keys())
+    for name in names:
+        if name not in benchmarks:
+            parser.error("unknown benchmark: %s" % name)
+    for name in names:
+        print("==== %s" % name)
+        benchmarks[name](args.count)
+
+if __name__ == '__main__':
+    main()
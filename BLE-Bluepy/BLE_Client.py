@@ -10,28 +10,41 @@
 # Copyright:   (c) Laurent Carre - Sterwen Technology 2019
 # Licence:     Eclipse 1.0
 #-------------------------------------------------------------------------------
-# update path to include BLE directory
-import os, sys, inspect
-cmd_subfolder = os.path.realpath(os.path.abspath(os.path.join(os.path.split(inspect.getfile( inspect.currentframe() ))[0], "../bluepy")))
-sys.path.insert(0, cmd_subfolder)
+# update path to include BLE directory (only when not already reachable)
+import os, sys
+cmd_subfolder = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../bluepy"))
+if cmd_subfolder not in sys.path:
+    sys.path.insert(0, cmd_subfolder)
 
-import datetime
 import time
-import fileinput
 import logging
 import threading
-from concurrent import futures
+import queue
+import select
+import heapq
+import itertools
+import collections
 import binascii
 import struct
 import json
+import array
+import atexit
+
+try:
+    import numpy
+except ImportError:
+    # only needed for the NumPy snapshots of the device table
+    numpy = None
 
 import btle
-from btle import Scanner, DefaultDelegate, Peripheral, UUID, BTLEException
+from btle import Scanner, DefaultDelegate, Peripheral, UUID, BTLEException, addrToMac, macToAddr
 
 from BLE_Data import *
 
 blelog=logging.getLogger('BLEService')
 
+_uint16=struct.Struct('<H')
+
 class BLE_ServiceException(Exception):
     pass
 
@@ -59,7 +72,15 @@ class Channel:
         """
         Perform a GATT read
         """
+        val_raw=self.readRaw()
+        if val_raw == None :
+            return None
+        return self.decode(val_raw,typeVar)
 
+    def readRaw(self):
+        """
+        GATT read without decoding, None on error
+        """
         if self._device.connected():
             if self.supportsRead():
                 try:
@@ -67,14 +88,10 @@ class Channel:
                     # print("***************GATT Read: (",len(val_raw),")",type(val_raw)," val:",val_raw)
                 except (IOError,BTLEException) as err:
                     blelog.error ("BLE GATT read"+str(err) )
+                    self._device.checkGATTError(err)
                     return None
-                # now let's decode the result
-                try:
-                    val = BLE_convert(val_raw,typeVar)
-                    return val
-                except ValueError :
-                    blelog.error("BLE GATT read value decode error type:"+str(typeVar)+" ="+str(val_raw))
-                    return None
+                self._device.learnValueLength(self._handle,len(val_raw))
+                return val_raw
             else:
                 blelog.error("BLE GATT Read not supported by:"+self.uuidStr())
                 return None
@@ -82,6 +99,14 @@ class Channel:
             blelog.error ("BLE GATT read device not connected")
             return None
 
+    def decode(self,val_raw,typeVar):
+        try:
+            val = BLE_convert(val_raw,typeVar)
+            return val
+        except ValueError :
+            blelog.error("BLE GATT read value decode error type:"+str(typeVar)+" ="+str(val_raw))
+            return None
+
     def write(self,data,typeVar):
         """
         Perform a GATT Write
@@ -92,15 +117,40 @@ class Channel:
                 try:
                     if type(data)== str :
                         data=data.encode()
-                    self._char.write(data)
+                    # long values are sent with prepared writes
+                    self._char.write(data,len(data) > self._device.mtu()-3)
                 except (IOError,BTLEException) as err:
                     blelog.error("BLE GATT Write"+str(err))
+                    self._device.checkGATTError(err)
                     raise BLE_ServiceException("BLE GATT Write"+str(err))
             else:
                 raise BLE_ServiceException("BLE GATT Write not supported by:"+self.uuidStr())
         else:
             blelog.error ("BLE GATT write device not connected")
 
+    def writeStream(self,data,window=None):
+        """
+        Bulk transfer with pipelined write commands (no response)
+        data is bytes-like or an iterator of bytes-like objects
+        returns the number of bytes written
+        """
+        if not self._device.connected():
+            raise BLE_ServiceException("BLE GATT write stream device not connected")
+        if not self._char.properties & btle.Characteristic.props["WRITE_NO_RESP"] :
+            raise BLE_ServiceException("BLE GATT Write without response not supported by:"+self.uuidStr())
+        if window == None :
+            window=getparam('stream_window',8)
+        if type(data) == str :
+            data=data.encode()
+        try:
+            size=self._char.writeStream(data,window)
+        except (IOError,BTLEException) as err:
+            blelog.error("BLE GATT Write stream"+str(err))
+            self._device.checkGATTError(err)
+            raise BLE_ServiceException("BLE GATT Write stream"+str(err))
+        blelog.debug("BLE GATT Write stream on Channel: "+self.uuidStr()+" "+str(size)+" bytes")
+        return size
+
 
     def getDescriptors(self):
         # print("reading the descriptors")
@@ -206,14 +256,24 @@ class BLE_Device :
     Proxy for a BLE device with or without GATT server capabilities
     The object is created from a scan entry
     BLE_Device shall be instantiated only by BLE_Service.addDevice()
+    The address is kept as a 48 bits integer and the synchronization objects
+    are only created on the first transaction
 
     """
+    __slots__=('_p','_ble_s','_connectable','_connected','_mac','_addrType','_name','_flags','_rssi',
+               '_services','_channels','_service_data','_adv_time_stamp','_adv_last_report','_mfgID',
+               '_mfg_data','_discovered','_advType','_notifListener','_notifChannels','_disconnectTimer',
+               '_serviceChanged','_valueLengths','_readMultiple','_transacLock','_transacEvent',
+               '_connectTS','_interface','_Eddystone_Frame_Type','_Eddystone_Frame','_iBeaconUUID',
+               '_iBeaconPower')
+    _syncLock=threading.Lock()
+
     def __init__(self,scan_entry,ble_s):
         self._p=None
         self._ble_s=ble_s
         self._connectable=False
         self._connected=False
-        self._addr=scan_entry.addr
+        self._mac=scan_entry.mac
         self._addrType=  scan_entry.addrType
         self._name=None
         self._flags=0
@@ -226,22 +286,24 @@ class BLE_Device :
         self._mfgID=None
         self._discovered=False
         self._advType=BLE_Adv_STANDARD
-        self._notifListener=None
+        self._notifListener=False
         self._disconnectTimer=None
-        self._transacLock=threading.Lock()    # exclusion lock
-        self._transacEvent=threading.Event()  # event on transaction
-        self._transacEvent.set()
+        self._serviceChanged=None
+        self._valueLengths=None     # handle: length of the value, 0 if variable
+        self._readMultiple=True     # False when the device rejects Read Multiple
+        self._transacLock=None      # exclusion lock
+        self._transacEvent=None     # event on transaction
 
     def initDevConnect(self):
         self._services=None
         self._channels=None
         self._service_data=None
         self._discovered=False
-        self._notifListener=None
+        self._notifListener=False
+        self._serviceChanged=None
         self._disconnectTimer=None
-        self._transacLock=threading.Lock()    # exclusion lock
-        self._transacEvent=threading.Event()  # event on transaction
-        self._transacEvent.set()
+        self._transacLock=None
+        self._transacEvent=None
 
     def connect(self):
         """
@@ -252,7 +314,7 @@ class BLE_Device :
             dev_name=""
         else:
             dev_name=self._name
-        blelog.info ("BLE GATT connecting: "+str(self._addr)+" type "+str(self._addrType)+" Name:"+dev_name)
+        blelog.info ("BLE GATT connecting: "+self.address()+" type "+str(self._addrType)+" Name:"+dev_name)
         if not self._connectable :
             blelog.info("BLE GATT connect : Device is not connectable")
             return False
@@ -273,9 +335,10 @@ class BLE_Device :
         return True
 
     def _innerConnect(self):
-        mtu=getparam('notif_MTU')
+        mtu=self._ble_s.deviceMTU(self.address())
         try:
-            self._p= Peripheral(self._addr,self._addrType,self._ble_s.ifNumber(),mtu)
+            self._p= Peripheral(self.address(),self._addrType,self._ble_s.ifNumber(),mtu)
+            self._ble_s.setDeviceMTU(self.address(),self._p.getMTU())
             return False    # no error
         except BTLEException as err:
             blelog.error ("BLE GATT Connect: "+str(err))
@@ -288,27 +351,36 @@ class BLE_Device :
         return True if the device needs to be disconnected due to failures
         """
         if not self._connected :
-            blelog.error("BLE GATT Discover "+self._addr+" disconnected")
+            blelog.error("BLE GATT Discover "+self.address()+" disconnected")
             return False
 
-
+        cached=self._cachedServices()
         if type(service_uuid) == type(None):
-            try:
-                services=self._p.getServices()
-            except btle.BTLEException as err:
-                blelog.error("BLE GATT Discover "+self._addr+" services:"+str(err))
-                return True
+            if cached != None :
+                services=cached
+            else:
+                try:
+                    services=self._p.getServices()
+                except btle.BTLEException as err:
+                    blelog.error("BLE GATT Discover "+self.address()+" services:"+str(err))
+                    return True
             self._services=[]
             for s in services :
                 self._services.append(BLE_GATT_Service(s))
 
         else :
             service_uuid=UUID(service_uuid)
-            try:
-                service=self._p.getServiceByUUID(service_uuid)
-            except btle.BTLEException as err:
-                blelog.info("BLE GATT Discover "+self._addr+" UUID:"+str(service_uuid)+" :"+str(err))
-                return False
+            service=None
+            if cached != None :
+                for s in cached :
+                    if s.uuid == service_uuid :
+                        service=s
+            if service == None :
+                try:
+                    service=self._p.getServiceByUUID(service_uuid)
+                except btle.BTLEException as err:
+                    blelog.info("BLE GATT Discover "+self.address()+" UUID:"+str(service_uuid)+" :"+str(err))
+                    return False
             self._services=[BLE_GATT_Service(service)]
 
         self._channels={}
@@ -316,7 +388,7 @@ class BLE_Device :
             try:
                 cl=service.sbpy().getCharacteristics()
             except btle.BTLEException as err:
-                blelog.error("BLE GATT Discover "+self._addr+" characteristics:"+str(err))
+                blelog.error("BLE GATT Discover "+self.address()+" characteristics:"+str(err))
                 return True
             for c in cl :
                 st= c.uuid
@@ -325,12 +397,164 @@ class BLE_Device :
                 service.addCharacteristic(c)
 
         self._discovered=True
-        blelog.debug("BLE GATT "+self._addr+" Discovered")
+        blelog.debug("BLE GATT "+self.address()+" Discovered")
+        if cached == None and service_uuid == None :
+            self._storeServices()
+        if self._ble_s.gattCache() != None :
+            self._watchServiceChanged()
         return False
 
+    def _watchServiceChanged(self):
+        """
+        enables the indications of the Service Changed characteristic
+        an indication invalidates the cached database (handleNotification)
+        """
+        channel=self.channel(BLE_GATT_Cache.SERVICE_CHANGED)
+        if channel == None :
+            return
+        if channel.writeDesciptor(0x2902,b'\x02\x00') :
+            return
+        self._serviceChanged=channel.handle()
+        if not isinstance(self._p.delegate,BLE_Device_Delegate) :
+            self._p.withDelegate(BLE_Device_Delegate(self))
+
+    def _cachedServices(self):
+        """
+        services from the GATT cache after checking the Database Hash
+        None if the device is not cached or the cache is outdated
+        """
+        cache=self._ble_s.gattCache()
+        if cache == None :
+            return None
+        entry=cache.get(self.address())
+        if entry == None :
+            return None
+        if cache.expired(entry) :
+            cache.invalidate(self.address())
+            return None
+        if entry['hash'] != None :
+            handle=BLE_GATT_Cache.findHandle(entry,BLE_GATT_Cache.DATABASE_HASH)
+            try:
+                dbHash=self._p.readCharacteristic(handle).hex()
+            except (btle.BTLEException,TypeError) as err:
+                blelog.info("BLE GATT cache "+self.address()+" Database Hash read:"+str(err))
+                dbHash=None
+            if dbHash != entry['hash'] :
+                cache.invalidate(self.address())
+                return None
+        blelog.debug("BLE GATT "+self.address()+" services from cache")
+        return list(self._p.loadServices(entry['services']).values())
+
+    def learnValueLength(self,handle,length):
+        # a characteristic is read in batches once its value length is known and stable
+        if self._valueLengths is None :
+            self._valueLengths={}
+        known=self._valueLengths.get(handle)
+        if known == None :
+            self._valueLengths[handle]=length
+        elif known != length :
+            self._valueLengths[handle]=0
+
+    def readValues(self,channels):
+        """
+        Reads the raw values of the channels (None on error)
+        The characteristics with a known fixed length are grouped in
+        ATT Read Multiple requests fitting in the MTU
+        """
+        values=[None]*len(channels)
+        single=[]
+        batches=[]
+        if self._readMultiple and self._valueLengths is not None :
+            limit=self._p.getMTU()-1
+            batch=[]
+            size=0
+            for i,c in enumerate(channels):
+                length=self._valueLengths.get(c.handle(),0)
+                if length == 0 or length >= limit or not c.supportsRead() :
+                    single.append(i)
+                    continue
+                if size+length > limit :
+                    batches.append(batch)
+                    batch=[]
+                    size=0
+                batch.append(i)
+                size += length
+            batches.append(batch)
+        else:
+            single=list(range(len(channels)))
+
+        for batch in batches :
+            if len(batch) < 2 :
+                single.extend(batch)
+                continue
+            handles=[channels[i].handle() for i in batch]
+            try:
+                raw=self._p.readCharacteristics(handles,[self._valueLengths[h] for h in handles])
+            except btle.BTLEGattError as err:
+                if err.estat == 0x06 :
+                    # Request not supported
+                    blelog.info("BLE GATT "+self.address()+" Read Multiple not supported")
+                    self._readMultiple=False
+                else:
+                    blelog.debug("BLE GATT Read Multiple "+self.address()+" :"+str(err))
+                single.extend(batch)
+                continue
+            except btle.BTLEInternalError as err:
+                # lengths have changed, learn them again
+                blelog.debug("BLE GATT Read Multiple "+self.address()+" :"+str(err))
+                for h in handles:
+                    del self._valueLengths[h]
+                single.extend(batch)
+                continue
+            except btle.BTLEException as err:
+                blelog.info("BLE GATT Read Multiple "+self.address()+" :"+str(err))
+                if not isinstance(err,btle.BTLEDisconnectError):
+                    # helper without Read Multiple
+                    self._readMultiple=False
+                single.extend(batch)
+                continue
+            for i,v in zip(batch,raw):
+                values[i]=v
+
+        for i in sorted(single) :
+            values[i]=channels[i].readRaw()
+        return values
+
+    def checkGATTError(self,err):
+        # an invalid handle means that the GATT database is not the cached one
+        if isinstance(err,btle.BTLEGattError) and err.estat in (0x01,0x0A) :
+            cache=self._ble_s.gattCache()
+            if cache != None :
+                cache.invalidate(self.address())
+            self._discovered=False
+
+    def _storeServices(self):
+        cache=self._ble_s.gattCache()
+        if cache == None :
+            return
+        try:
+            services=self._p.servicesDescription()
+        except btle.BTLEException as err:
+            blelog.error("BLE GATT cache "+self.address()+" :"+str(err))
+            return
+        dbHash=None
+        channel=self.channel(BLE_GATT_Cache.DATABASE_HASH)
+        if channel != None :
+            try:
+                dbHash=channel._char.read().hex()
+            except btle.BTLEException as err:
+                blelog.info("BLE GATT cache "+self.address()+" Database Hash read:"+str(err))
+                return
+        cache.put(self.address(),services,dbHash)
+
     def connected(self):
         return self._connected
 
+    def mtu(self):
+        if self._p == None :
+            return 23
+        return self._p.getMTU()
+
     def discovered(self):
         return self._discovered
 
@@ -345,27 +569,38 @@ class BLE_Device :
             blelog.debug("BLE Device "+self.name()+ " Disconnect request")
             if self._disconnectTimer != None:
                 self._disconnectTimer.cancel()
-            if self._notifListener != None :
-                self._notifListener.stopListen()
+            if self._notifListener :
+                BLE_Notification_Reactor.instance().removePeripheral(self._p)
             # print("*************Actual disconnect for:",self.name())
             self._p.disconnect()
-            # print("## Disconnect done wait for listiner to stop")
-            if self._notifListener != None :
-                self._notifListener.join()
-            # print("## Listener stopped")
             self._connected=False
             # self._discovered=False
-            self._notifListener=None
-            self._disconnectTimer=None
+            self._notifListener=False
             self._ble_s.devDisconnected(self)
             self.endTransaction()
             blelog.info("BLE GATT device:"+self.name()+" DISCONNECTED")
 
+    def linkLost(self):
+        """
+        called by the notification reactor when the helper of the device failed
+        """
+        if not self._connected :
+            return
+        blelog.info("BLE GATT device:"+self.name()+" link lost")
+        self.stopDisconnectTimer()
+        self._notifListener=False
+        self._connected=False
+        try:
+            self._p.disconnect()
+        except (BTLEException,OSError) as err:
+            blelog.debug("BLE GATT disconnect after link loss:"+str(err))
+        self._ble_s.devDisconnected(self)
+
     def reconnect(self):
         if self._connected :
             return True
         try:
-            self._p.connect(self._addr,self._addrType)
+            self._p.connect(self.address(),self._addrType)
         except btle.BTLEException as err:
             blelog.error ("BLE GATT reconnect"+str(err))
             return False
@@ -374,33 +609,31 @@ class BLE_Device :
 
     def allowNotifications(self,channel) :
         # print ("############## Allow notif on Channel:" ,channel.uuidStr())
-        if self._notifListener == None:
+        if not self._notifListener :
             self._notifChannels=[]
             # self._p.setMTU(63) #  for ELA tags to be generalized
             self._p.withDelegate(BLE_Device_Delegate(self) )
-            self._notifListener=BLE_Notification_Listener(self)
-            self._notifListener.start()
+            BLE_Notification_Reactor.instance().addPeripheral(self._p,self.linkLost)
+            self._notifListener=True
 
         self._notifChannels.append(channel)
 
     def stopNotifications(self):
         blelog.debug("BLE Device "+self.name()+" Stopping notifications")
-        if self._notifListener != None :
-            self._notifListener.stopListen()
-            self._notifListener.join() # wait for the notification listening thread to stop
+        if self._notifListener :
+            BLE_Notification_Reactor.instance().removePeripheral(self._p)
             for c in self._notifChannels :
                 c.stopNotifications()
             self._notifChannels.clear()
-            self._notifListener=None
+            self._notifListener=False
 
     def isListeningNotifications(self):
-        return self._notifListener != None
+        return self._notifListener
 
     @staticmethod
     def disconnectTimeout(*argv):
         dev=argv[0]
         blelog.debug("BLE Service - Connection duration timer expired:"+dev.name())
-        dev._disconnectTimer=None
         if dev.transactionInProgress(False,False):
             # something is running connect or disconnect so don't mess up
             blelog.debug("BLE Service - timer expired while transaction in progress on:"+dev.name())
@@ -410,31 +643,44 @@ class BLE_Device :
 
     def armDisconnectTimer(self,timeout):
         blelog.debug("BLE Service - Arming connection timer for:"+self.name()+" duration:"+str(timeout))
-        if self._disconnectTimer != None :
-            self._disconnectTimer.cancel()
-
-        self._disconnectTimer=threading.Timer(timeout,BLE_Device.disconnectTimeout,(self,None))
-        self._disconnectTimer.start()
+        if self._disconnectTimer == None :
+            self._disconnectTimer=BLE_Timer(BLE_Device.disconnectTimeout,(self,None))
+        self._disconnectTimer.arm(timeout)
 
     def stopDisconnectTimer(self):
         if self._disconnectTimer != None :
             self._disconnectTimer.cancel()
-            self._disconnectTimer = None
 
     def handleNotification(self,notification):
-        blelog.debug("BLE GATT Notification received on:"+self._addr)
-        for channel in self._notifChannels :
-            if channel.handle() == notification._handle :
-                notification.setChannel(channel)
-                self.armDisconnectTimer(10.0)   # to be improved by saving the timeout
-                self._ble_s.notificationReceived(notification)
-                return
+        blelog.debug("BLE GATT Notification received on:"+self.address())
+        if notification._handle == self._serviceChanged :
+            blelog.info("BLE GATT Service Changed on:"+self.name())
+            if self._ble_s.gattCache() != None :
+                self._ble_s.gattCache().invalidate(self.address())
+            self._discovered=False
+            return
+        if self._notifListener :
+            for channel in self._notifChannels :
+                if channel.handle() == notification._handle :
+                    notification.setChannel(channel)
+                    self.armDisconnectTimer(10.0)   # to be improved by saving the timeout
+                    self._ble_s.notificationReceived(notification)
+                    return
         blelog.error("BLE GATT Notification on:"+self.name()+" Unknown handle:"+str(notification._handle))
 
+    def _transacSync(self):
+        # lock and event are created on the first transaction
+        with BLE_Device._syncLock:
+            if self._transacEvent is None :
+                self._transacLock=threading.Lock()
+                event=threading.Event()
+                event.set()
+                self._transacEvent=event
+
     def transactionInProgress(self,wait,lock) :
         # check if there is a long transaction going on
         # return True if a tran is or was in progress
-        if self._transacEvent.is_set():
+        if self._transacEvent is None or self._transacEvent.is_set():
             return False # no transaction in progress
         else:
             if wait:
@@ -445,6 +691,8 @@ class BLE_Device :
             return True
 
     def startTransaction(self):
+        if self._transacEvent is None :
+            self._transacSync()
         self._transacEvent.clear()
         self._transacLock.acquire()
 
@@ -461,54 +709,36 @@ class BLE_Device :
         # update the timestamp
         self._adv_time_stamp= time.time()
         # decode the scan data and initialize the object
-        for (adType,desc,value) in scan_entry.getScanData():
-            if adType == 0x01 :
-                self._flags=int(value,16)
-            elif adType == 0x03 :
-                # list of 16 bits services
-                # nbs= int(len(value) / 4)
-                #print("16 bits service type:",type(value))
-                # bluepy is returning the full 128 bit string
-                service_id= int(value[4:6],16)*256+int(value[6:8],16)
-                # print("List of Service ID: %04X"%service_id)
-                if service_id == Eddystone.serviceUUID :
-                    # print(" Eddystone detected")
-                    self._advType=BLE_Adv_EDDYSTONE
-            elif adType== 0x09 :
-                self._name=value
-            elif adType== 0x16 :
-                # value can be multiple => treat as a array
-                # print("Value=",value,type(value))
-                if isinstance(value,dict) :
-                    values=value.items()
-                else:
-                    values=[value]
-
-                for val in values:
-                    # print(" Service data:",val)
-
-                    service_id= val[0]
-                    if self._service_data == None :
-                       self._service_data={}
-                    # print("addr:",self._addr,"service id=",hex(service_id))
-                    self._service_data[service_id]=BLE_ServiceData(service_id,val[1])
-                    # print("addr:",self._addr,"service id=",hex(service_id),"val:",self._service_data[service_id].value())
-                    if service_id == Eddystone.serviceUUID :
-                        # print(" Eddystone detected (service data)")
-                        self._Eddystone_Frame_Type=int(val[:4],16)
-                        self._Eddystone_Frame=bytearray.fromhex(val[4:])
-
-            elif adType == 0xFF :
-                # print("Manufacturing raw data=",value)
-                self._mfgID= int(value[0:2],16)+int(value[2:4],16)*256
-                self._mfg_data=value[4:]
-                if self._mfgID == iBeacon.Apple_MfgID :
-                    # check if we have an iBEACON
-                    # print("iBeacon detected")
-                    if iBeacon.check(self._mfg_data):
-                        self._advType=BLE_Adv_IBEACON
-                        self._iBeaconUUID=bytearray.fromhex(self._mfg_data[4:44])
-                        self._iBeaconPower=int(self._mfg_data[44:46],16)
+        # values are kept as bytes, hex strings are only built on output
+        scan_data=scan_entry.scanData
+        value=scan_data.get(0x01)
+        if value :
+            self._flags=int.from_bytes(value,'big')
+        value=scan_data.get(0x03)
+        if value is not None and len(value) >= 2 :
+            # only the first 16 bits service is checked
+            if _uint16.unpack_from(value)[0] == Eddystone.serviceUUID :
+                self._advType=BLE_Adv_EDDYSTONE
+        if 0x09 in scan_data :
+            self._name=scan_entry.getValue(0x09)
+        if 0x16 in scan_data :
+            if self._service_data == None :
+                self._service_data={}
+            for service_id,val in scan_entry.getServiceDataRaw().items():
+                self._service_data[service_id]=BLE_ServiceData(service_id,val)
+                if service_id == Eddystone.serviceUUID and len(val) > 0 :
+                    self._Eddystone_Frame_Type=val[0]
+                    self._Eddystone_Frame=val[1:]
+        value=scan_data.get(0xFF)
+        if value is not None and len(value) >= 2 :
+            self._mfgID=_uint16.unpack_from(value)[0]
+            self._mfg_data=value[2:]
+            if self._mfgID == iBeacon.Apple_MfgID :
+                # check if we have an iBEACON
+                if iBeacon.checkRaw(self._mfg_data):
+                    self._advType=BLE_Adv_IBEACON
+                    self._iBeaconUUID=self._mfg_data[2:22]
+                    self._iBeaconPower=self._mfg_data[22]
 
         self._rssi = max(scan_entry.rssi,self._rssi) # we keep only the max RSSI over a scan
         self._connectable = scan_entry.connectable
@@ -535,7 +765,7 @@ class BLE_Device :
             return None
 
     def printDef(self):
-        print ("Name:",self._name," @:",self._addr," RSSI:",self._rssi,"connectable:",self._connectable)
+        print ("Name:",self._name," @:",self.address()," RSSI:",self._rssi,"connectable:",self._connectable)
 
     def printData(self):
         if self._service_data != None :
@@ -562,10 +792,13 @@ class BLE_Device :
         if self._name != None :
             return self._name
         else:
-            return str(self._addr)
+            return self.address()
 
     def address(self) :
-        return self._addr
+        return macToAddr(self._mac)
+
+    def mac(self):
+        return self._mac
 
     def rssi(self):
         return self._rssi
@@ -577,6 +810,12 @@ class BLE_Device :
             return self._mfgID
 
     def mfgData(self):
+        if self._mfgID == None:
+            return None
+        else:
+            return binascii.b2a_hex(self._mfg_data).decode('ascii')
+
+    def mfgDataRaw(self):
         if self._mfgID == None:
             return None
         else:
@@ -639,7 +878,7 @@ class BLE_Device :
             out['service_data_array']=sd_array
         if self._mfgID != None :
             out['mfg_id']= self._mfgID
-            out['mfg_data']=self._mfg_data
+            out['mfg_data']=self.mfgData()
 
     def GATTDict(self,out,properties):
 
@@ -727,6 +966,107 @@ class BLE_GATT_Service():
         return res
 
 
+class BLE_GATT_Cache:
+    """
+    On disk cache of the GATT database (services, characteristics, handles
+    and properties) per device address, to skip the discovery on reconnection.
+    An entry is checked against the Database Hash characteristic when the
+    device has one, and dropped on a Service Changed indication (enabled by
+    BLE_Device after the discovery)
+    An entry without Database Hash is only used for ttl seconds (never if 0)
+    The changes are written to the file flushDelay seconds later by the timer
+    scheduler, and at exit
+    """
+    DATABASE_HASH=UUID(0x2B2A)
+    SERVICE_CHANGED=UUID(0x2A05)
+    flushDelay=10.0
+
+    def __init__(self,filename,ttl=3600.0):
+        self._fn=filename
+        self._ttl=ttl
+        self._lock=threading.Lock()
+        self._entries={}
+        self._hits=0
+        self._misses=0
+        self._dirty=False
+        self._timer=BLE_Timer(self.flush)
+
+    def load(self):
+        try:
+            with open(self._fn,'r') as fp:
+                self._entries=json.load(fp)
+        except (IOError,ValueError) as err:
+            blelog.info("BLE GATT cache not loaded from:"+self._fn+" :"+str(err))
+            self._entries={}
+        blelog.debug("BLE GATT cache - "+str(len(self._entries))+" devices loaded")
+
+    def save(self):
+        with self._lock:
+            data=json.dumps(self._entries)
+        tmp=self._fn+'.tmp'
+        try:
+            with open(tmp,'w') as fp:
+                fp.write(data)
+            os.replace(tmp,self._fn)
+        except IOError as err:
+            blelog.error("BLE GATT cache write in:"+self._fn+" Err:"+str(err))
+
+    def flush(self):
+        # writes the file if it has changed
+        with self._lock:
+            if not self._dirty :
+                return
+            self._dirty=False
+        self.save()
+
+    def _changed(self):
+        # called with the lock held
+        self._dirty=True
+        if not self._timer.armed() :
+            self._timer.arm(self.flushDelay)
+
+    def get(self,addr):
+        with self._lock:
+            entry=self._entries.get(addr)
+            if entry is None :
+                self._misses += 1
+            else:
+                self._hits += 1
+            return entry
+
+    def put(self,addr,services,dbHash):
+        with self._lock:
+            self._entries[addr]={'hash':dbHash,'services':services,'time':time.time()}
+            self._changed()
+
+    def expired(self,entry):
+        if entry['hash'] != None :
+            return False
+        return time.time()-entry.get('time',0.0) >= self._ttl
+
+    def invalidate(self,addr):
+        with self._lock:
+            if self._entries.pop(addr,None) is None :
+                return
+            self._changed()
+        blelog.info("BLE GATT cache - entry of "+addr+" invalidated")
+
+    @staticmethod
+    def findHandle(entry,uuid):
+        # value handle of a characteristic in a cache entry, None if absent
+        uuid=str(uuid)
+        for s in entry['services']:
+            for c in s[3]:
+                if c[0] == uuid :
+                    return c[3]
+        return None
+
+    def statsDict(self,out):
+        out['devices']=len(self._entries)
+        out['hits']=self._hits
+        out['misses']=self._misses
+
+
 ################################################################################
 #
 #    Classes to handle bluepy call backs
@@ -740,17 +1080,22 @@ class BLE_Service_Delegate(DefaultDelegate)  :
         DefaultDelegate.__init__(self)
         self._service=service
 
+    def handleScanStats(self, forwarded, suppressed, addresses):
+        blelog.info("BLE scan reports forwarded:"+str(forwarded)+" suppressed:"+str(suppressed)+" addresses:"+str(addresses))
+
     def handleDiscovery(self, scan_data, isNewDev, isNewData):
+        self._service._devices.touch(scan_data.mac)
         if isNewDev:
             blelog.debug ("BLE scan Discovered device " + str( scan_data.addr)+" "+str(scan_data.addrType))
             self._service.addDevice(scan_data)
         elif isNewData:
             blelog.debug("BLE scan Received new data from "+ str(scan_data.addr))
             # check if the device has not been filtered out
-            dev=self._service.getDevice(scan_data.addr)
+            dev=self._service.getDevice(scan_data.mac)
             # then update the data
             if dev != None :
                 dev.fromScanData(scan_data)
+                self._service._devices.updated(dev)
                 if self._service._recheckRSSI:
                     #
                     # let's reevaluate the filter
@@ -780,6 +1125,8 @@ class BLE_Notification():
     """
     hold the data linked to the notification
     """
+    __slots__=('_timestamp','_dev','_handle','_data','_channel')
+
     def __init__(self,dev,handle,data):
         self._timestamp=time.time()
         self._dev=dev
@@ -800,6 +1147,327 @@ class BLE_Notification():
         out['timestamp']=self._timestamp
 
 
+################################################################################
+#
+#    Device table
+################################################################################
+
+class BLE_Device_Columns:
+    """
+    Columnar copy of the device table, one row per device in parallel arrays
+    A removed row is replaced by the last one, the rows are in no particular order
+    mfg_id is -1 for a device without manufacturer data
+    """
+    columns=(('address','Q'),('rssi','b'),('last_seen','d'),('flags','B'),('mfg_id','i'),('connectable','B'))
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        for name,code in self.columns :
+            setattr(self,name,array.array(code))
+
+    def __len__(self):
+        return len(self.address)
+
+    def append(self,dev,ts):
+        self.address.append(dev.mac())
+        self.rssi.append(0)
+        self.last_seen.append(ts)
+        self.flags.append(0)
+        self.mfg_id.append(-1)
+        self.connectable.append(0)
+        row=len(self.address)-1
+        self.update(row,dev)
+        return row
+
+    def update(self,row,dev):
+        self.rssi[row]=max(-128,min(127,dev._rssi))
+        self.flags[row]=dev._flags & 0xFF
+        self.mfg_id[row]=-1 if dev._mfgID is None else dev._mfgID
+        self.connectable[row]=1 if dev._connectable else 0
+
+    def remove(self,row):
+        """
+        removes the row, returns the address of the row moved in its place (None if none)
+        """
+        last=len(self.address)-1
+        moved=None
+        if row != last :
+            for name,code in self.columns :
+                col=getattr(self,name)
+                col[row]=col[last]
+            moved=self.address[row]
+        for name,code in self.columns :
+            getattr(self,name).pop()
+        return moved
+
+    def snapshot(self,use_numpy=False):
+        """
+        copy of the columns as a dictionary name -> array.array or numpy array
+        """
+        if use_numpy :
+            if numpy is None :
+                raise ImportError("BLE_Device_Columns.snapshot requires numpy")
+            return {name:numpy.frombuffer(getattr(self,name),dtype=code).copy() for name,code in self.columns}
+        return {name:array.array(code,getattr(self,name)) for name,code in self.columns}
+
+
+class BLE_Device_Store:
+    """
+    Devices detected by the scan, kept in last seen order (LRU)
+    A device not seen for ttl seconds or the least recently seen beyond
+    max_devices is removed and reported to lost, except the protected ones
+    (connected) that are kept as if seen again. 0 means no limit
+    The devices are indexed by their MAC address as an integer, the lookups
+    accept either the integer or the address string
+    The table is mirrored in a BLE_Device_Columns for the snapshots
+    """
+    def __init__(self,max_devices=0,ttl=0.0,lost=None,protected=None):
+        self._lock=threading.Lock()
+        self._devs=collections.OrderedDict()   # mac -> [last seen (monotonic), device, row in columns]
+        self._columns=BLE_Device_Columns()
+        self._max=max_devices
+        self._ttl=ttl
+        self._lost=lost
+        self._protected=protected
+        self._expired=0
+        self._evicted=0
+
+    @staticmethod
+    def _key(addr):
+        return addr if type(addr) is int else addrToMac(addr)
+
+    def __getitem__(self,addr):
+        return self._devs[self._key(addr)][1]
+
+    def __contains__(self,addr):
+        return self._key(addr) in self._devs
+
+    def __len__(self):
+        return len(self._devs)
+
+    def get(self,addr,default=None):
+        entry=self._devs.get(self._key(addr))
+        if entry is None :
+            return default
+        return entry[1]
+
+    def add(self,dev):
+        with self._lock:
+            entry=self._devs.get(dev.mac())
+            if entry is None :
+                self._devs[dev.mac()]=[time.monotonic(),dev,self._columns.append(dev,time.time())]
+            else:
+                entry[0]=time.monotonic()
+                entry[1]=dev
+                self._columns.update(entry[2],dev)
+                self._devs.move_to_end(dev.mac())
+            if self._max <= 0 or len(self._devs) <= self._max :
+                return
+        self.expire()
+
+    def touch(self,addr):
+        """
+        the device has been seen
+        """
+        mac=self._key(addr)
+        with self._lock:
+            entry=self._devs.get(mac)
+            if entry is None :
+                return
+            self._columns.last_seen[entry[2]]=time.time()
+            if self._max > 0 or self._ttl > 0 :
+                entry[0]=time.monotonic()
+                self._devs.move_to_end(mac)
+
+    def updated(self,dev):
+        """
+        the device has been updated from the scan data
+        """
+        with self._lock:
+            entry=self._devs.get(dev.mac())
+            if entry is not None :
+                self._columns.update(entry[2],dev)
+
+    def _remove(self,mac):
+        entry=self._devs.pop(mac)
+        moved=self._columns.remove(entry[2])
+        if moved is not None :
+            self._devs[moved][2]=entry[2]
+        return entry
+
+    def expire(self):
+        """
+        removes the devices not seen for ttl and the oldest beyond max_devices
+        only the head of the LRU list is visited
+        """
+        lost=[]
+        with self._lock:
+            limit=time.monotonic()-self._ttl
+            kept=0
+            while len(self._devs) > kept :
+                addr,entry=next(iter(self._devs.items()))
+                over=self._max > 0 and len(self._devs) > self._max
+                old=self._ttl > 0 and entry[0] < limit
+                if not over and not old :
+                    break
+                if self._protected is not None and self._protected(entry[1]) :
+                    # moved to the end as if just seen
+                    entry[0]=time.monotonic()
+                    self._devs.move_to_end(addr)
+                    kept += 1
+                    continue
+                self._remove(addr)
+                if old :
+                    self._expired += 1
+                else:
+                    self._evicted += 1
+                lost.append(entry[1])
+        if self._lost is not None :
+            for dev in lost :
+                self._lost(dev)
+        return len(lost)
+
+    def clear(self):
+        with self._lock:
+            self._devs.clear()
+            self._columns.clear()
+
+    def snapshot(self,use_numpy=False):
+        with self._lock:
+            return self._columns.snapshot(use_numpy)
+
+    def values(self):
+        with self._lock:
+            return [entry[1] for entry in self._devs.values()]
+
+    def keys(self):
+        with self._lock:
+            return [macToAddr(mac) for mac in self._devs.keys()]
+
+    def items(self):
+        with self._lock:
+            return [(macToAddr(mac),entry[1]) for mac,entry in self._devs.items()]
+
+    def statsDict(self,out):
+        out['devices']=len(self._devs)
+        out['max_devices']=self._max
+        out['device_ttl']=self._ttl
+        out['expired']=self._expired
+        out['evicted']=self._evicted
+
+################################################################################
+#
+#    Connection pool
+################################################################################
+
+class BLE_Connection_Manager:
+    """
+    Keeps the connected devices of one adapter in LRU order
+    enforces max_connect by disconnecting the least recently used idle device
+    a connection being opened holds a slot from reserve() until unreserve()
+    """
+    def __init__(self,max_connect=10,keep=0.0):
+        self._lock=threading.Lock()
+        self._devs=collections.OrderedDict()
+        self._pending=0     # slots reserved for the connections being opened
+        self._max=max_connect
+        self._keep=keep
+        self._hits=0
+        self._misses=0
+        self._evictions=0
+
+    def get(self,addr):
+        # lookup a live connection and mark it as the most recently used
+        with self._lock:
+            dev=self._devs.get(addr)
+            if dev is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._devs.move_to_end(addr)
+            return dev
+
+    def add(self,dev):
+        with self._lock:
+            self._devs[dev.address()]=dev
+            self._devs.move_to_end(dev.address())
+
+    def remove(self,dev):
+        with self._lock:
+            try:
+                del self._devs[dev.address()]
+            except KeyError:
+                return False
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._devs.clear()
+
+    def devices(self):
+        with self._lock:
+            return list(self._devs.values())
+
+    def __len__(self):
+        return len(self._devs)
+
+    def _idleVictim(self):
+        # takes a slot if one is free (None) or returns the least recently used
+        # device without transaction nor notification
+        with self._lock:
+            if len(self._devs)+self._pending < self._max :
+                self._pending += 1
+                return None
+            for dev in self._devs.values():
+                if dev.transactionInProgress(False,False) or dev.isListeningNotifications():
+                    continue
+                return dev
+        return False
+
+    def reserve(self):
+        """
+        make room for a new connection and reserve its slot
+        return False if the limit is reached and no device can be evicted
+        unreserve() shall be called once the connection is opened or has failed
+        """
+        while True:
+            victim=self._idleVictim()
+            if victim is None:
+                return True
+            if victim is False:
+                blelog.error("BLE Connection pool - max_connect:"+str(self._max)+" reached, no idle connection")
+                return False
+            blelog.debug("BLE Connection pool - evicting:"+victim.name())
+            victim.stopDisconnectTimer()
+            victim.disconnect()
+            # in case the device was already disconnected at the link level
+            self.remove(victim)
+            self._evictions += 1
+
+    def unreserve(self):
+        with self._lock:
+            self._pending -= 1
+
+    def release(self,dev,keep):
+        """
+        end of a GATT transaction: keep the connection for keep seconds
+        or the pool default, disconnect if none
+        """
+        if keep <= 0.0 :
+            keep=self._keep
+        if keep > 0.0 :
+            dev.armDisconnectTimer(keep)
+        else:
+            dev.disconnect()
+
+    def statsDict(self,out):
+        out['connected']=len(self._devs)
+        out['max_connect']=self._max
+        out['hits']=self._hits
+        out['misses']=self._misses
+        out['evictions']=self._evictions
 
 
 ################################################################################
@@ -817,11 +1485,19 @@ class BLE_Service:
     runningService=None
 
     def __init__(self,interface=None):
-        self._devices={}
+        # devices accepted by the filters, bounded for the continuous scans
+        max_devices=getparam('max_devices',0)
+        device_ttl=getparam('device_ttl',0.0)
+        self._devices=BLE_Device_Store(max_devices,device_ttl,self._deviceLost,BLE_Device.connected)
         self._filters=[]
+        self._filterCheck=compileFilters(self._filters)
+        # filters applied by bluepy-helper and the remaining ones evaluated here
+        self._helperFilters=[]
+        self._residualCheck=self._filterCheck
         self._detectedDevices=0
         self._callbacks=None
-        self._connectedDev={}
+        self._mtus={}   # negotiated MTU per device address
+        self._connectedDev=BLE_Connection_Manager(getparam('max_connect',10),getparam('connect_keep',0.0))
         # self.scanOn=False
         self._recheckRSSI=False
         self._defaultRetries=1
@@ -832,6 +1508,7 @@ class BLE_Service:
         self._scan_run.set()
         self._scan_start=threading.Event()
         self._periodic=False
+        self._timer=BLE_Timer(BLE_Service.periodTime)
         self._scan_error=0
         self._inhibitFilter=False
         self._inhibitCallback=False
@@ -846,12 +1523,81 @@ class BLE_Service:
             blelog.critical("BLE interface name invalid:"+self._interface)
             raise BLE_ServiceException("Invalid interface")
         blelog.info("BLE Service starting on "+self._interface)
-        self._scanner= Scanner(self._ifnum).withDelegate(BLE_Service_Delegate(self))
+        # helper processes kept started for the GATT connections
+        btle.Bluepy_helper_pool(getparam('helper_pool',0),self._ifnum)
+        self._scanner= Scanner(self._ifnum,lazy=True).withDelegate(BLE_Service_Delegate(self))
+        # the scanner also keeps the entries of the devices filtered out
+        self._scanner.setBounds(getparam('scan_max_entries',2*max_devices),device_ttl)
+        self._expiryPeriod=max(1.0,device_ttl/4)
+        if device_ttl > 0.0 :
+            self._expiryTimer=BLE_Timer(self._expireDevices)
+            self._expiryTimer.arm(self._expiryPeriod)
+        if getparam('helper_filters',True) :
+            self._scanner.setFilterRules(self._helperRules)
+        if getparam('adv_dedup',False) :
+            # repeated advertisements are dropped by bluepy-helper
+            self._scanner.setDeduplication(getparam('adv_rssi_delta',0),getparam('adv_min_interval',10.0),
+                                           getparam('adv_dedup_stats',60))
+        # one update per device for the advertisement and the scan response
+        self._scanner.setCoalescing(getparam('adv_coalesce',0.0))
+        cache_file=getparam('gatt_cache','gatt_cache.json')
+        if cache_file :
+            self._gattCache=BLE_GATT_Cache(os.path.join(getDataDir(),cache_file),getparam('gatt_cache_ttl',3600.0))
+            self._gattCache.load()
+            atexit.register(self._gattCache.flush)
+        else:
+            self._gattCache=None
         BLE_Service.runningService=self
 
     def ifNumber(self):
         return self._ifnum
 
+    def _expireDevices(self):
+        # on a timer worker thread
+        self._devices.expire()
+        self._expiryTimer.arm(self._expiryPeriod)
+
+    def _deviceLost(self,dev):
+        blelog.debug("BLE device lost:"+dev.name())
+        # a new advertisement will create a new device
+        self._scanner.forget(dev.mac())
+        if self._callbacks != None :
+            self._callbacks._deviceLost(dev)
+
+    def devicesSnapshot(self,use_numpy=False):
+        """
+        returns the device table as parallel arrays in a dictionary:
+        address (MAC as uint64), rssi (int8), last_seen (timestamp), flags (uint8),
+        mfg_id (int32, -1 if none) and connectable (uint8)
+        array.array by default, numpy arrays if use_numpy is True
+        """
+        return self._devices.snapshot(use_numpy)
+
+    def deviceStoreDict(self,out):
+        """
+        fills the out dictionary with the device table size and evictions
+        """
+        self._devices.statsDict(out)
+
+    def gattCache(self):
+        return self._gattCache
+
+    def deviceMTU(self,addr):
+        """
+        MTU to request on connection: the one negotiated last time with the device
+        or max_MTU for a new one, 0 for no exchange
+        """
+        try:
+            mtu=self._mtus[addr]
+        except KeyError :
+            mtu=getparam('max_MTU',getparam('notif_MTU',23))
+        if mtu <= 23 :
+            return 0
+        return mtu
+
+    def setDeviceMTU(self,addr,mtu):
+        self._mtus[addr]=mtu
+
     def scanSynch(self,timeout,forceDisconnect,inhibitFlag=False) :
         """
         Synchonous scan - reset all devices
@@ -865,6 +1611,7 @@ class BLE_Service:
         if inhibitFlag :
             self._inhibitCallback = True
             self._inhibitFilter=True
+            self._scanner.updateFilterRules()
         # self._periodic=False
         blelog.info("BLE Synchonous Scan start for:"+str(timeout)+" sec")
         self._checkConnected(forceDisconnect)
@@ -873,7 +1620,9 @@ class BLE_Service:
         self._scanEnds(0)
         # reset inibitFlags
         self._inhibitCallback=False
-        self._inhibitFilter=False
+        if self._inhibitFilter :
+            self._inhibitFilter=False
+            self._scanner.updateFilterRules()
 
     def scanAsynchWait(self):
         """
@@ -977,8 +1726,7 @@ class BLE_Service:
                 self.scanAsynch(self._timeout,False)
             else:
                 blelog.debug("BLE Periodic scan -- Timer started")
-                self._timer=threading.Timer(self._breathTime,BLE_Service.periodTime)
-                self._timer.start()
+                self._timer.arm(self._breathTime)
 
     def notificationReceived(self,notification):
         """
@@ -1005,7 +1753,7 @@ class BLE_Service:
         #
         blelog.debug("BLE Service scan start number of devices connected:"+str(len(self._connectedDev))+" force:"+str(flag))
         if flag :
-            for d in self._connectedDev.values() :
+            for d in self._connectedDev.devices() :
                 d._disconnect()
             self._connect_lock.set()
         else:
@@ -1016,9 +1764,16 @@ class BLE_Service:
     def addDevice(self,scan_entry):
         self._detectedDevices = self._detectedDevices + 1
         if self.checkDevice(scan_entry):
-            dev=  BLE_Device(scan_entry,self)
-            dev.fromScanData(scan_entry)
-            self._devices[scan_entry.addr] = dev
+            dev=self._devices.get(scan_entry.mac)
+            if dev == None :
+                dev=  BLE_Device(scan_entry,self)
+                dev.fromScanData(scan_entry)
+                self._devices.add(dev)
+            else:
+                # scan entry dropped by the scanner while the device was kept
+                dev.fromScanData(scan_entry)
+                self._devices.touch(scan_entry.mac)
+                self._devices.updated(dev)
             self.advCallback(dev)
         else:
             blelog.debug("BLE scan filter Device filtered out "+str(scan_entry.addr))
@@ -1042,7 +1797,7 @@ class BLE_Service:
         """
         try:
             return self._devices[addr]
-        except KeyError :
+        except (KeyError,ValueError) :
             blelog.debug("BLE device not found or filtered out: "+str(addr))
             return None
 
@@ -1061,6 +1816,7 @@ class BLE_Service:
         """
 
         self._filters.append(filter)
+        self._compileFilters()
         if type(filter) == BLE_Filter_RSSI :
             self._recheckRSSI=True
             self._rssiFilter=filter
@@ -1070,20 +1826,50 @@ class BLE_Service:
         remove all the scan filters
         """
 
+        for f in self._filters :
+            f._onChange=None
         self._filters.clear()
+        self._compileFilters()
         self._recheckRSSI = False
 
-    def checkDevice(self,scan_data):
-        if self._inhibitFilter : return True
+    def _compileFilters(self):
+        """
+        the filters translatable in helper rules are applied by bluepy-helper (one per kind),
+        the others are kept in the Python predicate
+        """
+        self._filterCheck=compileFilters(self._filters)
+        helper=[]
+        residual=[]
+        kinds=set()
         for f in self._filters :
-            if f.inFilter(scan_data): continue
+            if f.helperRule is not None and f.helperRule not in kinds and f.helperRules() is not None :
+                kinds.add(f.helperRule)
+                helper.append(f)
+                f._onChange=self._scanner.updateFilterRules
             else:
-                return False
-        return True
+                residual.append(f)
+        self._helperFilters=helper
+        self._residualCheck=compileFilters(residual)
+        self._scanner.updateFilterRules()
+
+    def _helperRules(self):
+        # called by the scanner when the rules are sent
+        if self._inhibitFilter :
+            return []
+        rules=[]
+        for f in self._helperFilters :
+            rules.extend(f.helperRules())
+        return rules
+
+    def checkDevice(self,scan_data):
+        if self._inhibitFilter : return True
+        if self._scanner.filtersPushed :
+            return self._residualCheck(scan_data)
+        return self._filterCheck(scan_data)
 
     def  updateDevice(self,scan_data):
         try:
-            dev=self._devices[scan_data.addr]
+            dev=self._devices[scan_data.mac]
         except KeyError :
             return
         dev.fromScanData[scan_data]
@@ -1104,17 +1890,14 @@ class BLE_Service:
         if self._connect_lock.is_set() :
             # set the lock to prevent scan when devices are connected
             self._connect_lock.clear()
-        self._connectedDev[dev.address()]  =dev
+        self._connectedDev.add(dev)
         # blelog.debug("BLE SERVICE Device:"+dev.name()+" Connected!")
 
     def devDisconnected(self,dev):
         # called for dev.disconnect()
         # print("********* Finalizing disconnection for:",dev.name())
-        try:
-            del self._connectedDev[dev.address()]
-        except KeyError :
+        if not self._connectedDev.remove(dev) :
             blelog.error("BLE Device:"+dev.name()+" Disconnect Not in connected device list")
-            pass
         # print("number of connected device:",len(self._connectedDev))
         if len(self._connectedDev)  == 0 :
             # clear the lock as no more devices are connected
@@ -1135,16 +1918,14 @@ class BLE_Service:
                 return None
 
         # is the device already connected
-        try:
-            dev=self._connectedDev[addr]
+        dev=self._connectedDev.get(addr)
+        if dev != None :
             # now let's check that we don't have a disconnect or other long transaction going on
             # if yes, wait and lock the device
             if not dev.transactionInProgress(True,True) :
                 # need to clear the timer
                 dev.stopDisconnectTimer()
                 return dev # that's OK
-        except KeyError:
-            pass
         # do we know the device
         try:
             dev=self._devices[addr]
@@ -1153,18 +1934,25 @@ class BLE_Service:
             return None
         if not dev.isConnectable() :
             return None
+        # make room in the pool
+        if not self._connectedDev.reserve() :
+            return None
 
         #
         #  Now really open the connection
         #
         nbAttempt=0
-        while True:
-            if dev.connect():
-                return dev
-            elif nbAttempt < retry :
-                nbAttempt=nbAttempt +1
-            else:
-                return None
+        try:
+            while True:
+                if dev.connect():
+                    return dev
+                elif nbAttempt < retry :
+                    nbAttempt=nbAttempt +1
+                else:
+                    return None
+        finally:
+            # the device is in the pool if connected
+            self._connectedDev.unreserve()
 
     def devGATTDiscover(self,addr,keep,service,out,properties):
         '''
@@ -1184,10 +1972,7 @@ class BLE_Service:
                 # we have a problem here
                 dev.disconnect()
                 return None
-            if  keep > 0.0 :
-                dev.armDisconnectTimer(keep)
-            else:
-                dev.disconnect()
+            self._connectedDev.release(dev,keep)
             dev.GATTDict(out,properties)
             return dev
         else:
@@ -1221,14 +2006,25 @@ class BLE_Service:
             blelog.error("BLE GATT read ERROR:"+str(err) )
             return 3
         # if  dev is not OK, exception has been raised
-        values=[]
+        channels=[]
+        types=[]
         for action in actions:
             channel_uuid=UUID(action[0])
             channel=dev.channel(channel_uuid)
             if channel == None :
-                blelog.error("BLE Service - Non existent characteristic:"+action[0].bestStr()+ "on:"+addr)
+                blelog.error("BLE Service - Non existent characteristic:"+channel_uuid.bestStr()+ "on:"+addr)
                 continue
-            value=channel.read(action[1])
+            channels.append(channel)
+            types.append(action[1])
+        # the reads are batched when possible
+        raw_values=dev.readValues(channels)
+        values=[]
+        error=0
+        for channel,typeVar,val_raw in zip(channels,types,raw_values):
+            if val_raw == None :
+                value=None
+            else:
+                value=channel.decode(val_raw,typeVar)
             if value == None :
                 blelog.debug("BLE GATT read ERROR "+addr+" / "+channel.uuidStr())
                 error=6
@@ -1237,15 +2033,12 @@ class BLE_Service:
                 blelog.debug("BLE GATT read "+addr+" / "+channel.uuidStr()+" :"+str(value))
                 v={}
                 v['characteristic']=channel.uuidStr()
-                v['type']=action[1]
+                v['type']=typeVar
                 v['value']=value
                 values.append(v)
 
         out['values'] =  values
-        if keep > 0.0 :
-            dev.armDisconnectTimer(keep)
-        else:
-            dev.disconnect()
+        self._connectedDev.release(dev,keep)
         return error
 
     def writeCharacteristics(self,addr,actions,keep,out,service=None):
@@ -1283,10 +2076,7 @@ class BLE_Service:
             values.append(v)
 
         out['values'] =  values
-        if keep > 0.0 :
-            dev.armDisconnectTimer(keep)
-        else:
-            dev.disconnect()
+        self._connectedDev.release(dev,keep)
         return error
 
     def allowNotifications(self,addr,actions,keep,out,service=None):
@@ -1356,6 +2146,21 @@ class BLE_Service:
         out['dev_detected']=self._detectedDevices
         out['dev_selected']=self.nbDevices()
 
+    def connectionsDict(self,out):
+        """
+        fills the out dictionary with the connection pool statistics
+        """
+        self._connectedDev.statsDict(out)
+
+    def scanStatsDict(self,out):
+        """
+        fills the out dictionary with the advertisement deduplication counts
+        """
+        stats=self._scanner.dedupStats
+        out['adv_forwarded']=stats['forwarded']
+        out['adv_suppressed']=stats['suppressed']
+        out['adv_addresses']=stats['addresses']
+
     def devicesDict(self,out):
         """
         fills the out disctionary with device info
@@ -1382,13 +2187,52 @@ class BLE_Service:
 class BLE_Filter:
     """
     Generic superclass for BLE scan filters
+    cost is used to order the filters, the cheapest are evaluated first
+    helperRule is the kind of the bluepy-helper filter rule the filter is translated to (None if not supported)
     """
+    cost=10
+    helperRule=None
+    _onChange=None
 
     def inFilter(self,scan_data) :
         blelog.error("BLE scan filter shall be implemented in subclass")
         return False
 
+    def predicate(self):
+        """
+        returns the function evaluated for each scan entry
+        """
+        return self.inFilter
+
+    def helperRules(self):
+        """
+        returns the list of bluepy-helper filt rules equivalent to the filter
+        """
+        return None
+
+    def _changed(self):
+        if self._onChange is not None :
+            self._onChange()
+
+def compileFilters(filters):
+    """
+    Combines the filters in one predicate, ordered by cost
+    """
+    preds=tuple(f.predicate() for f in sorted(filters,key=lambda f: f.cost))
+    if len(preds) == 0 :
+        return lambda scan_data: True
+    if len(preds) == 1 :
+        return preds[0]
+
+    def check(scan_data):
+        for p in preds :
+            if not p(scan_data) :
+                return False
+        return True
+    return check
+
 class BLE_Filter_RSSI(BLE_Filter) :
+    cost=0
 
     def __init__(self,min_rssi):
         self._min_rssi=min_rssi
@@ -1396,7 +2240,13 @@ class BLE_Filter_RSSI(BLE_Filter) :
     def inFilter(self,scan_data):
         return scan_data.rssi >= self._min_rssi
 
+    helperRule='rssi'
+
+    def helperRules(self):
+        return ["rssi %d" % self._min_rssi]
+
 class BLE_Filter_Connectable(BLE_Filter):
+    cost=0
 
     def __init__(self,indicator):
         self._indicator=indicator
@@ -1404,36 +2254,68 @@ class BLE_Filter_Connectable(BLE_Filter):
     def inFilter(self,scan_data):
         return scan_data.connectable == self._indicator
 
+    helperRule='conn'
+
+    def helperRules(self):
+        return ["conn %d" % (1 if self._indicator else 0)]
+
 class BLE_Filter_Whitelist(BLE_Filter):
     """
     Filter a list of MAC addresses
+    The addresses are kept in a set of integers, the whole list can be replaced while scanning
     """
+    cost=1
+    helperRule='addr'
 
     def __init__(self,address_list=None) :
-        self._auth_addresses=[]
+        self._auth_addresses=set()
         if address_list != None :
-            for a in address_list:
-                self._auth_addresses.append(a.lower())  # normalise to lower case
+            self.setAddresses(address_list)
 
     def inFilter(self,scan_data):
-        return scan_data.addr in self._auth_addresses
+        return scan_data.mac in self._auth_addresses
+
+    def predicate(self):
+        # the set is looked up on each call so that setAddresses applies immediately
+        def check(scan_data):
+            return scan_data.mac in self._auth_addresses
+        return check
+
+    def setAddresses(self,address_list):
+        """
+        replaces all the addresses at once
+        """
+        self._auth_addresses=set(addrToMac(a) for a in address_list)
+        self._changed()
 
     def addAddress(self,address) :
-        self._auth_addresses.append(address.lower())
+        self._auth_addresses.add(addrToMac(address))
+        self._changed()
 
     def removeAddress(self,address)  :
-        try:
-            self._auth_addresses.remove(address)
-        except ValueError:
-            pass
+        self._auth_addresses.discard(addrToMac(address))
+        self._changed()
+
+    def helperRules(self):
+        # the scanner sends the added and removed addresses in batches
+        rules=["addrclr"]
+        if len(self._auth_addresses) > 0 :
+            rules.append("addr "+" ".join(macToAddr(mac) for mac in self._auth_addresses))
+        return rules
+
+    def nbAddresses(self):
+        return len(self._auth_addresses)
 
 class BLE_Filter_NameStart(BLE_Filter) :
     """"
     Filter object with name starting with pattern
     """
+    cost=3
+    helperRule='name'
 
     def __init__(self,pattern) :
         self._pattern=pattern
+        self._raw_pattern=pattern.encode('utf-8')
 
     def inFilter(self,scan_data) :
         for (adType,desc,value) in scan_data.getScanData():
@@ -1442,12 +2324,28 @@ class BLE_Filter_NameStart(BLE_Filter) :
                     return True
         return False
 
+    def predicate(self):
+        # test the complete local name on the raw AD bytes
+        def check(scan_data):
+            name=scan_data.getRawValue(0x09)
+            return name is not None and name.startswith(self._raw_pattern)
+        return check
+
+    def helperRules(self):
+        if len(self._raw_pattern) == 0 or len(self._raw_pattern) > 29 :
+            return None
+        return ["name "+binascii.b2a_hex(self._raw_pattern).decode('ascii')]
+
 class BLE_Filter_MfgID(BLE_Filter):
     '''
     Filter object to select a specific Manufacturer ID
     '''
+    cost=2
+    helperRule='mfg'
+
     def __init__(self,id):
         self._id=id
+        self._raw_id=struct.pack('<H',id)
         # convert in 4bytes hexa
         h4b="%04X"%id
         hb=h4b[0:2]
@@ -1463,6 +2361,38 @@ class BLE_Filter_MfgID(BLE_Filter):
                     return True
         return False
 
+    def predicate(self):
+        # test the first 2 bytes of the raw manufacturer data
+        def check(scan_data):
+            data=scan_data.getRawValue(0xFF)
+            return data is not None and data[:2] == self._raw_id
+        return check
+
+    def helperRules(self):
+        return ["mfg %d" % self._id]
+
+class BLE_Filter_ServiceUUID(BLE_Filter):
+    '''
+    Filter object to select a 16 bits service UUID, in the service lists or the service data
+    '''
+    cost=3
+    helperRule='uuid'
+
+    def __init__(self,uuid):
+        self._uuid=uuid
+
+    def inFilter(self,scan_data):
+        for adType in (0x02,0x03) :
+            data=scan_data.getRawValue(adType)
+            if data is not None :
+                for i in range(0,len(data)-1,2) :
+                    if data[i] | (data[i+1] << 8) == self._uuid :
+                        return True
+        return self._uuid in scan_data.getServiceDataRaw()
+
+    def helperRules(self):
+        return ["uuid %d" % self._uuid]
+
 
 ################################################################################
 
@@ -1493,6 +2423,16 @@ class BLE_Service_Callbacks:
     def _notifReceived(self,dev,charac,data):
         self.notificationCallback(dev,charac,data)
 
+    def _deviceLost(self,dev):
+        self.deviceLostCallback(dev)
+
+    def deviceLostCallback(self,dev):
+        """
+        the device has not been seen for device_ttl or has been evicted (max_devices)
+        called on the timer or the scan thread
+        """
+        pass
+
     def advertisementCallback(self,dev):
         blelog.error("advertisement callback to be implemented in subclass")
 
@@ -1568,25 +2508,261 @@ class BLE_ListenerInd(threading.Thread) :
 
 
 
-class BLE_Notification_Listener(threading.Thread) :
+class BLE_Timer:
+    """
+    Reusable timer executed by the BLE_Timer_Scheduler
+    arm() can be called again at any time to move the deadline, cancel() stops it
+    The function is called on one of the scheduler worker threads
+    """
+    def __init__(self,function,args=()):
+        self._function=function
+        self._args=args
+        self._deadline=None   # absolute deadline (monotonic), None when not armed
+        self._entry=None      # sequence number of the live entry in the scheduler heap
+        self._queued=None     # deadline of the live entry
 
-    def __init__(self,device):
+    def arm(self,timeout):
+        BLE_Timer_Scheduler.instance().arm(self,timeout)
+
+    def cancel(self):
+        # the heap entry is discarded when it comes due
+        BLE_Timer_Scheduler.instance().cancel(self)
+
+    def armed(self):
+        return self._deadline != None
+
+
+class BLE_Timer_Scheduler(threading.Thread):
+    """
+    Single thread watching the deadlines of all the BLE_Timer (heap)
+    A timer has at most one live entry in the heap. Moving a deadline later
+    only updates the timer, the entry is pushed again at the new deadline when
+    it comes due. Only a deadline earlier than the live entry needs a push.
+    The due timers are handed to worker threads (up to maxWorkers, started on
+    demand) so that a blocking callback does not delay the other timers
+    """
+    scheduler=None
+    maxWorkers=8
+    _instanceLock=threading.Lock()
+
+    @staticmethod
+    def instance():
+        if BLE_Timer_Scheduler.scheduler == None :
+            with BLE_Timer_Scheduler._instanceLock:
+                if BLE_Timer_Scheduler.scheduler == None :
+                    scheduler=BLE_Timer_Scheduler()
+                    scheduler.start()
+                    BLE_Timer_Scheduler.scheduler=scheduler
+        return BLE_Timer_Scheduler.scheduler
+
+    def __init__(self):
         threading.Thread.__init__(self)
-        self._device=device
-        self.name=device.name()
+        self.name="BLE-Timer-Scheduler"
+        self.daemon=True
+        self._heap=[]
+        self._seq=itertools.count()
+        self._cond=threading.Condition()
+        self._ready=queue.SimpleQueue()
+        self._workers=0
+        self._idle=0
+
+    def arm(self,timer,timeout):
+        deadline=time.monotonic()+timeout
+        with self._cond:
+            timer._deadline=deadline
+            if timer._entry == None or deadline < timer._queued :
+                self._push(timer,deadline)
+
+    def cancel(self,timer):
+        with self._cond:
+            timer._deadline=None
+
+    def _push(self,timer,deadline):
+        seq=next(self._seq)
+        timer._entry=seq
+        timer._queued=deadline
+        heapq.heappush(self._heap,(deadline,seq,timer))
+        if self._heap[0][1] == seq :
+            # new earliest deadline
+            self._cond.notify()
+
+    def nbEntries(self):
+        return len(self._heap)
+
+    def run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if len(self._heap) == 0 :
+                        self._cond.wait()
+                        continue
+                    deadline,seq,timer=self._heap[0]
+                    now=time.monotonic()
+                    if deadline > now :
+                        self._cond.wait(deadline-now)
+                        continue
+                    heapq.heappop(self._heap)
+                    if timer._entry != seq :
+                        continue    # stale entry
+                    timer._entry=None
+                    if timer._deadline == None :
+                        continue    # cancelled
+                    if timer._deadline > now :
+                        # re-armed later in the meantime
+                        self._push(timer,timer._deadline)
+                        continue
+                    timer._deadline=None
+                    break
+            self._execute(timer)
+
+    def _execute(self,timer):
+        with self._cond:
+            if self._idle == 0 and self._workers < self.maxWorkers :
+                self._workers += 1
+                worker=threading.Thread(target=self._work,name="BLE-Timer-"+str(self._workers),daemon=True)
+                worker.start()
+        self._ready.put(timer)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+            timer=self._ready.get()
+            with self._cond:
+                self._idle -= 1
+            try:
+                timer._function(*timer._args)
+            except Exception as err:
+                blelog.error("BLE Timer callback error:"+str(err))
+
+
+class BLE_Notification_Reactor(threading.Thread) :
+    """
+    Single thread dispatching the notifications of all the connected devices
+    The helper outputs of the peripherals are watched in one epoll set
+    Each descriptor is armed one shot and re-armed once dispatched, when the
+    peripheral is busy with a command the dispatch is retried shortly after
+    lost is called (on the reactor thread) when the helper of a peripheral fails
+    """
+    reactor=None
+    retryDelay=0.05
+    _instanceLock=threading.Lock()
+
+    @staticmethod
+    def instance():
+        if BLE_Notification_Reactor.reactor == None :
+            with BLE_Notification_Reactor._instanceLock:
+                if BLE_Notification_Reactor.reactor == None :
+                    reactor=BLE_Notification_Reactor()
+                    reactor.start()
+                    BLE_Notification_Reactor.reactor=reactor
+        return BLE_Notification_Reactor.reactor
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.name="BLE-Notification-Reactor"
+        self.daemon=True
+        self._epoll=select.epoll()
+        self._lock=threading.RLock()
+        self._peripherals={}
+        self._lost={}
+        self._deferred=set()
+        # wake up pipe used to stop the reactor
+        self._wake_r,self._wake_w=os.pipe()
+        self._epoll.register(self._wake_r,select.EPOLLIN)
         self._stopFlag=False
 
-    def stopListen(self):
+    def addPeripheral(self,p,lost=None):
+        fd=p.fileno()
+        if fd < 0 : return
+        with self._lock:
+            try:
+                self._epoll.register(fd,select.EPOLLIN|select.EPOLLONESHOT)
+            except OSError as err:
+                blelog.error("BLE GATT notification listener:"+str(err))
+                return
+            self._peripherals[fd]=p
+            if lost != None :
+                self._lost[fd]=lost
+
+    def removePeripheral(self,p):
+        with self._lock:
+            for fd,per in self._peripherals.items() :
+                if per is p :
+                    self._remove(fd)
+                    return
+
+    def _remove(self,fd):
+        # called with the lock held
+        del self._peripherals[fd]
+        self._deferred.discard(fd)
+        try:
+            self._epoll.unregister(fd)
+        except OSError:
+            # descriptor already closed
+            pass
+        return self._lost.pop(fd,None)
+
+    def nbPeripherals(self):
+        return len(self._peripherals)
+
+    def stop(self):
         self._stopFlag=True
+        os.write(self._wake_w,b'x')
+
+    def _dispatch(self,fd):
+        with self._lock:
+            p=self._peripherals.get(fd)
+        if p == None : return
+        try:
+            done=p.dispatchPending()
+        except Exception as err:
+            # only the faulty peripheral is dropped
+            blelog.error("BLE GATT wait for notification:"+str(err))
+            self._failed(fd,p)
+            return
+        with self._lock:
+            if self._peripherals.get(fd) is not p : return
+            if done :
+                self._deferred.discard(fd)
+                try:
+                    self._epoll.modify(fd,select.EPOLLIN|select.EPOLLONESHOT)
+                except OSError as err:
+                    blelog.error("BLE GATT notification listener:"+str(err))
+                    done=None
+            else:
+                self._deferred.add(fd)
+        if done is None :
+            self._failed(fd,p)
+
+    def _failed(self,fd,p):
+        lost=None
+        with self._lock:
+            if self._peripherals.get(fd) is p :
+                lost=self._remove(fd)
+        if lost != None :
+            try:
+                lost()
+            except Exception as err:
+                blelog.error("BLE GATT link lost:"+str(err))
 
     def run(self):
-        while True:
+        while not self._stopFlag :
+            timeout= self.retryDelay if len(self._deferred) > 0 else -1
             try:
-                self._device._p.waitForNotifications(5.0)
-            except BTLEException as err:
-                blelog.error("BLE GATT wait for notification:"+str(err))
-                return
-            if self._stopFlag : break
+                events=self._epoll.poll(timeout)
+            except InterruptedError:
+                continue
+            for fd,event in events :
+                if fd == self._wake_r :
+                    os.read(fd,16)
+                    continue
+                self._dispatch(fd)
+            for fd in list(self._deferred) :
+                self._dispatch(fd)
+        self._epoll.close()
+        os.close(self._wake_r)
+        os.close(self._wake_w)
 
 
 ################################################################################
@@ -1612,7 +2788,20 @@ def BLE_init_parameters():
         #  initilaise with default values
         out={}
         out['max_connect']=10
+        out['connect_keep']=0.0
+        out['helper_pool']=0
+        out['helper_filters']=True
+        out['adv_dedup']=False
+        out['adv_rssi_delta']=0
+        out['adv_min_interval']=10.0
+        out['adv_dedup_stats']=60
+        out['adv_coalesce']=0.0
+        out['max_devices']=0
+        out['device_ttl']=0.0
+        out['gatt_cache']="gatt_cache.json"
+        out['gatt_cache_ttl']=3600.0
         out['notif_MTU']=63
+        out['max_MTU']=247
         out['debug_bluez']=False
         out['trace']= "info"
         out["interface"]="hci0"
@@ -1632,11 +2821,12 @@ def BLE_init_parameters():
         blegw_parameters['interface']="hci0"
     fp.close()
 
-def getparam(name):
+def getparam(name,default=None):
     try:
         return blegw_parameters[name]
-    except KeyError :
-        return None
+    except (KeyError,NameError,TypeError) :
+        # TypeError: parameters not loaded
+        return default
 
 def getDataDir():
     return "/data/solidsense/ble_gateway"
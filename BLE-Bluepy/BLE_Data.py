@@ -11,6 +11,7 @@
 #-------------------------------------------------------------------------------
 
 import binascii
+import json
 import struct
 
 import btle
@@ -65,6 +66,7 @@ class Eddystone:
 class iBeacon:
 
     Apple_MfgID=0x004C
+    prefix=b'\x02\x15'
 
     @staticmethod
     def check(data):
@@ -73,6 +75,11 @@ class iBeacon:
         else:
             return False
 
+    @staticmethod
+    def checkRaw(data):
+        # type, length, uuid(16) major(2) minor(2) power(1)
+        return len(data) >= 23 and data[:2] == iBeacon.prefix
+
     @staticmethod
     def strUUID(binVal) :
         s = binascii.b2a_hex(binVal).decode('utf-8')
@@ -106,6 +113,17 @@ class BLE_DataService():
         except KeyError :
             return data
         return service._convert(data)
+
+    @staticmethod
+    def decodeNative(id,data):
+        '''
+        Decode the service data bytes into native values using the registered layout
+        '''
+        try:
+            service=BLE_DataService.services[id]
+        except KeyError :
+            return data
+        return service.native(data)
     @staticmethod
     def service(id):
         try:
@@ -118,11 +136,56 @@ class BLE_DataService():
     def type_string(type):
         return BLE_DataService.types[type]
 
-    def __init__(self,id,name,convert,type):
+    def __init__(self,id,name,convert,type,layout=None,scale=1,fields=None,split=None):
+        '''
+        convert: converter of the hexadecimal string (compatibility)
+        layout: struct format of the service data bytes, scale: divisor applied to each field
+        fields: names of the values, a single name gives a scalar value
+        split: optional function transforming the unpacked tuple into the fields (bit fields)
+        '''
         self._id=id
         self._name=name
         self._convert=convert
         self._type=type
+        self._layout=None if layout is None else struct.Struct(layout)
+        self._scale=scale
+        self._fields=fields
+        self._split=split
+        if self._layout is not None :
+            self._unpack=self._layout.unpack_from
+            self._single=len(fields) == 1
+
+    def native(self,data):
+        '''
+        Returns the native value(s) from the service data bytes, the bytes if there is no layout
+        and None if the data is too short
+        '''
+        if self._layout is None :
+            return data
+        try:
+            vals=self._unpack(data)
+        except struct.error :
+            return None
+        if self._split is not None :
+            vals=self._split(vals)
+        if self._scale != 1 :
+            if self._single :
+                return vals[0] / self._scale
+            vals=[v / self._scale for v in vals]
+        if self._single :
+            return vals[0]
+        return dict(zip(self._fields,vals))
+
+    def value(self,data):
+        '''
+        Returns the value as the string converters do: scalar or JSON string
+        '''
+        if self._layout is not None and len(data) >= self._layout.size :
+            val=self.native(data)
+            if type(val) is dict :
+                return json.dumps(val,separators=(',',':'))
+            return val
+        return self._convert(binascii.b2a_hex(data).decode('ascii'))
 
     def type(self):
         return self._type
@@ -160,33 +223,46 @@ def convertH3ValJson(value):
     return s
 def donotConvert(value):
     return value
+def splitLevelCounter(vals):
+    return (vals[0] & 1, vals[0] >> 1)
 
 data_services= [
     BLE_DataService(0x0000,"Default Service",donotConvert,BLE_DataService.BTRAW),
-    BLE_DataService(0x2A19,"battery-level",convertH2Bint,BLE_DataService.INT) ,
-    BLE_DataService(0x2A6E,"temperature",convertH4Bfloat,BLE_DataService.FLOAT),
-    BLE_DataService(0x2A6F,"humidity",convertH2Bint,BLE_DataService.INT),
-    BLE_DataService(0x2A06,"alert-level",convertH4BDJson,BLE_DataService.STRING),
-    BLE_DataService(0x2A3F,"alert-status",convertH2Bint,BLE_DataService.INT),
-    BLE_DataService(0x2AA1,"magnetic-flux-density-3D",convertH3ValJson,BLE_DataService.STRING),
-    BLE_DataService(0x2A58,"analog", convertH4Bint, BLE_DataService.INT),
+    BLE_DataService(0x2A19,"battery-level",convertH2Bint,BLE_DataService.INT,'<B',1,("battery-level",)) ,
+    BLE_DataService(0x2A6E,"temperature",convertH4Bfloat,BLE_DataService.FLOAT,'<H',100,("temperature",)),
+    BLE_DataService(0x2A6F,"humidity",convertH2Bint,BLE_DataService.INT,'<B',1,("humidity",)),
+    BLE_DataService(0x2A06,"alert-level",convertH4BDJson,BLE_DataService.STRING,'<H',1,("level","counter"),splitLevelCounter),
+    BLE_DataService(0x2A3F,"alert-status",convertH2Bint,BLE_DataService.INT,'<B',1,("alert-status",)),
+    BLE_DataService(0x2AA1,"magnetic-flux-density-3D",convertH3ValJson,BLE_DataService.STRING,'<HHH',1,("x","y","z")),
+    BLE_DataService(0x2A58,"analog", convertH4Bint, BLE_DataService.INT,'<H',1,("analog",)),
     BLE_DataService(Eddystone.serviceUUID,"eddystone",donotConvert,BLE_DataService.BTRAW),
-    BLE_DataService(0x180F,"battery-level",convertH2Bint,BLE_DataService.INT) # BUG ELA
+    BLE_DataService(0x180F,"battery-level",convertH2Bint,BLE_DataService.INT,'<B',1,("battery-level",)) # BUG ELA
 ]
 
 class BLE_ServiceData():
+    '''
+    Holds the raw service data bytes, the value is converted on first request
+    '''
+    __slots__=('_uuid','_service','_raw','_value')
 
     def __init__(self,serviceid,data):
         self._uuid=serviceid
         self._service=BLE_DataService.service(serviceid)
-        self._value=BLE_DataService.decode(serviceid,data)
+        self._raw=data
+        self._value=None
 
     def service_uuid(self):
         return self._uuid
     def type(self):
         return self._service.type()
     def value(self):
+        if self._value is None :
+            self._value=self._service.value(self._raw)
         return self._value
+    def nativeValue(self):
+        return self._service.native(self._raw)
+    def raw(self):
+        return self._raw
     def name(self):
         if self._service._id != 0 :
             return self._service.name()
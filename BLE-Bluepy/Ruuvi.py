@@ -10,9 +10,38 @@
 #-------------------------------------------------------------------------------
 
 import math
+import struct
+
+try:
+    import numpy
+except ImportError:
+    # only needed for the batch decoding
+    numpy = None
 
 import BLE_Client
 
+Ruuvi_MfgID = 0x0499
+
+if numpy is not None:
+    # Data Format 3 payload (manufacturer data after the company ID), big endian
+    ruuvi_df3_raw = numpy.dtype({
+        'names': ['format', 'humidity', 'temperature', 'temperature_frac', 'pressure', 'acceleration', 'battery'],
+        'formats': ['u1', 'u1', 'u1', 'u1', '>u2', ('>i2', 3), '>u2'],
+        'offsets': [0, 1, 2, 3, 4, 6, 12],
+        'itemsize': 14})
+
+    # decoded values, one record per payload
+    ruuvi_df3_record = numpy.dtype([
+        ('valid', '?'),
+        ('relative_humidity', 'f4'),
+        ('temperature', 'f4'),
+        ('pressure', 'f4'),
+        ('battery', 'u2'),
+        ('acceleration', 'f4'),
+        ('acceleration_x', 'i2'),
+        ('acceleration_y', 'i2'),
+        ('acceleration_z', 'i2')])
+
 
 class RuuviRaw:
     '''
@@ -58,8 +87,12 @@ class RuuviRaw:
         Returns:
             dict: Sensor values
         '''
+        return self.decode_payload(self._device.mfgDataRaw())
 
-        byte_data = bytearray.fromhex(self._device.mfgData())
+    def decode_payload(self, byte_data):
+        '''
+        Decode one Data Format 3 payload (manufacturer data after the company ID)
+        '''
         acc_x, acc_y, acc_z = self._get_acceleration(byte_data)
         return {
             #'data_format': 3,
@@ -75,6 +108,41 @@ class RuuviRaw:
 
 
 
+    @staticmethod
+    def decode_batch(payloads):
+        '''
+        Decode a list of Data Format 3 payloads at once.
+        Returns:
+            numpy structured array (ruuvi_df3_record), one record per payload,
+            'valid' is False for the payloads that are not Data Format 3
+        '''
+        if numpy is None:
+            raise ImportError("RuuviRaw.decode_batch requires numpy")
+        n = len(payloads)
+        out = numpy.zeros(n, dtype=ruuvi_df3_record)
+        if n == 0:
+            return out
+        # one row of 14 bytes per payload, short payloads are padded then invalidated
+        size = ruuvi_df3_raw.itemsize
+        buf = b''.join([p[:size].ljust(size, b'\0') for p in payloads])
+        raw = numpy.frombuffer(buf, dtype=ruuvi_df3_raw)
+        lengths = numpy.fromiter((len(p) for p in payloads), dtype=numpy.int32, count=n)
+        out['valid'] = (raw['format'] == 3) & (lengths >= size)
+
+        out['relative_humidity'] = raw['humidity'] * 0.5
+        # sign and magnitude, fraction in 1/100
+        temp = (raw['temperature'] & 0x7F) + raw['temperature_frac'] / 100.
+        out['temperature'] = numpy.round(numpy.where(raw['temperature'] & 0x80, -temp, temp), 2)
+        out['pressure'] = (raw['pressure'].astype(numpy.int32) + 50000) / 100.
+        out['battery'] = raw['battery']
+        acc = raw['acceleration']
+        out['acceleration_x'] = acc[:, 0]
+        out['acceleration_y'] = acc[:, 1]
+        out['acceleration_z'] = acc[:, 2]
+        acc = acc.astype(numpy.float32)
+        out['acceleration'] = numpy.sqrt((acc * acc).sum(axis=1))
+        return out
+
     def twos_complement(self,value, bits):
         if (value & (1 << (bits - 1))) != 0:
             value = value - (1 << bits)
@@ -87,6 +155,121 @@ class RuuviRaw:
         '''
         return (val % 0x100000000) >> n
 
+class RuuviRecord:
+    '''
+    Values decoded from one advertisement, None when the sensor reports
+    the value as not available
+    The same record can be filled again by RuuviDecoder.decode
+    '''
+    __slots__ = ('data_format', 'temperature', 'humidity', 'pressure',
+                 'acceleration_x', 'acceleration_y', 'acceleration_z', 'battery',
+                 'tx_power', 'movement_counter', 'measurement_sequence', 'mac')
+
+    def __init__(self):
+        for f in RuuviRecord.__slots__:
+            setattr(self, f, None)
+
+    @property
+    def acceleration(self):
+        '''Return the norm of the acceleration mG'''
+        if self.acceleration_x is None or self.acceleration_y is None or self.acceleration_z is None:
+            return None
+        return math.sqrt(self.acceleration_x * self.acceleration_x +
+                         self.acceleration_y * self.acceleration_y +
+                         self.acceleration_z * self.acceleration_z)
+
+    def as_dict(self):
+        '''
+        Returns the values with the keys of RuuviRaw.decode_data, plus the Data Format 5 ones
+        '''
+        out = {
+            'data_format': self.data_format,
+            'relative_humidity': self.humidity,
+            'temperature': self.temperature,
+            'pressure': self.pressure,
+            'battery': self.battery,
+            'acceleration': self.acceleration,
+            'acceleration_x': self.acceleration_x,
+            'acceleration_y': self.acceleration_y,
+            'acceleration_z': self.acceleration_z
+        }
+        if self.data_format == 5:
+            out['tx_power'] = self.tx_power
+            out['movement_counter'] = self.movement_counter
+            out['measurement_sequence'] = self.measurement_sequence
+            out['mac'] = self.mac
+        return out
+
+
+_no_mac = b'\xff' * 6
+
+
+class RuuviDecoder:
+    '''
+    Decodes RuuviTag Data Format 3 (RAWv1) and 5 (RAWv2) from the manufacturer
+    data (after the company ID), one unpack per advertisement
+    https://github.com/ruuvi/ruuvi-sensor-protocols
+    '''
+    # format, humidity, temperature (sign + integer), temperature fraction, pressure, acceleration x y z, battery
+    _df3 = struct.Struct('>BBBBHhhhH')
+    # format, temperature, humidity, pressure, acceleration x y z, power info, movement counter, sequence, mac
+    _df5 = struct.Struct('>BhHHhhhHBH6s')
+
+    def decode(self, data, record=None):
+        '''
+        Decode one payload into record (a new RuuviRecord if None)
+        Returns:
+            the record, None if the format is not supported or the payload is too short
+        '''
+        if len(data) == 0:
+            return None
+        fmt = data[0]
+        if fmt == 5:
+            if len(data) < RuuviDecoder._df5.size:
+                return None
+            if record is None:
+                record = RuuviRecord()
+            self._decode_df5(data, record)
+            return record
+        elif fmt == 3:
+            if len(data) < RuuviDecoder._df3.size:
+                return None
+            if record is None:
+                record = RuuviRecord()
+            self._decode_df3(data, record)
+            return record
+        return None
+
+    @staticmethod
+    def _decode_df3(data, r):
+        (r.data_format, hum, temp, frac, pres,
+         r.acceleration_x, r.acceleration_y, r.acceleration_z, r.battery) = RuuviDecoder._df3.unpack_from(data)
+        r.humidity = hum * 0.5
+        t = (temp & 0x7F) + frac / 100
+        r.temperature = round(-t if temp & 0x80 else t, 2)
+        r.pressure = (pres + 50000) / 100
+        r.tx_power = r.movement_counter = r.measurement_sequence = r.mac = None
+
+    @staticmethod
+    def _decode_df5(data, r):
+        (r.data_format, temp, hum, pres, ax, ay, az,
+         power, move, seq, mac) = RuuviDecoder._df5.unpack_from(data)
+        # 0x8000 for the signed values and all bits set for the unsigned ones mean not available
+        r.temperature = None if temp == -0x8000 else round(temp * 0.005, 3)
+        r.humidity = None if hum == 0xFFFF else round(hum * 0.0025, 4)
+        r.pressure = None if pres == 0xFFFF else (pres + 50000) / 100
+        r.acceleration_x = None if ax == -0x8000 else ax
+        r.acceleration_y = None if ay == -0x8000 else ay
+        r.acceleration_z = None if az == -0x8000 else az
+        battery = power >> 5
+        tx = power & 0x1F
+        r.battery = None if battery == 0x7FF else battery + 1600
+        r.tx_power = None if tx == 0x1F else tx * 2 - 40
+        r.movement_counter = None if move == 0xFF else move
+        r.measurement_sequence = None if seq == 0xFFFF else seq
+        r.mac = None if mac == _no_mac else mac.hex(':')
+
+
 def main():
     pass
 
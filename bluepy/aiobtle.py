@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+
+"""
+asyncio interface to bluepy-helper
+
+The helper process is driven through asyncio subprocess streams, so one
+event loop can run the scanner and many connections without a thread
+per helper. Responses are decoded by the same functions as btle.
+Notifications are passed to the delegate as soon as they are read.
+"""
+import asyncio
+import binascii
+import subprocess
+
+import btle
+from btle import (BluepyHelper, ScanResp, ScanEntry, LazyScanEntry, Service,
+                  Characteristic, Descriptor, DefaultDelegate, UUID, DBG,
+                  FRAME_START, ADDR_TYPE_PUBLIC, ADDR_TYPE_RANDOM,
+                  BTLEInternalError, BTLEDisconnectError, BTLEManagementError)
+
+
+class AsyncBluepyHelper:
+    def __init__(self):
+        self._helper = None
+        self._reader = None
+        self._responses = None
+        self._cmdLock = None
+        self.delegate = DefaultDelegate()
+
+    def withDelegate(self, delegate_):
+        self.delegate = delegate_
+        return self
+
+    async def _startHelper(self, iface=None):
+        if self._helper is None:
+            args, env = BluepyHelper.helperArgs(iface)
+            DBG("Running ", args[0])
+            self._helper = await asyncio.create_subprocess_exec(*args,
+                                            stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL,
+                                            env=env,
+                                            preexec_fn=btle.preexec_function)
+            self._responses = asyncio.Queue()
+            self._cmdLock = asyncio.Lock()
+            self._reader = asyncio.ensure_future(self._readLoop(self._helper.stdout, self._responses))
+
+    async def _stopHelper(self):
+        if self._helper is not None:
+            helper = self._helper
+            self._helper = None
+            DBG("Stopping ", btle.helperExe())
+            try:
+                helper.stdin.write(b"quit\n")
+                await helper.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            await helper.wait()
+            self._reader.cancel()
+            self._reader = None
+
+    async def _readLoop(self, stdout, responses):
+        # reads the messages from the helper until end of file
+        try:
+            while True:
+                first = await stdout.read(1)
+                if len(first) == 0:
+                    break
+                if first[0] == FRAME_START:
+                    hdr = await stdout.readexactly(2)
+                    msg = first + hdr + await stdout.readexactly(hdr[0] | (hdr[1] << 8))
+                elif first == b'\n':
+                    continue
+                else:
+                    msg = first + await stdout.readline()
+                resp = BluepyHelper.decodeMessage(msg)
+                if resp is not None:
+                    self._dispatch(resp, responses)
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            # end of file marker
+            responses.put_nowait(None)
+
+    def _dispatch(self, resp, responses):
+        responses.put_nowait(resp)
+
+    async def _writeCmd(self, cmd):
+        if self._helper is None:
+            raise BTLEInternalError("Helper not started (did you call connect()?)")
+        DBG("Sent: ", cmd)
+        self._helper.stdin.write(cmd.encode('utf-8'))
+        await self._helper.stdin.drain()
+
+    async def _waitResp(self, wantType, timeout=None):
+        if isinstance(wantType, list) is not True:
+            wantType = [wantType]
+        while True:
+            if self._helper is None:
+                return None
+            try:
+                resp = await asyncio.wait_for(self._responses.get(), timeout)
+            except asyncio.TimeoutError:
+                DBG("Response timeout")
+                return None
+            if resp is None:
+                await self._stopHelper()
+                raise BTLEInternalError("Helper exited")
+
+            if type(resp) is ScanResp:
+                if 'scan' in wantType:
+                    return resp
+                # Scan response when we weren't interested. Ignore it
+                continue
+
+            respType = resp['rsp'][0]
+            if respType in wantType:
+                return resp
+            elif respType == 'stat':
+                if 'state' in resp and len(resp['state']) > 0 and resp['state'][0] == 'disc':
+                    await self._stopHelper()
+                    raise BTLEDisconnectError("Device disconnected", resp)
+            elif respType == 'err':
+                BluepyHelper.raiseError(resp)
+            else:
+                raise BTLEInternalError("Unexpected response (%s)" % respType, resp)
+
+    async def _command(self, cmd, wantType, timeout=None):
+        # one command and its response at a time on a helper
+        async with self._cmdLock:
+            await self._writeCmd(cmd)
+            return await self._waitResp(wantType, timeout)
+
+    async def _mgmtCmd(self, cmd):
+        rsp = await self._command(cmd + '\n', 'mgmt')
+        if rsp['code'][0] != 'success':
+            await self._stopHelper()
+            raise BTLEManagementError("Failed to execute management command '%s'" % (cmd), rsp)
+
+    async def status(self):
+        return await self._command("stat\n", 'stat')
+
+
+class AsyncScanner(AsyncBluepyHelper):
+    """
+    Scanner driven by asyncio, the reports are obtained with
+        async for (entry, isNewDev, isNewData) in scanner.advertisements(timeout):
+    or by iterating directly on the scanner (no timeout)
+    The delegate handleDiscovery is also called for each report
+    """
+    def __init__(self, iface=0, lazy=False):
+        AsyncBluepyHelper.__init__(self)
+        self.scanned = {}
+        self.iface = iface
+        self.passive = False
+        self._entryClass = LazyScanEntry if lazy else ScanEntry
+
+    def _cmd(self):
+        return "pasv" if self.passive else "scan"
+
+    async def start(self, passive=False):
+        self.passive = passive
+        await self._startHelper(iface=self.iface)
+        await self._mgmtCmd("le on")
+        rsp = await self._command(self._cmd() + "\n", 'mgmt')
+        if rsp["code"][0] == "success":
+            return
+        # Sometimes previous scan still ongoing
+        if rsp["code"][0] == "busy":
+            await self._mgmtCmd(self._cmd() + "end")
+            rsp = await self._waitResp("stat")
+            assert rsp["state"][0] == "disc"
+            await self._mgmtCmd(self._cmd())
+
+    async def stop(self):
+        await self._mgmtCmd(self._cmd() + "end")
+        await self._stopHelper()
+
+    def clear(self):
+        self.scanned = {}
+
+    async def advertisements(self, timeout=None):
+        if self._helper is None:
+            raise BTLEInternalError(
+                                "Helper not started (did you call start()?)")
+        loop = asyncio.get_event_loop()
+        end = None if timeout is None else loop.time() + timeout
+        while True:
+            if end is None:
+                remain = 10.0
+            else:
+                remain = end - loop.time()
+                if remain <= 0.0:
+                    break
+            resp = await self._waitResp(['scan', 'stat'], remain)
+            if resp is None:
+                if self._helper is None:
+                    break
+                # nothing received, check the helper is still scanning
+                await self._writeCmd('stat\n')
+                continue
+
+            if type(resp) is ScanResp:
+                dev = self.scanned.get(resp.mac)
+                if dev is None:
+                    dev = self._entryClass(resp.mac, self.iface)
+                    self.scanned[resp.mac] = dev
+                isNewData = dev._update(resp)
+                isNewDev = dev.updateCount <= 1
+                if self.delegate is not None:
+                    self.delegate.handleDiscovery(dev, isNewDev, isNewData)
+                yield (dev, isNewDev, isNewData)
+
+            elif resp['state'][0] == 'disc':
+                # if scan ended, restart it
+                await self._mgmtCmd(self._cmd())
+
+    def __aiter__(self):
+        return self.advertisements().__aiter__()
+
+    def getDevices(self):
+        return self.scanned.values()
+
+    async def scan(self, timeout=10, passive=False):
+        self.clear()
+        await self.start(passive=passive)
+        async for report in self.advertisements(timeout):
+            pass
+        await self.stop()
+        return self.getDevices()
+
+
+class AsyncPeripheral(AsyncBluepyHelper):
+    """
+    GATT client driven by asyncio
+    Service, Characteristic and Descriptor objects returned here only hold
+    the handles: their own read/write methods are synchronous and shall not
+    be used, use the methods of the AsyncPeripheral with the handles instead
+    Notifications are sent to the delegate handleNotification as soon as received
+    """
+    def __init__(self):
+        AsyncBluepyHelper.__init__(self)
+        self._serviceMap = None # Indexed by UUID
+        self._notified = None
+        (self.addr, self.addrType, self.iface) = (None, None, None)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        await self.disconnect()
+
+    def _dispatch(self, resp, responses):
+        if type(resp) is not ScanResp and resp['rsp'][0] in ('ntfy', 'ind'):
+            if self.delegate is not None:
+                self.delegate.handleNotification(resp['hnd'][0], resp['d'][0])
+            if self._notified is not None:
+                self._notified.set()
+            return
+        responses.put_nowait(resp)
+
+    async def connect(self, addr, addrType=ADDR_TYPE_PUBLIC, iface=None, mtu=0):
+        if isinstance(addr, ScanEntry):
+            (addr, addrType, iface) = (addr.addr, addr.addrType, addr.iface)
+        if len(addr.split(":")) != 6:
+            raise ValueError("Expected MAC address, got %s" % repr(addr))
+        if addrType not in (ADDR_TYPE_PUBLIC, ADDR_TYPE_RANDOM):
+            raise ValueError("Expected address type public or random, got {}".format(addrType))
+        await self._startHelper(iface)
+        self._notified = asyncio.Event()
+        self.addr = addr
+        self.addrType = addrType
+        self.iface = iface
+        if iface is not None:
+            cmd = "conn %s %s %s\n" % (addr, addrType, "hci"+str(iface))
+        else:
+            cmd = "conn %s %s\n" % (addr, addrType)
+        async with self._cmdLock:
+            await self._writeCmd(cmd)
+            rsp = await self._waitResp('stat')
+            while rsp['state'][0] == 'tryconn':
+                rsp = await self._waitResp('stat')
+            if rsp['state'][0] != 'conn':
+                # let try to get more info so it can be passed back via Exception
+                rsp = await self._waitResp('err', 0.2)
+                await self._stopHelper()
+                raise BTLEDisconnectError("Failed to connect to peripheral %s, addr type: %s" % (addr, addrType), rsp)
+        if mtu > 23:
+            await self.setMTU(mtu)
+        return self
+
+    async def disconnect(self):
+        if self._helper is None:
+            return
+        # Unregister the delegate first
+        self.delegate = None
+        await self._command("disc\n", 'stat')
+        await self._stopHelper()
+
+    async def discoverServices(self):
+        rsp = await self._command("svcs\n", 'find')
+        starts = rsp['hstart']
+        ends   = rsp['hend']
+        uuids  = rsp['uuid']
+        self._serviceMap = {}
+        for i in range(len(uuids)):
+            self._serviceMap[UUID(uuids[i])] = Service(self, uuids[i], starts[i], ends[i])
+        return self._serviceMap
+
+    async def getServices(self):
+        if self._serviceMap is None:
+            await self.discoverServices()
+        return self._serviceMap.values()
+
+    async def getServiceByUUID(self, uuidVal):
+        uuid = UUID(uuidVal)
+        if self._serviceMap is not None and uuid in self._serviceMap:
+            return self._serviceMap[uuid]
+        rsp = await self._command("svcs %s\n" % uuid, 'find')
+        if 'hstart' not in rsp:
+            raise btle.BTLEGattError("Service %s not found" % (uuid.getCommonName()), rsp)
+        svc = Service(self, uuid, rsp['hstart'][0], rsp['hend'][0])
+        if self._serviceMap is None:
+            self._serviceMap = {}
+        self._serviceMap[uuid] = svc
+        return svc
+
+    async def getCharacteristics(self, startHnd=1, endHnd=0xFFFF, uuid=None):
+        cmd = 'char %X %X' % (startHnd, endHnd)
+        if uuid:
+            cmd += ' %s' % UUID(uuid)
+        rsp = await self._command(cmd + "\n", 'find')
+        nChars = len(rsp['hnd'])
+        return [Characteristic(self, rsp['uuid'][i], rsp['hnd'][i],
+                               rsp['props'][i], rsp['vhnd'][i])
+                for i in range(nChars)]
+
+    async def getDescriptors(self, startHnd=1, endHnd=0xFFFF):
+        resp = await self._command("desc %X %X\n" % (startHnd, endHnd), 'desc')
+        ndesc = len(resp['hnd'])
+        return [Descriptor(self, resp['uuid'][i], resp['hnd'][i]) for i in range(ndesc)]
+
+    async def readCharacteristic(self, handle):
+        resp = await self._command("rd %X\n" % handle, 'rd')
+        return resp['d'][0]
+
+    async def writeCharacteristic(self, handle, val, withResponse=False):
+        cmd = "wrr" if withResponse else "wr"
+        return await self._command("%s %X %s\n" % (cmd, handle, binascii.b2a_hex(val).decode('utf-8')), 'wr')
+
+    async def setSecurityLevel(self, level):
+        return await self._command("secu %s\n" % level, 'stat')
+
+    async def setMTU(self, mtu):
+        DBG("set MTU:",mtu)
+        return await self._command("mtu %x\n" % mtu, 'stat')
+
+    async def getState(self):
+        status = await self.status()
+        return status['state'][0]
+
+    async def waitForNotifications(self, timeout):
+        """
+        Waits until at least one notification has been delivered to the delegate
+        """
+        self._notified.clear()
+        try:
+            await asyncio.wait_for(self._notified.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
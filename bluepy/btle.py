@@ -11,6 +11,12 @@ import binascii
 import select
 import struct
 import signal
+import threading
+import functools
+import bisect
+import atexit
+from array import array
+from collections import namedtuple, OrderedDict, deque
 
 def preexec_function():
     # Ignore the SIGINT signal by setting the handler to the standard
@@ -23,6 +29,7 @@ This allowing to dynamically set the traces for low level python and Bluez
 SolidSense addition by Sterwen Technology
 '''
 Debugging = False
+Framing = True
 script_path = os.path.join(os.path.abspath(os.path.dirname(__file__)))
 solidsense_path="/opt/SolidSense/bin"
 
@@ -37,6 +44,22 @@ def Bluepy_debug(flag):
     global Debugging
     Debugging= flag
 
+def Bluepy_framing(flag):
+    """
+    Select the binary framing (True) or the text lines (False) for the responses
+    sent by the helper processes started afterwards
+    """
+    global Framing
+    Framing= flag
+
+def Bluepy_helper_pool(size, iface=None):
+    """
+    Keep size idle helper processes started for iface, handed to the
+    Peripheral objects on connect and given back on disconnect (0 disables)
+    """
+    if size > 0 or HelperPool.running():
+        HelperPool.instance().setSize(iface, size)
+
 def helperExe():
     global Debugging
     if Debugging :
@@ -53,6 +76,47 @@ SEC_LEVEL_HIGH = "high"
 ADDR_TYPE_PUBLIC = "public"
 ADDR_TYPE_RANDOM = "random"
 
+# Binary framing of the helper responses
+# A frame is: FRAME_START, 16 bits little endian length of the body, body
+# The body is a sequence of fields: tag code (index in frameTags), type sigil
+# then the value: 32 bits little endian for 'h', 8 bits length + characters
+# for '$' and "'", 16 bits length + raw bytes for 'b'
+# frameTags shall be kept in sync with frame_tags in bluepy-helper.c
+FRAME_START = 0x02
+frameTags = ( 'rsp', 'code', 'estat', 'emsg', 'hnd', 'uuid', 'd', 'state',
+              'sec', 'mtu', 'dst', 'hstart', 'hend', 'props', 'vhnd', 'addr',
+              'type', 'rssi', 'flag', 'fwd', 'supp', 'nb' )
+_frameUint = struct.Struct('<I')
+_frameLen = struct.Struct('<H')
+
+# Scan reports are by far the most frequent responses, they are decoded
+# into a ScanResp record instead of the generic dictionary of lists
+# rssi is already negated (dBm) and addr is the formatted address
+ScanResp = namedtuple('ScanResp', ('mac', 'addrType', 'rssi', 'flag', 'data'))
+_SCAN_TEXT = 'rsp=$scan\x1e'
+# frame header, rsp=$scan and the start of the addr field
+_SCAN_FRAME = b'\x00$\x04scan\x0fb\x06\x00'
+_SCAN_FIXED = 3 + len(_SCAN_FRAME)
+# addr, type, rssi, flag fields (tag codes are checked by _SCAN_TAGS)
+_scanFrame = struct.Struct('<6sBxIBxIBxI')
+_SCAN_TAGS = (0x10, 0x11, 0x12)
+_SCAN_DATA = _SCAN_FIXED + _scanFrame.size
+_dataLen = struct.Struct('<H')
+
+# MAC addresses are kept as 48 bits integers, the string form is built on demand
+def _scanMac(raw):
+    if isinstance(raw, bytes):
+        return int.from_bytes(raw, 'big')
+    return int(raw, 16)
+
+def addrToMac(addr):
+    '''Converts a MAC address string (aa:bb:cc:dd:ee:ff) to its integer value'''
+    return int(addr.replace(':', ''), 16)
+
+def macToAddr(mac):
+    '''Converts a MAC address integer value to its string form (lower case)'''
+    return mac.to_bytes(6, 'big').hex(':')
+
 
 class BTLEException(Exception):
     """Base class for all Bluepy exceptions"""
@@ -107,12 +171,45 @@ class UUID:
     """
     Set of modifications made by L. Carré (Sterwen Technology)
     to improve the and optimise the management of short UUID
+
+    UUID objects are immutable and interned: constructing a UUID from the
+    same int, string or UUID returns the same object, so that comparisons
+    and dictionary lookups do not need to convert again.
+    Objects created with a commonName are private and not interned.
+    String form, best string and hash are computed once.
     """
+    _interned = {}     # construction value (int or str) -> UUID
+    _byBin = {}        # 128 bits binary value -> UUID
+    _INTERN_SIZE = 4096
+
+    def __new__(cls, val, commonName=None):
+        if commonName is None:
+            if isinstance(val, cls):
+                return val
+            try:
+                return cls._interned[val]
+            except (KeyError, TypeError):
+                pass
+        self = object.__new__(cls)
+        self._setup(val)
+        self.commonName = commonName
+        if commonName is not None or not isinstance(val, (int, str)):
+            return self
+        if len(cls._interned) >= cls._INTERN_SIZE:
+            cls._interned.clear()
+            cls._byBin.clear()
+        uuid = cls._byBin.setdefault(self.binVal, self)
+        cls._interned[val] = uuid
+        return uuid
+
     def __init__(self, val, commonName=None):
+        # all the work is done once in __new__
+        pass
+
+    def _setup(self, val):
         '''We accept: 32-digit hex strings, with and without '-' characters,
            4 to 8 digit hex strings, and integers'''
         self._shortBinVal = 0
-        # print("***UUID init(1) val:",val," |",type(val))
         if isinstance(val, int):
             if (val < 0) or (val > 0xFFFFFFFF):
                 raise ValueError(
@@ -120,7 +217,7 @@ class UUID:
             self._shortBinVal=val   #add a
             val = "%04X" % val
 
-        elif isinstance(val, self.__class__):
+        elif isinstance(val, UUID):
                 self._shortBinVal=val.getShortUUID()
                 val = str(val)
         elif isinstance(val,str):
@@ -130,7 +227,6 @@ class UUID:
             val = str(val)  # Do our best
 
         val = val.replace("-", "").upper()
-        # print("UUID init(2) short=",self._shortBinVal," val=",val)
         if self._shortBinVal != 0 and len(val) != 32 :  # Short form
             val = ("0" * (8 - len(val))) + val + "00001000800000805F9B34FB"
         elif val.endswith("00001000800000805F9B34FB") and self._shortBinVal == 0:
@@ -140,38 +236,44 @@ class UUID:
                 self._shortBinVal=int(s,16)
 
         self.binVal = binascii.a2b_hex(val.encode('utf-8'))
-        # print("***UUID init(3) long val:",val,"| short=",("%04X"%self._shortBinVal))
         if len(self.binVal) != 16:
             raise ValueError(
                 "UUID must be 16 bytes, got '%s' (len=%d)" % (val,
                                                               len(self.binVal)))
-        self.commonName = commonName
+        s = binascii.b2a_hex(self.binVal).decode('utf-8')
+        self._str = "-".join([s[0:8], s[8:12], s[12:16], s[16:20], s[20:32]])
+        self._hash = hash(self.binVal)
+        if self._shortBinVal != 0:
+            if self._shortBinVal <= 0xFFFF :
+                self._bestStr = "%04X" % self._shortBinVal
+            else:
+                self._bestStr = "%08X" % self._shortBinVal
+        else:
+            self._bestStr = self._str
 
     def __str__(self):
-        s = binascii.b2a_hex(self.binVal).decode('utf-8')
-        return "-".join([s[0:8], s[8:12], s[12:16], s[16:20], s[20:32]])
+        return self._str
 
     def __eq__(self, other):
-        return self.binVal == UUID(other).binVal
+        if self is other:
+            return True
+        if not isinstance(other, UUID):
+            try:
+                other = UUID(other)
+            except ValueError:
+                return False
+        return self.binVal == other.binVal
 
     def __cmp__(self, other):
         return cmp(self.binVal, UUID(other).binVal)
 
     def __hash__(self):
-        return hash(self.binVal)
+        return self._hash
 
     def getCommonName(self):
         s = AssignedNumbers.getCommonName(self)
         if s:
             return s
-        """
-        s = str(self)
-        if s.endswith("-0000-1000-8000-00805f9b34fb"):
-            s = s[0:8]
-            if s.startswith("0000"):
-                s = s[4:]
-        return s
-        """
         return self.bestStr()
 
     def getShortUUID(self):
@@ -181,13 +283,7 @@ class UUID:
         return "%04X" % self._shortBinVal
 
     def bestStr(self):
-        if self._shortBinVal != 0:
-            if self._shortBinVal <= 0xFFFF :
-                return  "%04X" % self._shortBinVal
-            else:
-                return  "%08X" % self._shortBinVal
-        else:
-            return str(self)
+        return self._bestStr
 
 class Service:
     def __init__(self, *args):
@@ -256,6 +352,9 @@ class Characteristic:
     def write(self, val, withResponse=False):
         return self.peripheral.writeCharacteristic(self.valHandle, val, withResponse)
 
+    def writeStream(self, data, window=8):
+        return self.peripheral.writeStream(self.valHandle, data, window)
+
     def getDescriptors(self, forUUID=None, hndEnd=0xFFFF):
         if not self.descs:
             # Descriptors (not counting the value descriptor) begin after
@@ -331,12 +430,28 @@ class DefaultDelegate:
     def handleDiscovery(self, scanEntry, isNewDev, isNewData):
         DBG("Discovered device", scanEntry.addr)
 
+    def handleScanStats(self, forwarded, suppressed, addresses):
+        DBG("Scan reports forwarded", forwarded, "suppressed", suppressed, "addresses", addresses)
+
+    def handleLost(self, scanEntry):
+        DBG("Scan entry dropped", scanEntry.addr)
+
+def _exclusive(method):
+    # serializes the command / response exchanges on a helper between threads
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._ioLock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class BluepyHelper:
     def __init__(self):
+        self._ioLock = threading.RLock()
         self._helper = None
         self._poller = None
         self._stderr = None
         self._stopFlag = False
+        self._rbuf = bytearray()
         self.delegate = DefaultDelegate()
 
     def withDelegate(self, delegate_):
@@ -348,18 +463,32 @@ class BluepyHelper:
             # print("Bluez debug:",Debugging," Helper:",helperExe())
             DBG("Running ", helperExe())
             self._stderr = open(os.devnull, "w")
-            args=[helperExe()]
-            if iface is not None: args.append(str(iface))
+            args, env = BluepyHelper.helperArgs(iface)
             self._helper = subprocess.Popen(args,
                                             stdin=subprocess.PIPE,
                                             stdout=subprocess.PIPE,
                                             stderr=self._stderr,
-                                            universal_newlines=True,
+                                            env=env,
                                             preexec_fn = preexec_function)
+            self._rbuf = bytearray()
             self._poller = select.poll()
             self._poller.register(self._helper.stdout, select.POLLIN)
             self._stopFlag = False
 
+    @staticmethod
+    def helperArgs(iface=None):
+        """
+        Returns the command line and the environment to start a helper
+        """
+        args=[helperExe()]
+        if iface is not None: args.append(str(iface))
+        env = None
+        if Framing:
+            # older helpers ignore the variable and keep sending text lines
+            env = dict(os.environ)
+            env['BLUEPY_FRAMING'] = 'binary'
+        return args, env
+
     def _stopHelper(self):
         if self._helper is not None:
             if self._stopFlag :
@@ -368,21 +497,49 @@ class BluepyHelper:
             DBG("Stopping ", helperExe())
             self._stopFlag = True  # to avoid other threads to continue polling
             self._poller.unregister(self._helper.stdout)
-            self._helper.stdin.write("quit\n")
+            self._helper.stdin.write(b"quit\n")
             self._helper.stdin.flush()
             self._helper.wait()
             self._helper = None
+            self._rbuf = bytearray()
         if self._stderr is not None:
             self._stderr.close()
             self._stderr = None
 
+    def _killHelper(self):
+        # for helpers that may not read their input anymore: no quit command
+        if self._helper is not None:
+            try:
+                self._poller.unregister(self._helper.stdout)
+            except KeyError:
+                pass
+            self._helper.kill()
+            self._helper.wait()
+            for f in (self._helper.stdin, self._helper.stdout):
+                try:
+                    f.close()
+                except OSError:
+                    pass
+            self._helper = None
+            self._rbuf = bytearray()
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
+
+    def _takeHelper(self, other):
+        # moves the helper process of other to this object
+        self._helper, self._poller, self._stderr, self._rbuf = other._helper, other._poller, other._stderr, other._rbuf
+        other._helper, other._poller, other._stderr, other._rbuf = None, None, None, bytearray()
+        self._stopFlag = False
+
     def _writeCmd(self, cmd):
         if self._helper is None:
             raise BTLEInternalError("Helper not started (did you call connect()?)")
         DBG("Sent: ", cmd)
-        self._helper.stdin.write(cmd)
+        self._helper.stdin.write(cmd.encode('utf-8'))
         self._helper.stdin.flush()
 
+    @_exclusive
     def _mgmtCmd(self, cmd):
         self._writeCmd(cmd + '\n')
         rsp = self._waitResp('mgmt')
@@ -412,6 +569,153 @@ class BluepyHelper:
                 resp[tag].append(val)
         return resp
 
+    @staticmethod
+    def parseFrame(frame, pos=0):
+        """
+        Decode the body of a binary frame (starting at pos) into the
+        same dictionary of lists as parseResp
+        """
+        resp = {}
+        end = len(frame)
+        while pos < end:
+            try:
+                tag = frameTags[frame[pos]]
+            except IndexError:
+                raise BTLEInternalError("Unknown tag code %d in frame" % frame[pos])
+            vtype = frame[pos+1]
+            pos += 2
+            if vtype == 0x68: # 'h'
+                val = _frameUint.unpack_from(frame, pos)[0]
+                pos += 4
+            elif vtype == 0x62: # 'b'
+                vlen = _frameLen.unpack_from(frame, pos)[0]
+                pos += 2
+                val = frame[pos:pos+vlen]
+                pos += vlen
+            elif vtype == 0x24 or vtype == 0x27: # '$' or "'"
+                vlen = frame[pos]
+                pos += 1
+                val = frame[pos:pos+vlen].decode('utf-8')
+                pos += vlen
+            else:
+                raise BTLEInternalError("Cannot understand frame value type %d" % vtype)
+            if tag not in resp:
+                resp[tag] = [val]
+            else:
+                resp[tag].append(val)
+        return resp
+
+    @staticmethod
+    def parseScanLine(line):
+        """
+        Fast decoding of a text scan report, the fields come in the fixed
+        order sent by the helper. Returns None if the line is not in that form
+        """
+        if not line.startswith(_SCAN_TEXT):
+            return None
+        items = line.rstrip().split('\x1e')
+        n = len(items)
+        if n < 5 or n > 6 or not (items[1].startswith('addr=b') and items[2].startswith('type=h')
+                                  and items[3].startswith('rssi=h') and items[4].startswith('flag=h')):
+            return None
+        if n == 6:
+            if not items[5].startswith('d=b'):
+                return None
+            data = binascii.a2b_hex(items[5][3:])
+        else:
+            data = b''
+        hexAddr = items[1][6:]
+        return ScanResp(_scanMac(hexAddr), int(items[2][6:], 16),
+                        -int(items[3][6:], 16), int(items[4][6:], 16), data)
+
+    @staticmethod
+    def parseScanFrame(frame):
+        """
+        Fast decoding of a binary scan report (including the 3 bytes header)
+        Returns None if the frame does not have the expected layout
+        """
+        if frame[3:_SCAN_FIXED] != _SCAN_FRAME or len(frame) < _SCAN_DATA:
+            return None
+        addr, t1, addrType, t2, rssi, t3, flag = _scanFrame.unpack_from(frame, _SCAN_FIXED)
+        if (t1, t2, t3) != _SCAN_TAGS:
+            return None
+        if len(frame) > _SCAN_DATA:
+            # d field: tag, type, 16 bits length then the bytes, it shall end the frame
+            if len(frame) < _SCAN_DATA + 4 or frame[_SCAN_DATA:_SCAN_DATA + 2] != b'\x06b':
+                return None
+            if _SCAN_DATA + 4 + _dataLen.unpack_from(frame, _SCAN_DATA + 2)[0] != len(frame):
+                return None
+            data = frame[_SCAN_DATA + 4:]
+        else:
+            data = b''
+        return ScanResp(_scanMac(addr), addrType, -rssi, flag, data)
+
+    @staticmethod
+    def scanRecord(resp):
+        # converts a scan report decoded by the generic parsers into a ScanResp
+        if resp.get('rsp') != ['scan']:
+            return resp
+        raw = resp['addr'][0]
+        return ScanResp(_scanMac(raw), resp['type'][0], -resp['rssi'][0],
+                        resp['flag'][0], resp.get('d', [b''])[0])
+
+    def _messageEnd(self):
+        # returns the length of the first complete message in the read buffer, 0 if none
+        buf = self._rbuf
+        if len(buf) == 0:
+            return 0
+        if buf[0] == FRAME_START:
+            if len(buf) < 3:
+                return 0
+            end = 3 + (buf[1] | (buf[2] << 8))
+            if len(buf) < end:
+                return 0
+            return end
+        end = buf.find(b'\n')
+        return end + 1
+
+    def _fillBuffer(self):
+        # one read on the pipe, blocking until something is available
+        data = os.read(self._helper.stdout.fileno(), 4096)
+        self._rbuf += data
+        return len(data) > 0
+
+    def _readResp(self):
+        """
+        Read the next response from the helper: binary frames and text lines
+        can be mixed on the pipe. Returns None for comments, empty lines and end of file
+        """
+        end = self._messageEnd()
+        while end == 0:
+            if not self._fillBuffer():
+                end = len(self._rbuf)   # end of file
+                break
+            end = self._messageEnd()
+        msg = bytes(self._rbuf[:end])
+        del self._rbuf[:end]
+        return BluepyHelper.decodeMessage(msg)
+
+    @staticmethod
+    def decodeMessage(msg):
+        """
+        Decode one complete message (binary frame or text line)
+        Returns None for comments and empty lines
+        """
+        if len(msg) > 0 and msg[0] == FRAME_START:
+            resp = BluepyHelper.parseScanFrame(msg)
+            if resp is None:
+                resp = BluepyHelper.scanRecord(BluepyHelper.parseFrame(msg, 3))
+            DBG("Got frame:", resp)
+            return resp
+        rv = msg.decode('utf-8', 'replace')
+        DBG("Got:", repr(rv))
+        if rv.startswith('#') or rv == '\n' or len(rv)==0:
+            return None
+        resp = BluepyHelper.parseScanLine(rv)
+        if resp is None:
+            resp = BluepyHelper.scanRecord(BluepyHelper.parseResp(rv))
+        return resp
+
     def _waitResp(self, wantType, timeout=None):
         error_count=0
         while True:
@@ -421,15 +725,14 @@ class BluepyHelper:
                 # raise BTLEInternalError("Helper exited") # maybe a silent return is simpler
                 return None
 
-            if timeout:
+            if timeout and self._messageEnd() == 0:
                 fds = self._poller.poll(timeout*1000)
                 if len(fds) == 0:
                     DBG("Select timeout")
                     return None
 
-            rv = self._helper.stdout.readline()
-            DBG("Got:", repr(rv))
-            if rv.startswith('#') or rv == '\n' or len(rv)==0:
+            resp = self._readResp()
+            if resp is None:
                 error_count += 1
                 if error_count < 20:
                     continue
@@ -437,7 +740,12 @@ class BluepyHelper:
                     self._stopHelper()
                     raise BTLEInternalError("Communication error with helper")
 
-            resp = BluepyHelper.parseResp(rv)
+            if type(resp) is ScanResp:
+                if 'scan' in wantType:
+                    return resp
+                # Scan response when we weren't interested. Ignore it
+                continue
+
             if 'rsp' not in resp:
                 raise BTLEInternalError("No response type indicator", resp)
 
@@ -449,28 +757,223 @@ class BluepyHelper:
                     self._stopHelper()
                     raise BTLEDisconnectError("Device disconnected", resp)
             elif respType == 'err':
-                errcode=resp['code'][0]
-                if errcode=='nomgmt':
-                    raise BTLEManagementError("Management not available (permissions problem?)", resp)
-                elif errcode=='atterr':
-                    raise BTLEGattError("Bluetooth command failed", resp)
-                else:
-                    raise BTLEException("Error from bluepy-helper (%s)" % errcode, resp)
-            elif respType == 'scan':
-                # Scan response when we weren't interested. Ignore it
+                BluepyHelper.raiseError(resp)
+            elif respType in ('scan', 'filt', 'dstat'):
+                # Scan response, scan filter acknowledge or statistics when we weren't interested. Ignore it
                 continue
             else:
                 raise BTLEInternalError("Unexpected response (%s)" % respType, resp)
 
+    @staticmethod
+    def raiseError(resp):
+        # raises the exception matching an 'err' response
+        errcode=resp['code'][0]
+        if errcode=='nomgmt':
+            raise BTLEManagementError("Management not available (permissions problem?)", resp)
+        elif errcode=='atterr':
+            raise BTLEGattError("Bluetooth command failed", resp)
+        else:
+            raise BTLEException("Error from bluepy-helper (%s)" % errcode, resp)
+
+    @_exclusive
     def status(self):
         self._writeCmd("stat\n")
         return self._waitResp(['stat'])
 
 
+class HelperPool(threading.Thread):
+    """
+    Idle helper processes kept started per interface, so that a connection
+    does not wait for the helper start.
+    At least size helpers are kept idle, up to twice that number when they
+    are given back, so that a steady connect / disconnect flow does not start
+    and stop processes.
+    Helpers given back are reset and checked before being reused, idle
+    helpers are checked periodically and the dead or stuck ones are replaced
+    """
+    _instance = None
+    _instanceLock = threading.Lock()
+    checkInterval = 5.0
+    pingTimeout = 1.0
+
+    @staticmethod
+    def instance():
+        with HelperPool._instanceLock:
+            if HelperPool._instance is None:
+                HelperPool._instance = HelperPool()
+                HelperPool._instance.start()
+            return HelperPool._instance
+
+    @staticmethod
+    def running():
+        return HelperPool._instance is not None
+
+    @staticmethod
+    def shutdown():
+        with HelperPool._instanceLock:
+            pool = HelperPool._instance
+            HelperPool._instance = None
+        if pool is not None:
+            pool.stop()
+
+    def __init__(self):
+        threading.Thread.__init__(self, name="bluepy-helper-pool", daemon=True)
+        self._cond = threading.Condition()
+        self._sizes = {}        # iface: number of idle helpers to keep
+        self._idle = {}         # (iface, Framing): idle BluepyHelper objects
+        self._returned = []     # (iface, BluepyHelper) to be checked
+        self._stopFlag = False
+        self._nextCheck = time.time() + HelperPool.checkInterval
+        self._retry = 0.0       # no helper start before that time after a failure
+        self.started = 0
+        self.reused = 0
+        self.replaced = 0
+
+    def setSize(self, iface, size):
+        with self._cond:
+            self._sizes[iface] = size
+            self._cond.notify()
+
+    def nbIdle(self, iface=None):
+        with self._cond:
+            return len(self._idle.get((iface, Framing), ()))
+
+    def acquire(self, iface):
+        """
+        Returns an idle helper for iface or None
+        """
+        with self._cond:
+            idle = self._idle.get((iface, Framing))
+            while idle:
+                h = idle.pop()
+                if h._helper.poll() is None:
+                    self.reused += 1
+                    self._cond.notify()
+                    return h
+                self._returned.append((iface, h))
+            self._cond.notify()
+        return None
+
+    def release(self, h, iface):
+        """
+        Takes back a helper after disconnection, returns False if the pool does not need it
+        """
+        with self._cond:
+            if self._stopFlag or self._sizes.get(iface, 0) == 0:
+                return False
+            self._returned.append((iface, h))
+            self._cond.notify()
+            return True
+
+    def stop(self):
+        with self._cond:
+            self._stopFlag = True
+            self._cond.notify()
+        self.join()
+
+    @staticmethod
+    def _reset(h):
+        # back to the default security level then check the helper is answering and disconnected
+        try:
+            h._writeCmd("secu %s\nstat\n" % SEC_LEVEL_LOW)
+            resp = h._waitResp(['stat'], HelperPool.pingTimeout)
+        except (OSError, ValueError, BTLEException):
+            return False
+        if resp is None or resp['state'][0] != 'disc':
+            return False
+        # nothing else shall be pending
+        return h._messageEnd() == 0 and len(h._poller.poll(0)) == 0
+
+    def _spawn(self, iface):
+        h = BluepyHelper()
+        try:
+            h._startHelper(iface)
+        except OSError as err:
+            DBG("Helper pool - cannot start helper:", err)
+            return None
+        self.started += 1
+        return h
+
+    def _put(self, iface, h):
+        # returns False if the helper is not needed anymore
+        with self._cond:
+            idle = self._idle.setdefault((iface, Framing), [])
+            if self._stopFlag or len(idle) >= 2 * self._sizes.get(iface, 0):
+                return False
+            idle.append(h)
+            return True
+
+    def _missing(self):
+        # (iface, number of helpers to start)
+        for iface, size in self._sizes.items():
+            n = size - len(self._idle.get((iface, Framing), ()))
+            n -= len([i for i, h in self._returned if i == iface])
+            if n > 0:
+                return iface, n
+        return None, 0
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._stopFlag and not self._returned and \
+                      (self._missing()[1] == 0 or time.time() < self._retry):
+                    timeout = self._nextCheck - time.time()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if self._stopFlag:
+                    break
+                check, self._returned = self._returned, []
+                if time.time() >= self._nextCheck:
+                    # the idle helpers are out of the pool while being checked
+                    for key in list(self._idle.keys()):
+                        check += [(key[0], h) for h in self._idle.pop(key)]
+                    self._nextCheck = time.time() + HelperPool.checkInterval
+            for i, h in check:
+                if HelperPool._reset(h):
+                    if self._put(i, h):
+                        continue
+                    h._stopHelper()
+                else:
+                    DBG("Helper pool - replacing helper")
+                    self.replaced += 1
+                    h._killHelper()
+            with self._cond:
+                iface, n = self._missing()
+            for k in range(n):
+                h = self._spawn(iface)
+                # the helper is ready once its main loop answers
+                if h is not None and not HelperPool._reset(h):
+                    h._killHelper()
+                    h = None
+                if h is None:
+                    # cannot start helpers, wait for the next check
+                    self._retry = self._nextCheck
+                    break
+                if not self._put(iface, h):
+                    h._stopHelper()
+        with self._cond:
+            idle = [h for l in self._idle.values() for h in l] + [h for i, h in self._returned]
+            self._idle.clear()
+            self._returned = []
+        for h in idle:
+            try:
+                h._stopHelper()
+            except (OSError, ValueError):
+                h._killHelper()
+
+atexit.register(HelperPool.shutdown)
+
+
 class Peripheral(BluepyHelper):
+    drainReads = 8      # pipe reads per dispatchPending call
+
     def __init__(self, deviceAddr=None, addrType=ADDR_TYPE_PUBLIC, iface=None,mtu=0):
         BluepyHelper.__init__(self)
         self._serviceMap = None # Indexed by UUID
+        self._mtu = 23
+        self._streamWrites = None   # helper with wrs, unknown until first use
+        self._queuedWrites = None   # helper with wrq, unknown until first use
         (self.deviceAddr, self.addrType, self.iface) = (None, None, None)
 
         if isinstance(deviceAddr, ScanEntry):
@@ -506,12 +1009,14 @@ class Peripheral(BluepyHelper):
                     continue
             return resp
 
+    @_exclusive
     def _connect(self, addr, addrType=ADDR_TYPE_PUBLIC, iface=None,mtu=0):
         if len(addr.split(":")) != 6:
             raise ValueError("Expected MAC address, got %s" % repr(addr))
         if addrType not in (ADDR_TYPE_PUBLIC, ADDR_TYPE_RANDOM):
             raise ValueError("Expected address type public or random, got {}".format(addrType))
-        self._startHelper(iface)
+        self._acquireHelper(iface)
+        self._mtu = 23
         self.addr = addr
         self.addrType = addrType
         self.iface = iface
@@ -529,7 +1034,11 @@ class Peripheral(BluepyHelper):
             self._stopHelper()
             raise BTLEDisconnectError("Failed to connect to peripheral %s, addr type: %s" % (addr, addrType), rsp)
         if mtu > 23 :
-            self.setMTU(mtu)
+            try:
+                self.setMTU(mtu)
+            except BTLEGattError as err:
+                # the device rejects the exchange: stay with the default MTU
+                DBG("MTU exchange failed:", err)
 
     def connect(self, addr, addrType=ADDR_TYPE_PUBLIC, iface=None,mtu=0):
         if isinstance(addr, ScanEntry):
@@ -537,6 +1046,7 @@ class Peripheral(BluepyHelper):
         elif addr is not None:
             self._connect(addr, addrType, iface,mtu)
 
+    @_exclusive
     def disconnect(self):
         if self._helper is None:
             return
@@ -545,8 +1055,29 @@ class Peripheral(BluepyHelper):
 
         self._writeCmd("disc\n")
         self._getResp('stat')
+        self._releaseHelper()
+
+    def _acquireHelper(self, iface):
+        # takes an idle helper from the pool if any, else starts one
+        if self._helper is None and HelperPool.running():
+            h = HelperPool.instance().acquire(iface)
+            if h is not None:
+                DBG("Using pooled helper")
+                self._takeHelper(h)
+                return
+        self._startHelper(iface)
+
+    def _releaseHelper(self):
+        # gives the disconnected helper back to the pool or stops it
+        if self._helper is not None and not self._stopFlag and HelperPool.running():
+            h = BluepyHelper()
+            h._takeHelper(self)
+            if HelperPool.instance().release(h, self.iface):
+                return
+            self._takeHelper(h)
         self._stopHelper()
 
+    @_exclusive
     def discoverServices(self):
         self._writeCmd("svcs\n")
         rsp = self._getResp('find')
@@ -560,6 +1091,27 @@ class Peripheral(BluepyHelper):
             self._serviceMap[UUID(uuids[i])] = Service(self, uuids[i], starts[i], ends[i])
         return self._serviceMap
 
+    def loadServices(self, services):
+        """
+        Installs the services and characteristics known from a previous discovery
+        services: list of (uuid, hndStart, hndEnd, [(uuid, handle, properties, valHandle), ...])
+        """
+        self._serviceMap = {}
+        for uuid, hndStart, hndEnd, chars in services:
+            svc = Service(self, uuid, hndStart, hndEnd)
+            svc.chars = [Characteristic(self, *c) for c in chars]
+            self._serviceMap[svc.uuid] = svc
+        return self._serviceMap
+
+    def servicesDescription(self):
+        """
+        Returns the discovered services in the format accepted by loadServices
+        Characteristics not discovered yet are requested
+        """
+        return [(str(svc.uuid), svc.hndStart, svc.hndEnd,
+                 [(str(c.uuid), c.handle, c.properties, c.valHandle) for c in svc.getCharacteristics()])
+                for svc in self.services]
+
     def getState(self):
         status = self.status()
         return status['state'][0]
@@ -573,6 +1125,7 @@ class Peripheral(BluepyHelper):
     def getServices(self):
         return self.services
 
+    @_exclusive
     def getServiceByUUID(self, uuidVal):
         uuid = UUID(uuidVal)
         if self._serviceMap is not None and uuid in self._serviceMap:
@@ -588,11 +1141,13 @@ class Peripheral(BluepyHelper):
         self._serviceMap[uuid] = svc
         return svc
 
+    @_exclusive
     def _getIncludedServices(self, startHnd=1, endHnd=0xFFFF):
         # TODO: No working example of this yet
         self._writeCmd("incl %X %X\n" % (startHnd, endHnd))
         return self._getResp('find')
 
+    @_exclusive
     def getCharacteristics(self, startHnd=1, endHnd=0xFFFF, uuid=None):
         cmd = 'char %X %X' % (startHnd, endHnd)
         if uuid:
@@ -604,6 +1159,7 @@ class Peripheral(BluepyHelper):
                                rsp['props'][i], rsp['vhnd'][i])
                 for i in range(nChars)]
 
+    @_exclusive
     def getDescriptors(self, startHnd=1, endHnd=0xFFFF):
         self._writeCmd("desc %X %X\n" % (startHnd, endHnd) )
         # Historical note:
@@ -618,41 +1174,222 @@ class Peripheral(BluepyHelper):
         ndesc = len(resp['hnd'])
         return [Descriptor(self, resp['uuid'][i], resp['hnd'][i]) for i in range(ndesc)]
 
+    @_exclusive
     def readCharacteristic(self, handle):
         self._writeCmd("rd %X\n" % handle)
         resp = self._getResp('rd')
         return resp['d'][0]
 
+    @_exclusive
+    def readCharacteristics(self, handles, lengths=None):
+        """
+        Reads several values with one ATT Read Multiple request
+        The values are returned concatenated and truncated to MTU-1 bytes,
+        or as a list when the lengths of the values are given
+        """
+        if len(handles) < 2:
+            raise ValueError("Read Multiple needs at least 2 handles")
+        self._writeCmd("rdm %s\n" % " ".join(["%X" % h for h in handles]))
+        data = self._getResp('rdm')['d'][0]
+        if lengths is None:
+            return data
+        if len(data) != sum(lengths):
+            raise BTLEInternalError("Read Multiple response length %d, expected %d" % (len(data), sum(lengths)))
+        values = []
+        pos = 0
+        for l in lengths:
+            values.append(data[pos:pos + l])
+            pos += l
+        return values
+
+    @_exclusive
     def _readCharacteristicByUUID(self, uuid, startHnd, endHnd):
         # Not used at present
         self._writeCmd("rdu %s %X %X\n" % (UUID(uuid), startHnd, endHnd))
         return self._getResp('rd')
 
+    @_exclusive
     def writeCharacteristic(self, handle, val, withResponse=False):
         # Without response, a value too long for one packet will be truncated,
         # but with response, it will be sent as a queued write
+        if withResponse and len(val) > self._mtu - 3 and self._queuedWrites is not False:
+            return self.writeCharacteristics([(handle, val)])
         cmd = "wrr" if withResponse else "wr"
         self._writeCmd("%s %X %s\n" % (cmd, handle, binascii.b2a_hex(val).decode('utf-8')))
         return self._getResp('wr')
 
+    @_exclusive
+    def writeCharacteristics(self, values):
+        """
+        Writes (handle, value) pairs with prepared writes followed by one
+        execute write: the values are written together or none of them
+        """
+        if self._queuedWrites is not False:
+            self._writeCmd("wrq %s\n" % " ".join(["%X %s" % (h, binascii.b2a_hex(v).decode('utf-8')) for h, v in values]))
+            resp = self._getResp(['wr', 'err'])
+            if resp['rsp'][0] == 'wr':
+                self._queuedWrites = True
+                return resp
+            if resp['code'][0] != 'badcmd':
+                BluepyHelper.raiseError(resp)
+            self._queuedWrites = False
+        # older helper: one long write per value
+        for h, v in values:
+            resp = self.writeCharacteristic(h, v, True)
+        return resp
+
+    @staticmethod
+    def _chunks(data, size):
+        # splits a bytes-like object or an iterator of bytes-like objects in packets
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = memoryview(data)
+            for pos in range(0, len(data), size):
+                yield data[pos:pos + size]
+            return
+        buf = bytearray()
+        for piece in data:
+            buf += piece
+            while len(buf) >= size:
+                yield bytes(buf[:size])
+                del buf[:size]
+        if len(buf) > 0:
+            yield bytes(buf)
+
+    def _streamCredit(self):
+        # waits for the answer of one streamed write
+        resp = self._getResp(['wrs', 'err'])
+        if resp['rsp'][0] == 'err':
+            BluepyHelper.raiseError(resp)
+
+    @_exclusive
+    def writeStream(self, handle, data, window=8):
+        """
+        Writes data (bytes-like or iterator of bytes-like) with write commands
+        split in MTU sized packets.
+        Up to window packets are queued in the helper, each one is answered
+        once sent on the link (credit based flow control).
+        Returns the number of bytes written
+        """
+        size = self._mtu - 3
+        total = 0
+        inflight = 0
+        chunks = Peripheral._chunks(data, size)
+        if self._streamWrites is None:
+            # first use: check that the helper knows wrs
+            for chunk in chunks:
+                self._writeCmd("wrs %X %s\n" % (handle, binascii.b2a_hex(chunk).decode('utf-8')))
+                resp = self._getResp(['wrs', 'err'])
+                if resp['rsp'][0] == 'wrs':
+                    self._streamWrites = True
+                elif resp['code'][0] == 'badcmd':
+                    self._streamWrites = False
+                    self.writeCharacteristic(handle, chunk)
+                else:
+                    BluepyHelper.raiseError(resp)
+                total += len(chunk)
+                break
+        if not self._streamWrites:
+            # older helper: one write and one answer at a time
+            for chunk in chunks:
+                self.writeCharacteristic(handle, chunk)
+                total += len(chunk)
+            return total
+        try:
+            for chunk in chunks:
+                if inflight >= window:
+                    self._streamCredit()
+                    inflight -= 1
+                self._writeCmd("wrs %X %s\n" % (handle, binascii.b2a_hex(chunk).decode('utf-8')))
+                inflight += 1
+                total += len(chunk)
+            while inflight > 0:
+                self._streamCredit()
+                inflight -= 1
+        except BTLEException:
+            # consume the answers of the packets still queued before reporting the error
+            while inflight > 1 and self._helper is not None:
+                inflight -= 1
+                if self._getResp(['wrs', 'err'], 1.0) is None:
+                    break
+            raise
+        return total
+
+    @_exclusive
     def setSecurityLevel(self, level):
         self._writeCmd("secu %s\n" % level)
         return self._getResp('stat')
 
+    @_exclusive
     def unpair(self):
         self._mgmtCmd("unpair")
 
+    @_exclusive
     def pair(self):
         self._mgmtCmd("pair")
 
+    @_exclusive
     def setMTU(self, mtu):
         DBG("set MTU:",mtu)
         self._writeCmd("mtu %x\n" % mtu)
-        return self._getResp('stat')
+        resp = self._getResp('stat')
+        if 'mtu' in resp and resp['mtu'][0] >= 23:
+            self._mtu = resp['mtu'][0]
+        return resp
+
+    def getMTU(self):
+        return self._mtu
 
+    @_exclusive
     def waitForNotifications(self, timeout):
          resp = self._getResp(['ntfy','ind'], timeout)
          return (resp != None)
+
+    def fileno(self):
+        """
+        File descriptor of the helper output, to be watched for notifications
+        by an external poll / epoll loop that then calls dispatchPending()
+        """
+        if self._helper is None:
+            return -1
+        return self._helper.stdout.fileno()
+
+    def dispatchPending(self):
+        """
+        Reads what is available from the helper without blocking and passes
+        the notifications to the delegate.
+        Returns False, without reading, if another thread is running a command
+        on this peripheral (the notifications are then dispatched by that command)
+        """
+        if not self._ioLock.acquire(blocking=False):
+            return False
+        try:
+            if self._helper is None:
+                return True
+            # the data may have been consumed by a command in the meantime
+            # what the helper has written is drained, up to drainReads reads per call
+            reads = 0
+            while True:
+                while self._messageEnd() > 0:
+                    resp = self._readResp()
+                    if resp is None or type(resp) is ScanResp:
+                        continue
+                    respType = resp['rsp'][0]
+                    if respType == 'ntfy' or respType == 'ind':
+                        if self.delegate is not None:
+                            self.delegate.handleNotification(resp['hnd'][0], resp['d'][0])
+                    elif respType == 'stat' and resp['state'][0] == 'disc':
+                        self._stopHelper()
+                        raise BTLEDisconnectError("Device disconnected", resp)
+                    else:
+                        DBG("Unexpected response while idle:", resp)
+                if reads >= self.drainReads or len(self._poller.poll(0)) == 0:
+                    return True
+                if not self._fillBuffer():
+                    self._stopHelper()
+                    raise BTLEInternalError("Helper exited")
+                reads += 1
+        finally:
+            self._ioLock.release()
     def _setRemoteOOB(self, address, address_type, oob_data, iface=None):
         if self._helper is None:
             self._startHelper(iface)
@@ -774,8 +1511,12 @@ class ScanEntry:
         MANUFACTURER              : 'Manufacturer',
     }
 
+    __slots__ = ('mac', 'iface', 'addrType', 'rssi', 'connectable', 'rawData', 'scanData',
+                 'updateCount', '_raw', '_serviceRaw', '_seen')
+
     def __init__(self, addr, iface):
-        self.addr = addr
+        # addr is either the address string or its integer value
+        self.mac = addr if isinstance(addr, int) else addrToMac(addr)
         self.iface = iface
         self.addrType = None
         self.rssi = None
@@ -783,6 +1524,17 @@ class ScanEntry:
         self.rawData = None
         self.scanData = {}
         self.updateCount = 0
+        self._raw = {}
+        self._serviceRaw = {}
+        self._seen = 0.0
+
+    @property
+    def addr(self):
+        return macToAddr(self.mac)
+
+    @addr.setter
+    def addr(self, addr):
+        self.mac = addrToMac(addr)
 
     def _update(self, resp):
         """
@@ -790,13 +1542,13 @@ class ScanEntry:
         of 16bit services with data
         Now the tag 0x16 SERVICE_DATA_16B is storing either a tuple or a dictionary
         """
-        addrType = self.addrTypes.get(resp['type'][0], None)
+        addrType = self.addrTypes.get(resp.addrType, None)
         if (self.addrType is not None) and (addrType != self.addrType):
             raise BTLEInternalError("Address type changed during scan, for address %s" % self.addr)
         self.addrType = addrType
-        self.rssi = -resp['rssi'][0]
-        self.connectable = ((resp['flag'][0] & 0x4) == 0)
-        data = resp.get('d', [''])[0]
+        self.rssi = resp.rssi
+        self.connectable = ((resp.flag & 0x4) == 0)
+        data = resp.data
         self.rawData = data
         # print("adv data=",data)
 
@@ -809,6 +1561,7 @@ class ScanEntry:
             val = data[2 : sdlen + 1]
             if (sdid not in self.scanData) or (val != self.scanData[sdid]):
                 isNewData = True
+            self._raw[sdid] = val
             if sdid == 0x16 :
                 """
                 Now in case of multiple service data for the same object
@@ -816,6 +1569,7 @@ class ScanEntry:
                 """
                 sd=struct.unpack('<H',val[:2])
                 service_data=sd[0]
+                self._serviceRaw[service_data]=val[2:]
                 data_service=binascii.b2a_hex(val[2:]).decode('ascii')
                 # print("Service=","%4X"%service_data," data=",data_service)
 
@@ -847,12 +1601,8 @@ class ScanEntry:
     def _decodeUUID(self, val, nbytes):
         if len(val) < nbytes:
             return None
-        bval=bytearray(val)
-        rs=""
         # Bytes are little-endian; convert to big-endian string
-        for i in range(nbytes):
-            rs = ("%02X" % bval[i]) + rs
-        return UUID(rs)
+        return UUID(bytes(val[nbytes-1::-1]).hex())
 
     def _decodeUUIDlist(self, val, nbytes):
         result = []
@@ -868,6 +1618,17 @@ class ScanEntry:
         val = self.scanData.get(sdid, None)
         if val is None:
             return None
+        return self._decodeValue(sdid, val)
+
+    def getRawValue(self, sdid):
+        '''Returns the undecoded bytes of the last AD structure of that type'''
+        return self._raw.get(sdid, None)
+
+    def getServiceDataRaw(self):
+        '''Returns the 16 bits service data as a dictionary uuid -> bytes'''
+        return self._serviceRaw
+
+    def _decodeValue(self, sdid, val):
         if sdid in [ScanEntry.SHORT_LOCAL_NAME, ScanEntry.COMPLETE_LOCAL_NAME]:
             try:
                 # Beware! Vol 3 Part C 18.3 doesn't give an encoding. Other references
@@ -903,12 +1664,350 @@ class ScanEntry:
                     for sdid in self.scanData.keys() ]
 
 
+class LazyScanEntry(ScanEntry):
+    '''
+    ScanEntry variant that keeps the raw advertisement payloads and an
+    offset index of their AD structures, fields are only decoded on request.
+    A report carrying the same bytes as a previous one is detected by a
+    plain bytes comparison, without walking the AD structures.
+    The advertisement and the scan response are kept separately (keyed by
+    their list of AD types) and merged when the scan data is requested.
+    '''
+    __slots__ = ('_payloads', '_scanData', '_scanList')
+    maxPayloads = 4
+
+    def __init__(self, addr, iface):
+        ScanEntry.__init__(self, addr, iface)
+        self._payloads = {}
+        self._scanData = None
+        self._scanList = None
+
+    def _update(self, resp):
+        addrType = self.addrTypes.get(resp.addrType, None)
+        if (self.addrType is not None) and (addrType != self.addrType):
+            raise BTLEInternalError("Address type changed during scan, for address %s" % self.addr)
+        self.addrType = addrType
+        self.rssi = resp.rssi
+        self.connectable = ((resp.flag & 0x4) == 0)
+        data = resp.data
+        self.rawData = data
+        self.updateCount += 1
+        for payload in self._payloads.values():
+            if payload[0] == data:
+                return False
+
+        index = []
+        pos = 0
+        end = len(data)
+        while end - pos >= 2:
+            sdlen = data[pos]
+            index.append((data[pos + 1], pos + 2, min(pos + sdlen + 1, end)))
+            pos += sdlen + 1
+        key = tuple(entry[0] for entry in index)
+        # the most recent payload is kept last so that it wins on merge
+        self._payloads.pop(key, None)
+        if len(self._payloads) >= self.maxPayloads:
+            del self._payloads[next(iter(self._payloads))]
+        self._payloads[key] = (data, index)
+        self._scanData = None
+        self._scanList = None
+        return True
+
+    def _fields(self):
+        for data, index in self._payloads.values():
+            for sdid, start, end in index:
+                yield sdid, data[start:end]
+
+    @property
+    def scanData(self):
+        if self._scanData is None:
+            scanData = {}
+            for sdid, val in self._fields():
+                if sdid == ScanEntry.SERVICE_DATA_16B:
+                    service_data = struct.unpack('<H', val[:2])[0]
+                    data_service = binascii.b2a_hex(val[2:]).decode('ascii')
+                    v1 = scanData.get(sdid)
+                    if v1 is None or (not isinstance(v1, dict) and v1[0] == service_data):
+                        scanData[sdid] = (service_data, data_service)
+                    elif isinstance(v1, dict):
+                        v1[service_data] = data_service
+                    else:
+                        scanData[sdid] = {v1[0]: v1[1], service_data: data_service}
+                else:
+                    scanData[sdid] = val
+            self._scanData = scanData
+        return self._scanData
+
+    @scanData.setter
+    def scanData(self, value):
+        # only assigned empty by ScanEntry.__init__
+        self._scanData = None
+
+    def getRawValue(self, sdid):
+        result = None
+        for data, index in self._payloads.values():
+            for tag, start, end in index:
+                if tag == sdid:
+                    result = data[start:end]
+        return result
+
+    def getServiceDataRaw(self):
+        result = {}
+        for sdid, val in self._fields():
+            if sdid == ScanEntry.SERVICE_DATA_16B and len(val) >= 2:
+                result[val[0] | (val[1] << 8)] = val[2:]
+        return result
+
+    def getScanData(self):
+        if self._scanList is None:
+            self._scanList = ScanEntry.getScanData(self)
+        return self._scanList
+
+
+class _ScanKeys:
+    # Scanner.scanned is keyed by the MAC address integer, the address string
+    # (aa:bb:cc:dd:ee:ff) is accepted by the lookups as before
+    # the integer lookups of the scan loop do not go through these methods
+    def __missing__(self, key):
+        if isinstance(key, str):
+            mac = addrToMac(key)
+            if super().__contains__(mac):
+                return super().__getitem__(mac)
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return super().__contains__(addrToMac(key) if isinstance(key, str) else key)
+
+    def get(self, key, default=None):
+        return super().get(addrToMac(key) if isinstance(key, str) else key, default)
+
+    def pop(self, key, *default):
+        return super().pop(addrToMac(key) if isinstance(key, str) else key, *default)
+
+    def __delitem__(self, key):
+        super().__delitem__(addrToMac(key) if isinstance(key, str) else key)
+
+
+class ScanTable(_ScanKeys, dict):
+    pass
+
+
+class OrderedScanTable(_ScanKeys, OrderedDict):
+    pass
+
+
 class Scanner(BluepyHelper):
-    def __init__(self,iface=0):
+    def __init__(self,iface=0,lazy=False):
         BluepyHelper.__init__(self)
-        self.scanned = {}
+        self.scanned = ScanTable()   # MAC address (int or string) -> ScanEntry
         self.iface=iface
         self.passive=False
+        self._entryClass = LazyScanEntry if lazy else ScanEntry
+        # scan filter rules installed in the helper (filt command)
+        self._filterRules = None
+        self._filterPending = False
+        self._filterSupport = None
+        self._filterAcks = 0
+        self._filterError = False
+        self._filterHasRules = False
+        self._filterSent = None
+        self.filtersPushed = False
+        # report deduplication in the helper (dedup command)
+        self._dedup = None
+        self._dedupSupport = None
+        self.dedupStats = {'forwarded': 0, 'suppressed': 0, 'addresses': 0}
+        # coalescing of the advertisement and the scan response of an active scan
+        self._coalesce = 0.0
+        self._pending = {}
+        # bounds of scanned
+        self._maxEntries = 0
+        self._entryTTL = 0.0
+        # entries to drop, queued by other threads and removed by process()
+        self._forget = deque()
+
+    def setFilterRules(self, rules):
+        """
+        rules is a function returning the list of filt rules ('rssi -80', 'mfg 1177'...)
+        the reports not matching are dropped by the helper. The rules are installed
+        on start and sent again during the scan after updateFilterRules(): only the
+        added and removed addresses when the other rules are unchanged
+        filtersPushed is True when the helper applies the current rules
+        """
+        self._filterRules = rules
+        self.updateFilterRules()
+
+    def updateFilterRules(self):
+        # can be called from any thread, the rules are sent by the scanning thread
+        self.filtersPushed = False
+        self._filterPending = True
+
+    filterBatch = 256   # addresses per filt addr command
+
+    def _filterCommands(self, full=True):
+        # the address rules (addrclr, addr) are compared with the installed addresses,
+        # the helper is cleared only when another rule changed
+        rules = self._filterRules() if self._filterRules is not None else []
+        others = []
+        addrs = None
+        for r in rules:
+            if r.startswith('addr'):
+                if addrs is None:
+                    addrs = set()
+                words = r.split()
+                if words[0] == 'addr':
+                    addrs.update(words[1:])
+            else:
+                others.append(r)
+        sent = self._filterSent
+        self._filterSent = (others, addrs)
+        if full or sent is None or sent[0] != others or (sent[1] is None) != (addrs is None):
+            cmds = ["filt clear\n"] + ["filt %s\n" % r for r in others]
+            if addrs is not None:
+                cmds.append("filt addrclr\n")
+                cmds.extend(self._addrCommands('addr', addrs))
+            return rules, cmds
+        return rules, self._addrCommands('addrdel', sent[1] - addrs) + self._addrCommands('addr', addrs - sent[1])
+
+    def _addrCommands(self, rule, addrs):
+        addrs = list(addrs)
+        return ["filt %s %s\n" % (rule, " ".join(addrs[i:i+self.filterBatch]))
+                for i in range(0, len(addrs), self.filterBatch)]
+
+    def _installFilters(self):
+        # before the scan start, checks that the helper supports the filt command
+        self._filterPending = False
+        self._filterAcks = 0
+        rules, cmds = self._filterCommands()
+        self.filtersPushed = False
+        if len(rules) == 0 or self._filterSupport is False:
+            return
+        for cmd in cmds:
+            self._writeCmd(cmd)
+            resp = self._waitResp(['filt', 'err'])
+            if resp['rsp'][0] == 'err':
+                if resp['code'][0] != 'badcmd':
+                    BluepyHelper.raiseError(resp)
+                DBG("Helper without scan filters, filtering done in Python")
+                self._filterSupport = False
+                self._filterSent = None
+                return
+            if resp['code'][0] != 'success':
+                DBG("Scan filter rule refused:", cmd.strip())
+                self._filterSent = None
+                return
+        self._filterSupport = True
+        self.filtersPushed = True
+
+    def setDeduplication(self, rssiDelta, minInterval, statPeriod=0):
+        """
+        The helper forwards a report only when the payload changed, when the RSSI
+        moved by rssiDelta dBm (0 not checked) or after minInterval seconds (0 never)
+        the counts are reported every statPeriod seconds (0 no report) to
+        delegate.handleScanStats and accumulated in dedupStats
+        Applied on the next start, None to disable
+        """
+        if rssiDelta is None:
+            self._dedup = None
+        else:
+            self._dedup = "dedup %d %d %d\n" % (rssiDelta, int(minInterval * 1000), statPeriod)
+
+    def setBounds(self, maxEntries=0, ttl=0.0):
+        """
+        Limits scanned to maxEntries entries (least recently updated dropped first)
+        and drops the entries without report for ttl seconds, 0 for no limit
+        delegate.handleLost is called for each entry dropped
+        """
+        self._maxEntries = maxEntries
+        self._entryTTL = ttl
+        if self._bounded() and not isinstance(self.scanned, OrderedDict):
+            self.scanned = OrderedScanTable(self.scanned)
+
+    def _bounded(self):
+        return self._maxEntries > 0 or self._entryTTL > 0
+
+    def _evict(self, now):
+        # only the head of scanned (least recently updated) is visited
+        scanned = self.scanned
+        limit = now - self._entryTTL if self._entryTTL > 0 else None
+        while scanned:
+            addr = next(iter(scanned))
+            dev = scanned[addr]
+            if not ((self._maxEntries > 0 and len(scanned) > self._maxEntries) or
+                    (limit is not None and dev._seen < limit)):
+                break
+            del scanned[addr]
+            self._pending.pop(addr, None)
+            if self.delegate is not None and hasattr(self.delegate, 'handleLost'):
+                self.delegate.handleLost(dev)
+
+    def forget(self, mac):
+        """
+        Drops the entry of an address (int), a new report creates a new entry
+        Can be called from any thread, the entry is removed by process()
+        """
+        self._forget.append(mac)
+
+    def _dropForgotten(self):
+        while self._forget:
+            mac = self._forget.popleft()
+            self.scanned.pop(mac, None)
+            self._pending.pop(mac, None)
+
+    def setCoalescing(self, window):
+        """
+        During an active scan, the first report of a connectable device is held up
+        to window seconds for the next one (the scan response): the delegate sees
+        one update with both. The other reports are dispatched at once. 0 to
+        dispatch each report
+        """
+        self._coalesce = window
+
+    def _dispatch(self, dev, isNewDev, isNewData):
+        if self.delegate is not None:
+            self.delegate.handleDiscovery(dev, isNewDev, isNewData)
+
+    def _flushPending(self, now):
+        # dispatches the reports held longer than the window, returns the delay to the next one
+        pending = self._pending
+        while pending:
+            addr = next(iter(pending))
+            deadline, dev, isNewDev, isNewData = pending[addr]
+            if now is not None and deadline > now:
+                return deadline - now
+            del pending[addr]
+            self._dispatch(dev, isNewDev, isNewData)
+        return None
+
+    def _installDeduplication(self):
+        if self._dedup is None or self._dedupSupport is False:
+            return
+        self._writeCmd(self._dedup)
+        resp = self._waitResp(['filt', 'err'])
+        if resp['rsp'][0] == 'err':
+            if resp['code'][0] != 'badcmd':
+                BluepyHelper.raiseError(resp)
+            DBG("Helper without report deduplication")
+            self._dedupSupport = False
+        elif resp['code'][0] != 'success':
+            DBG("Deduplication refused:", self._dedup.strip())
+        else:
+            self._dedupSupport = True
+
+    def _sendFilters(self):
+        # during the scan, the 'filt' responses are handled by process()
+        self._filterPending = False
+        if not self._filterSupport:
+            self._installFilters()
+            return
+        rules, cmds = self._filterCommands(full=False)
+        self._filterAcks += len(cmds)
+        self._filterError = False
+        self._filterHasRules = len(rules) > 0
+        for cmd in cmds:
+            self._writeCmd(cmd)
+        if self._filterAcks == 0:
+            # only the order of the addresses changed
+            self.filtersPushed = self._filterHasRules
 
     def _cmd(self):
         return "pasv" if self.passive else "scan"
@@ -917,6 +2016,8 @@ class Scanner(BluepyHelper):
         self.passive = passive
         self._startHelper(iface=self.iface)
         self._mgmtCmd("le on")
+        self._installFilters()
+        self._installDeduplication()
         self._writeCmd(self._cmd()+"\n")
         rsp = self._waitResp("mgmt")
         if rsp["code"][0] == "success":
@@ -933,47 +2034,89 @@ class Scanner(BluepyHelper):
         self._stopHelper()
 
     def clear(self):
-        self.scanned = {}
+        self.scanned = OrderedScanTable() if self._bounded() else ScanTable()
+        self._pending = {}
 
     def process(self, timeout=10.0):
         if self._helper is None:
             raise BTLEInternalError(
                                 "Helper not started (did you call start()?)")
         start = time.time()
+        coalesce = self._coalesce if not self.passive else 0.0
+        bounded = self._bounded()
         while True:
+            now = time.time()
+            if self._forget:
+                self._dropForgotten()
+            if bounded:
+                self._evict(now)
             if timeout:
-                remain = start + timeout - time.time()
+                remain = start + timeout - now
                 if remain <= 0.0:
                     break
             else:
                 remain = None
-            resp = self._waitResp(['scan', 'stat'], remain)
+            held = self._flushPending(now) if self._pending else None
+            if self._filterPending:
+                self._sendFilters()
+            holding = held is not None and (remain is None or held < remain)
+            resp = self._waitResp(['scan', 'stat', 'filt', 'dstat'], held if holding else remain)
             if resp is None:
+                if holding:
+                    # end of a coalescing window
+                    continue
                 # let's ask for status to check - L. Carré add to avoid early stop with no answer
                 self._writeCmd('stat\n')
                 continue
 
-            respType = resp['rsp'][0]
-            if respType == 'stat':
-                # if scan ended, restart it
-                if resp['state'][0] == 'disc':
-                    self._mgmtCmd(self._cmd())
-
-            elif respType == 'scan':
+            if type(resp) is ScanResp:
                 # device found
-                addr = binascii.b2a_hex(resp['addr'][0]).decode('utf-8')
-                addr = ':'.join([addr[i:i+2] for i in range(0,12,2)])
-                if addr in self.scanned:
+                addr = resp.mac
+                try:
                     dev = self.scanned[addr]
-                else:
-                    dev = ScanEntry(addr, self.iface)
+                    if bounded:
+                        self.scanned.move_to_end(addr)
+                except KeyError:
+                    dev = self._entryClass(addr, self.iface)
                     self.scanned[addr] = dev
+                if bounded:
+                    dev._seen = time.time()
                 isNewData = dev._update(resp)
-                if self.delegate is not None:
-                    self.delegate.handleDiscovery(dev, (dev.updateCount <= 1), isNewData)
+                held = self._pending.pop(addr, None) if self._pending else None
+                if held is not None:
+                    self._dispatch(dev, held[2], held[3] or isNewData)
+                elif coalesce > 0.0 and dev.connectable:
+                    # first half, wait for the scan response
+                    self._pending[addr] = (time.time() + coalesce, dev, dev.updateCount <= 1, isNewData)
+                else:
+                    self._dispatch(dev, (dev.updateCount <= 1), isNewData)
+
+            elif resp['rsp'][0] == 'stat':
+                # if scan ended, restart it
+                if resp['state'][0] == 'disc':
+                    self._mgmtCmd(self._cmd())
+
+            elif resp['rsp'][0] == 'filt':
+                if resp['code'][0] != 'success':
+                    DBG("Scan filter rule refused:", resp['code'][0])
+                    self._filterError = True
+                    # the helper state is unknown, the next update installs all the rules
+                    self._filterSent = None
+                self._filterAcks -= 1
+                if self._filterAcks == 0 and not self._filterPending:
+                    self.filtersPushed = self._filterHasRules and not self._filterError
+
+            elif resp['rsp'][0] == 'dstat':
+                forwarded, suppressed, addresses = resp['fwd'][0], resp['supp'][0], resp['nb'][0]
+                self.dedupStats['forwarded'] += forwarded
+                self.dedupStats['suppressed'] += suppressed
+                self.dedupStats['addresses'] = addresses
+                if self.delegate is not None and hasattr(self.delegate, 'handleScanStats'):
+                    self.delegate.handleScanStats(forwarded, suppressed, addresses)
 
             else:
-                raise BTLEInternalError("Unexpected response: " + respType, resp)
+                raise BTLEInternalError("Unexpected response: " + resp['rsp'][0], resp)
+        self._flushPending(None)
 
     def getDevices(self):
         return self.scanned.values()
@@ -993,35 +2136,99 @@ def capitaliseName(descr):
     return "".join(capWords)
 
 class _UUIDNameMap:
-    # Constructor sets self.currentTimeService, self.txPower, and so on
-    # from names.
-    def __init__(self, idList):
-        self.idMap = {}
-
-        for uuid in idList:
-            attrName = capitaliseName(uuid.commonName)
-            vars(self) [attrName] = uuid
-            self.idMap[uuid] = uuid
+    """
+    Assigned numbers table, loaded on first use.
+    The table is read from the precompiled module uuidnames (generated from
+    uuids.json by compileUUIDNames) as a sorted array of short UUIDs and the
+    matching name tuples, lookups are done by bisection.
+    Attributes (self.currentTimeService, self.txPower, and so on) are
+    created on first access from the capitalised names.
+    """
+    def __init__(self):
+        self._shorts = None
+
+    def _load(self):
+        table = None
+        try:
+            import uuidnames
+            # the size of uuids.json is recorded to detect a table not regenerated
+            if uuidnames.source_size == os.stat(os.path.join(script_path, 'uuids.json')).st_size:
+                table = (uuidnames.shorts, uuidnames.cnames, uuidnames.names, uuidnames.attrs)
+        except (ImportError, OSError):
+            pass
+        if table is None:
+            table = _buildUUIDNames()
+        (self._cnames, self._names, self._attrs) = table[1:]
+        self._shorts = table[0]
 
     def getCommonName(self, uuid):
-        if uuid in self.idMap:
-            return self.idMap[uuid].commonName
+        if self._shorts is None:
+            self._load()
+        short = UUID(uuid).getShortUUID()
+        i = bisect.bisect_right(self._shorts, short) - 1
+        if i >= 0 and self._shorts[i] == short:
+            return self._names[i]
         return None
 
-def get_json_uuid():
+    def __getattr__(self, attrName):
+        if attrName.startswith('_'):
+            raise AttributeError(attrName)
+        if self._shorts is None:
+            self._load()
+        try:
+            i, human = self._attrs[attrName]
+        except KeyError:
+            raise AttributeError(attrName)
+        uuid = UUID(self._shorts[i], self._names[i] if human else self._cnames[i])
+        vars(self)[attrName] = uuid
+        return uuid
+
+def _buildUUIDNames():
+    # returns the (shorts, cnames, names, attrs) table from uuids.json
     import json
     with open(os.path.join(script_path, 'uuids.json'),"rb") as fp:
         uuid_data = json.loads(fp.read().decode("utf-8"))
+    rows = []
     for k in uuid_data.keys():
-        for number,cname,name in uuid_data[k]:
-            yield UUID(number, cname)
-            yield UUID(number, name)
-
-AssignedNumbers = _UUIDNameMap( get_json_uuid() )
+        rows.extend(uuid_data[k])
+    # stable sort: for duplicated numbers the last one in the file wins the lookup
+    order = sorted(range(len(rows)), key=lambda i: rows[i][0])
+    position = { j : i for i, j in enumerate(order) }
+    attrs = {}
+    for j, (number, cname, name) in enumerate(rows):
+        attrs[capitaliseName(cname)] = (position[j], False)
+        attrs[capitaliseName(name)] = (position[j], True)
+    return (array('I', [rows[j][0] for j in order]),
+            tuple(rows[j][1] for j in order),
+            tuple(rows[j][2] for j in order),
+            attrs)
+
+def compileUUIDNames(fileName=None):
+    """
+    Writes the precompiled assigned numbers module (uuidnames.py) from uuids.json
+    shall be run again each time uuids.json is changed
+    """
+    shorts, cnames, names, attrs = _buildUUIDNames()
+    if fileName is None:
+        fileName = os.path.join(script_path, 'uuidnames.py')
+    with open(fileName, 'w') as fp:
+        fp.write("# Generated from uuids.json by btle.compileUUIDNames() - do not edit\n")
+        fp.write("from array import array\n\n")
+        fp.write("source_size = %d\n\n" % os.stat(os.path.join(script_path, 'uuids.json')).st_size)
+        fp.write("shorts = array('I', %r)\n\n" % (list(shorts),))
+        fp.write("cnames = %r\n\n" % (cnames,))
+        fp.write("names = %r\n\n" % (names,))
+        fp.write("attrs = %r\n" % (attrs,))
+
+AssignedNumbers = _UUIDNameMap()
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        sys.exit("Usage:\n  %s <mac-address> [random]" % sys.argv[0])
+        sys.exit("Usage:\n  %s <mac-address> [random]\n  %s --compile-uuids" % (sys.argv[0], sys.argv[0]))
+
+    if sys.argv[1] == '--compile-uuids':
+        compileUUIDNames()
+        sys.exit(0)
 
     if not os.path.isfile(helperExe):
         raise ImportError("Cannot find required executable '%s'" % helperExe)
@@ -0,0 +1,12 @@
+# Generated from uuids.json by btle.compileUUIDNames() - do not edit
+from array import array
+
+source_size = 35010
+
+shorts = array('I', [6144, 6145, 6146, 6147, 6148, 6149, 6150, 6151, 6152, 6153, 6154, 6157, 6158, 6159, 6160, 6161, 6162, 6163, 6164, 6166, 6168, 6169, 6170, 6171, 6172, 6173, 6174, 6175, 6176, 6177, 9984, 9985, 9986, 9987, 9988, 9989, 9990, 9991, 10000, 10001, 10002, 10003, 10004, 10005, 10006, 10007, 10008, 10009, 10010, 10011, 10012, 10013, 10014, 10016, 10017, 10018, 10019, 10020, 10021, 10022, 10023, 10024, 10025, 10026, 10027, 10028, 10029, 10030, 10031, 10032, 10033, 10034, 10035, 10036, 10037, 10048, 10049, 10050, 10051, 10052, 10053, 10054, 10055, 10056, 10057, 10058, 10059, 10060, 10061, 10062, 10063, 10064, 10065, 10066, 10067, 10068, 10069, 10070, 10071, 10080, 10081, 10082, 10083, 10084, 10085, 10086, 10087, 10088, 10112, 10113, 10114, 10115, 10116, 10117, 10118, 10119, 10144, 10145, 10146, 10147, 10148, 10149, 10150, 10151, 10152, 10153, 10154, 10155, 10156, 10157, 10158, 10159, 10160, 10161, 10162, 10163, 10164, 10165, 10166, 10167, 10168, 10240, 10241, 10242, 10243, 10496, 10497, 10498, 10499, 10500, 10501, 10502, 10503, 10504, 10507, 10508, 10509, 10752, 10753, 10754, 10755, 10756, 10757, 10758, 10759, 10760, 10761, 10762, 10764, 10765, 10766, 10767, 10769, 10770, 10771, 10772, 10774, 10775, 10776, 10777, 10780, 10781, 10782, 10785, 10786, 10787, 10788, 10789, 10790, 10791, 10792, 10793, 10794, 10795, 10796, 10801, 10802, 10803, 10804, 10805, 10806, 10807, 10808, 10809, 10815, 10816, 10817, 10818, 10819, 10820, 10821, 10822, 10823, 10824, 10825, 10826, 10827, 10828, 10829, 10830, 10831, 10832, 10833, 10834, 10835, 10836, 10837, 10843, 10844, 10845, 10851, 10852, 10853, 10854, 10855, 10856, 10857, 10858, 10859, 10860, 10861, 10862, 10863, 10864, 10865, 10866, 10867, 10868, 10869, 10870, 10871, 10872, 10873, 10874, 10875, 10877, 10878, 10879, 10880, 10881, 10882, 10883, 10884, 10885, 10886, 10887, 10888, 10889, 10890, 10891, 10892, 10893, 10894, 10895, 10896, 10897, 10898, 10899, 10900, 10901, 10902, 10903, 10904, 10905, 10906, 10907, 10908, 10909, 10910, 10911, 10912, 10913, 10914, 10915, 10916, 10917, 10918, 10919, 10920, 10921, 10922, 10923, 10924, 10925, 10926, 10927, 10928, 10929, 10930, 10931, 10932, 10933])
+
+cnames = ('generic_access', 'generic_attribute', 'immediate_alert', 'link_loss', 'tx_power', 'current_time', 'reference_time_update', 'next_dst_change', 'glucose', 'health_thermometer', 'device_information', 'heart_rate', 'phone_alert_status', 'battery_service', 'blood_pressure', 'alert_notification', 'human_interface_device', 'scan_parameters', 'running_speed_and_cadence', 'cycling_speed_and_cadence', 'cycling_power', 'location_and_navigation', 'environmental_sensing', 'body_composition', 'user_data', 'weight_scale', 'bond_management', 'continuous_glucose_monitoring', 'internet_protocol_support', 'indoor_positioning', 'unitless', 'metre', 'kilogram', 'second', 'ampere', 'kelvin', 'mole', 'candela', 'square_metres', 'cubic_metres', 'metres_per_second', 'metres_per_second_squared', 'reciprocal_metre', 'kilogram_per_cubic_metre', 'kilogram_per_square_metre', 'cubic_metre_per_kilogram', 'ampere_per_square_metre', 'ampere_per_metre', 'mole_per_cubic_metre', 'kilogram_per_cubic_metre', 'candela_per_square_metre', 'refractive_index', 'relative_permeability', 'radian', 'steradian', 'hertz', 'newton', 'pascal', 'joule', 'watt', 'coulomb', 'volt', 'farad', 'ohm', 'siemens', 'weber', 'tesla', 'henry', 'degree_celsius', 'lumen', 'lux', 'becquerel', 'gray', 'sievert', 'katal', 'pascal_second', 'newton_metre', 'newton_per_metre', 'radian_per_second', 'radian_per_second_squared', 'watt_per_square_metre', 'joule_per_kelvin', 'joule_per_kilogram_kelvin', 'joule_per_kilogram', 'watt_per_metre_kelvin', 'joule_per_cubic_metre', 'volt_per_metre', 'coulomb_per_cubic_metre', 'coulomb_per_square_metre', 'coulomb_per_square_metre', 'farad_per_metre', 'henry_per_metre', 'joule_per_mole', 'joule_per_mole_kelvin', 'coulomb_per_kilogram', 'gray_per_second', 'watt_per_steradian', 'watt_per_square_metre_steradian', 'katal_per_cubic_metre', 'minute', 'hour', 'day', 'degree', 'minute', 'second', 'hectare', 'litre', 'tonne', 'bar', 'millimetre_of_mercury', 'angstrom', 'nautical_mile', 'barn', 'knot', 'neper', 'bel', 'yard', 'parsec', 'inch', 'foot', 'mile', 'pound_force_per_square_inch', 'kilometre_per_hour', 'mile_per_hour', 'revolution_per_minute', 'gram_calorie', 'kilogram_calorie', 'kilowatt_hour', 'degree_fahrenheit', 'percentage', 'per_mille', 'beats_per_minute', 'ampere_hours', 'milligram_per_decilitre', 'millimole_per_litre', 'year', 'month', 'count_per_cubic_metre', 'watt_per_square_metre', 'milliliter_per_kilogram_per_minute', 'pound', 'gatt_primary_service_declaration', 'gatt_secondary_service_declaration', 'gatt_include_declaration', 'gatt_characteristic_declaration', 'characteristic_extended_properties', 'characteristic_user_description', 'client_characteristic_configuration', 'server_characteristic_configuration', 'characteristic_presentation_format', 'characteristic_aggregate_format', 'valid_range', 'external_report_reference', 'report_reference', 'es_configuration', 'es_measurement', 'es_trigger_setting', 'device_name', 'appearance', 'peripheral_privacy_flag', 'reconnection_address', 'peripheral_preferred_connection_parameters', 'service_changed', 'alert_level', 'tx_power_level', 'date_time', 'day_of_week', 'day_date_time', 'exact_time_256', 'dst_offset', 'time_zone', 'local_time_information', 'time_with_dst', 'time_accuracy', 'time_source', 'reference_time_information', 'time_update_control_point', 'time_update_state', 'glucose_measurement', 'battery_level', 'temperature_measurement', 'temperature_type', 'intermediate_temperature', 'measurement_interval', 'boot_keyboard_input_report', 'system_id', 'model_number_string', 'serial_number_string', 'firmware_revision_string', 'hardware_revision_string', 'software_revision_string', 'manufacturer_name_string', 'ieee_11073-20601_regulatory_certification_data_list', 'current_time', 'magnetic_declination', 'scan_refresh', 'boot_keyboard_output_report', 'boot_mouse_input_report', 'glucose_measurement_context', 'blood_pressure_measurement', 'intermediate_blood_pressure', 'heart_rate_measurement', 'body_sensor_location', 'heart_rate_control_point', 'alert_status', 'ringer_control_point', 'ringer_setting', 'alert_category_id_bit_mask', 'alert_category_id', 'alert_notification_control_point', 'unread_alert_status', 'new_alert', 'supported_new_alert_category', 'supported_unread_alert_category', 'blood_pressure_feature', 'hid_information', 'report_map', 'hid_control_point', 'report', 'protocol_mode', 'scan_interval_window', 'pnp_id', 'glucose_feature', 'record_access_control_point', 'rsc_measurement', 'rsc_feature', 'sc_control_point', 'csc_measurement', 'csc_feature', 'sensor_location', 'cycling_power_measurement', 'cycling_power_vector', 'cycling_power_feature', 'cycling_power_control_point', 'location_and_speed', 'navigation', 'position_quality', 'ln_feature', 'ln_control_point', 'elevation', 'pressure', 'temperature', 'humidity', 'true_wind_speed', 'true_wind_direction', 'apparent_wind_speed', 'apparent_wind_direction', 'gust_factor', 'pollen_concentration', 'uv_index', 'irradiance', 'rainfall', 'wind_chill', 'heat_index', 'dew_point', 'descriptor_value_changed', 'aerobic_heart_rate_lower_limit', 'aerobic_threshold', 'age', 'anaerobic_heart_rate_lower_limit', 'anaerobic_heart_rate_upper_limit', 'anaerobic_threshold', 'aerobic_heart_rate_upper_limit', 'date_of_birth', 'date_of_threshold_assessment', 'email_address', 'fat_burn_heart_rate_lower_limit', 'fat_burn_heart_rate_upper_limit', 'first_name', 'five_zone_heart_rate_limits', 'gender', 'heart_rate_max', 'height', 'hip_circumference', 'last_name', 'maximum_recommended_heart_rate', 'resting_heart_rate', 'sport_type_for_aerobic_and_anaerobic_thresholds', 'three_zone_heart_rate_limits', 'two_zone_heart_rate_limit', 'vo2_max', 'waist_circumference', 'weight', 'database_change_increment', 'user_index', 'body_composition_feature', 'body_composition_measurement', 'weight_measurement', 'weight_scale_feature', 'user_control_point', 'magnetic_flux_density_2D', 'magnetic_flux_density_3D', 'language', 'barometric_pressure_trend', 'bond_management_control_point', 'bond_management_feature', 'central_address_resolution_support', 'cgm_measurement', 'cgm_feature', 'cgm_status', 'cgm_session_start_time', 'cgm_session_run_time', 'cgm_specific_ops_control_point', 'indoor_positioning_configuration', 'latitude', 'longitude', 'local_north_coordinate', 'xml', 'floor_number', 'altitude', 'uncertainty', 'location_name')
+
+names = ('Generic Access', 'Generic Attribute', 'Immediate Alert', 'Link Loss', 'Tx Power', 'Current Time Service', 'Reference Time Update Service', 'Next DST Change Service', 'Glucose', 'Health Thermometer', 'Device Information', 'Heart Rate', 'Phone Alert Status Service', 'Battery Service', 'Blood Pressure', 'Alert Notification Service', 'Human Interface Device', 'Scan Parameters', 'Running Speed and Cadence', 'Cycling Speed and Cadence', 'Cycling Power', 'Location and Navigation', 'Environmental Sensing', 'Body Composition', 'User Data', 'Weight Scale', 'Bond Management', 'Continuous Glucose Monitoring', 'Internet Protocol Support', 'Indoor Positioning', 'unitless', 'length (metre)', 'mass (kilogram)', 'time (second)', 'electric current (ampere)', 'thermodynamic temperature (kelvin)', 'amount of substance (mole)', 'luminous intensity (candela)', 'area (square metres)', 'volume (cubic metres)', 'velocity (metres per second)', 'acceleration (metres per second squared)', 'wavenumber (reciprocal metre)', 'density (kilogram per cubic metre)', 'surface density (kilogram per square metre)', 'specific volume (cubic metre per kilogram)', 'current density (ampere per square metre)', 'magnetic field strength (ampere per metre)', 'amount concentration (mole per cubic metre)', 'mass concentration (kilogram per cubic metre)', 'luminance (candela per square metre)', 'refractive index', 'relative permeability', 'plane angle (radian)', 'solid angle (steradian)', 'frequency (hertz)', 'force (newton)', 'pressure (pascal)', 'energy (joule)', 'power (watt)', 'electric charge (coulomb)', 'electric potential difference (volt)', 'capacitance (farad)', 'electric resistance (ohm)', 'electric conductance (siemens)', 'magnetic flux (weber)', 'magnetic flux density (tesla)', 'inductance (henry)', 'Celsius temperature (degree Celsius)', 'luminous flux (lumen)', 'illuminance (lux)', 'activity referred to a radionuclide (becquerel)', 'absorbed dose (gray)', 'dose equivalent (sievert)', 'catalytic activity (katal)', 'dynamic viscosity (pascal second)', 'moment of force (newton metre)', 'surface tension (newton per metre)', 'angular velocity (radian per second)', 'angular acceleration (radian per second squared)', 'heat flux density (watt per square metre)', 'heat capacity (joule per kelvin)', 'specific heat capacity (joule per kilogram kelvin)', 'specific energy (joule per kilogram)', 'thermal conductivity (watt per metre kelvin)', 'energy density (joule per cubic metre)', 'electric field strength (volt per metre)', 'electric charge density (coulomb per cubic metre)', 'surface charge density (coulomb per square metre)', 'electric flux density (coulomb per square metre)', 'permittivity (farad per metre)', 'permeability (henry per metre)', 'molar energy (joule per mole)', 'molar entropy (joule per mole kelvin)', 'exposure (coulomb per kilogram)', 'absorbed dose rate (gray per second)', 'radiant intensity (watt per steradian)', 'radiance (watt per square metre steradian)', 'catalytic activity concentration (katal per cubic metre)', 'time (minute)', 'time (hour)', 'time (day)', 'plane angle (degree)', 'plane angle (minute)', 'plane angle (second)', 'area (hectare)', 'volume (litre)', 'mass (tonne)', 'pressure (bar)', 'pressure (millimetre of mercury)', 'length (ångström)', 'length (nautical mile)', 'area (barn)', 'velocity (knot)', 'logarithmic radio quantity (neper)', 'logarithmic radio quantity (bel)', 'length (yard)', 'length (parsec)', 'length (inch)', 'length (foot)', 'length (mile)', 'pressure (pound-force per square inch)', 'velocity (kilometre per hour)', 'velocity (mile per hour)', 'angular velocity (revolution per minute)', 'energy (gram calorie)', 'energy (kilogram calorie)', 'energy (kilowatt hour)', 'thermodynamic temperature (degree Fahrenheit)', 'percentage', 'per mille', 'period (beats per minute)', 'electric charge (ampere hours)', 'mass density (milligram per decilitre)', 'mass density (millimole per litre)', 'time (year)', 'time (month)', 'concentration (count per cubic metre)', 'irradiance (watt per square metre)', 'milliliter (per kilogram per minute)', 'mass (pound)', 'Primary Service Declaration', 'Secondary Service Declaration', 'Include Declaration', 'Characteristic Declaration', 'Characteristic Extended Properties', 'Characteristic User Description', 'Client Characteristic Configuration', 'Server Characteristic Configuration', 'Characteristic Presentation Format', 'Characteristic Aggregate Format', 'Valid Range', 'External Report Reference', 'Report Reference', 'Environmental Sensing Configuration', 'Environmental Sensing Measurement', 'Environmental Sensing Trigger Setting', 'Device Name', 'Appearance', 'Peripheral Privacy Flag', 'Reconnection Address', 'Peripheral Preferred Connection Parameters', 'Service Changed', 'Alert Level', 'Tx Power Level', 'Date Time', 'Day of Week', 'Day Date Time', 'Exact Time 256', 'DST Offset', 'Time Zone', 'Local Time Information', 'Time with DST', 'Time Accuracy', 'Time Source', 'Reference Time Information', 'Time Update Control Point', 'Time Update State', 'Glucose Measurement', 'Battery Level', 'Temperature Measurement', 'Temperature Type', 'Intermediate Temperature', 'Measurement Interval', 'Boot Keyboard Input Report', 'System ID', 'Model Number String', 'Serial Number String', 'Firmware Revision String', 'Hardware Revision String', 'Software Revision String', 'Manufacturer Name String', 'IEEE 11073-20601 Regulatory Certification Data List', 'Current Time', 'Magnetic Declination', 'Scan Refresh', 'Boot Keyboard Output Report', 'Boot Mouse Input Report', 'Glucose Measurement Context', 'Blood Pressure Measurement', 'Intermediate Cuff Pressure', 'Heart Rate Measurement', 'Body Sensor Location', 'Heart Rate Control Point', 'Alert Status', 'Ringer Control Point', 'Ringer Setting', 'Alert Category ID Bit Mask', 'Alert Category ID', 'Alert Notification Control Point', 'Unread Alert Status', 'New Alert', 'Supported New Alert Category', 'Supported Unread Alert Category', 'Blood Pressure Feature', 'HID Information', 'Report Map', 'HID Control Point', 'Report', 'Protocol Mode', 'Scan Interval Window', 'PnP ID', 'Glucose Feature', 'Record Access Control Point', 'RSC Measurement', 'RSC Feature', 'SC Control Point', 'CSC Measurement', 'CSC Feature', 'Sensor Location', 'Cycling Power Measurement', 'Cycling Power Vector', 'Cycling Power Feature', 'Cycling Power Control Point', 'Location and Speed', 'Navigation', 'Position Quality', 'LN Feature', 'LN Control Point', 'Elevation', 'Pressure', 'Temperature', 'Humidity', 'True Wind Speed', 'True Wind Direction', 'Apparent Wind Speed', 'Apparent Wind Direction', 'Gust Factor', 'Pollen Concentration', 'UV Index', 'Irradiance', 'Rainfall', 'Wind Chill', 'Heat Index', 'Dew Point', 'Descriptor Value Changed', 'Aerobic Heart Rate Lower Limit', 'Aerobic Threshold', 'Age', 'Anaerobic Heart Rate Lower Limit', 'Anaerobic Heart Rate Upper Limit', 'Anaerobic Threshold', 'Aerobic Heart Rate Upper Limit', 'Date of Birth', 'Date of Threshold Assessment', 'Email Address', 'Fat Burn Heart Rate Lower Limit', 'Fat Burn Heart Rate Upper Limit', 'First Name', 'Five Zone Heart Rate Limits', 'Gender', 'Heart Rate Max', 'Height', 'Hip Circumference', 'Last Name', 'Maximum Recommended Heart Rate', 'Resting Heart Rate', 'Sport Type for Aerobic and Anaerobic Thresholds', 'Three Zone Heart Rate Limits', 'Two Zone Heart Rate Limit', 'VO2 Max', 'Waist Circumference', 'Weight', 'Database Change Increment', 'User Index', 'Body Composition Feature', 'Body Composition Measurement', 'Weight Measurement', 'Weight Scale Feature', 'User Control Point', 'Magnetic Flux Density - 2D', 'Magnetic Flux Density - 3D', 'Language', 'Barometric Pressure Trend', 'Bond Management Control Point', 'Bond Management Feature', 'Central Address Resolution', 'CGM Measurement', 'CGM Feature', 'CGM Status', 'CGM Session Start Time', 'CGM Session Run Time', 'CGM Specific Ops Control Point', 'Indoor Positioning Configuration', 'Latitude', 'Longitude', 'Local North Coordinate', 'Local East Coordinate', 'Floor Number', 'Altitude', 'Uncertainty', 'Location Name')
+
+attrs = {'gatt_primary_service_declaration': (141, False), 'primaryServiceDeclaration': (141, True), 'gatt_secondary_service_declaration': (142, False), 'secondaryServiceDeclaration': (142, True), 'gatt_include_declaration': (143, False), 'includeDeclaration': (143, True), 'gatt_characteristic_declaration': (144, False), 'characteristicDeclaration': (144, True), 'aerobic_heart_rate_lower_limit': (256, False), 'aerobicHeartRateLowerLimit': (256, True), 'aerobic_heart_rate_upper_limit': (262, False), 'aerobicHeartRateUpperLimit': (262, True), 'aerobic_threshold': (257, False), 'aerobicThreshold': (257, True), 'age': (258, True), 'alert_category_id': (208, False), 'alertCategoryId': (208, True), 'alert_category_id_bit_mask': (207, False), 'alertCategoryIdBitMask': (207, True), 'alert_level': (163, False), 'alertLevel': (163, True), 'alert_notification_control_point': (209, False), 'alertNotificationControlPoint': (209, True), 'alert_status': (204, False), 'alertStatus': (204, True), 'altitude': (309, True), 'anaerobic_heart_rate_lower_limit': (259, False), 'anaerobicHeartRateLowerLimit': (259, True), 'anaerobic_heart_rate_upper_limit': (260, False), 'anaerobicHeartRateUpperLimit': (260, True), 'anaerobic_threshold': (261, False), 'anaerobicThreshold': (261, True), 'apparent_wind_direction': (246, False), 'apparentWindDirection': (246, True), 'apparent_wind_speed': (245, False), 'apparentWindSpeed': (245, True), 'appearance': (158, True), 'barometric_pressure_trend': (293, False), 'barometricPressureTrend': (293, True), 'battery_level': (179, False), 'batteryLevel': (179, True), 'blood_pressure_feature': (214, False), 'bloodPressureFeature': (214, True), 'blood_pressure_measurement': (199, False), 'bloodPressureMeasurement': (199, True), 'body_composition_feature': (285, False), 'bodyCompositionFeature': (285, True), 'body_composition_measurement': (286, False), 'bodyCompositionMeasurement': (286, True), 'body_sensor_location': (202, False), 'bodySensorLocation': (202, True), 'bond_management_control_point': (294, False), 'bondManagementControlPoint': (294, True), 'bond_management_feature': (295, False), 'bondManagementFeature': (295, True), 'boot_keyboard_input_report': (184, False), 'bootKeyboardInputReport': (184, True), 'boot_keyboard_output_report': (196, False), 'bootKeyboardOutputReport': (196, True), 'boot_mouse_input_report': (197, False), 'bootMouseInputReport': (197, True), 'central_address_resolution_support': (296, False), 'centralAddressResolution': (296, True), 'cgm_feature': (298, False), 'cgmFeature': (298, True), 'cgm_measurement': (297, False), 'cgmMeasurement': (297, True), 'cgm_session_run_time': (301, False), 'cgmSessionRunTime': (301, True), 'cgm_session_start_time': (300, False), 'cgmSessionStartTime': (300, True), 'cgm_specific_ops_control_point': (302, False), 'cgmSpecificOpsControlPoint': (302, True), 'cgm_status': (299, False), 'cgmStatus': (299, True), 'csc_feature': (228, False), 'cscFeature': (228, True), 'csc_measurement': (227, False), 'cscMeasurement': (227, True), 'current_time': (5, False), 'currentTime': (193, True), 'cycling_power_control_point': (233, False), 'cyclingPowerControlPoint': (233, True), 'cycling_power_feature': (232, False), 'cyclingPowerFeature': (232, True), 'cycling_power_measurement': (230, False), 'cyclingPowerMeasurement': (230, True), 'cycling_power_vector': (231, False), 'cyclingPowerVector': (231, True), 'database_change_increment': (283, False), 'databaseChangeIncrement': (283, True), 'date_of_birth': (263, False), 'dateOfBirth': (263, True), 'date_of_threshold_assessment': (264, False), 'dateOfThresholdAssessment': (264, True), 'date_time': (165, False), 'dateTime': (165, True), 'day_date_time': (167, False), 'dayDateTime': (167, True), 'day_of_week': (166, False), 'dayOfWeek': (166, True), 'descriptor_value_changed': (255, False), 'descriptorValueChanged': (255, True), 'device_name': (157, False), 'deviceName': (157, True), 'dew_point': (254, False), 'dewPoint': (254, True), 'dst_offset': (169, False), 'dstOffset': (169, True), 'elevation': (239, True), 'email_address': (265, False), 'emailAddress': (265, True), 'exact_time_256': (168, False), 'exactTime256': (168, True), 'fat_burn_heart_rate_lower_limit': (266, False), 'fatBurnHeartRateLowerLimit': (266, True), 'fat_burn_heart_rate_upper_limit': (267, False), 'fatBurnHeartRateUpperLimit': (267, True), 'firmware_revision_string': (188, False), 'firmwareRevisionString': (188, True), 'first_name': (268, False), 'firstName': (268, True), 'five_zone_heart_rate_limits': (269, False), 'fiveZoneHeartRateLimits': (269, True), 'floor_number': (308, False), 'floorNumber': (308, True), 'gender': (270, True), 'glucose_feature': (222, False), 'glucoseFeature': (222, True), 'glucose_measurement': (178, False), 'glucoseMeasurement': (178, True), 'glucose_measurement_context': (198, False), 'glucoseMeasurementContext': (198, True), 'gust_factor': (247, False), 'gustFactor': (247, True), 'hardware_revision_string': (189, False), 'hardwareRevisionString': (189, True), 'heart_rate_control_point': (203, False), 'heartRateControlPoint': (203, True), 'heart_rate_max': (271, False), 'heartRateMax': (271, True), 'heart_rate_measurement': (201, False), 'heartRateMeasurement': (201, True), 'heat_index': (253, False), 'heatIndex': (253, True), 'height': (272, True), 'hid_control_point': (217, False), 'hidControlPoint': (217, True), 'hid_information': (215, False), 'hidInformation': (215, True), 'hip_circumference': (273, False), 'hipCircumference': (273, True), 'humidity': (242, True), 'ieee_1107320601_regulatory_certification_data_list': (192, False), 'ieee1107320601RegulatoryCertificationDataList': (192, True), 'indoor_positioning_configuration': (303, False), 'indoorPositioningConfiguration': (303, True), 'intermediate_blood_pressure': (200, False), 'intermediateCuffPressure': (200, True), 'intermediate_temperature': (182, False), 'intermediateTemperature': (182, True), 'irradiance': (250, True), 'language': (292, True), 'last_name': (274, False), 'lastName': (274, True), 'latitude': (304, True), 'ln_control_point': (238, False), 'lnControlPoint': (238, True), 'ln_feature': (237, False), 'lnFeature': (237, True), 'xml': (307, False), 'localEastCoordinate': (307, True), 'local_north_coordinate': (306, False), 'localNorthCoordinate': (306, True), 'local_time_information': (171, False), 'localTimeInformation': (171, True), 'location_and_speed': (234, False), 'locationAndSpeed': (234, True), 'location_name': (311, False), 'locationName': (311, True), 'longitude': (305, True), 'magnetic_declination': (194, False), 'magneticDeclination': (194, True), 'magnetic_flux_density_2d': (290, False), 'magneticFluxDensity2d': (290, True), 'magnetic_flux_density_3d': (291, False), 'magneticFluxDensity3d': (291, True), 'manufacturer_name_string': (191, False), 'manufacturerNameString': (191, True), 'maximum_recommended_heart_rate': (275, False), 'maximumRecommendedHeartRate': (275, True), 'measurement_interval': (183, False), 'measurementInterval': (183, True), 'model_number_string': (186, False), 'modelNumberString': (186, True), 'navigation': (235, True), 'new_alert': (211, False), 'newAlert': (211, True), 'peripheral_preferred_connection_parameters': (161, False), 'peripheralPreferredConnectionParameters': (161, True), 'peripheral_privacy_flag': (159, False), 'peripheralPrivacyFlag': (159, True), 'pnp_id': (221, False), 'pnpId': (221, True), 'pollen_concentration': (248, False), 'pollenConcentration': (248, True), 'position_quality': (236, False), 'positionQuality': (236, True), 'pressure': (240, True), 'protocol_mode': (219, False), 'protocolMode': (219, True), 'rainfall': (251, True), 'reconnection_address': (160, False), 'reconnectionAddress': (160, True), 'record_access_control_point': (223, False), 'recordAccessControlPoint': (223, True), 'reference_time_information': (175, False), 'referenceTimeInformation': (175, True), 'report': (218, True), 'report_map': (216, False), 'reportMap': (216, True), 'resting_heart_rate': (276, False), 'restingHeartRate': (276, True), 'ringer_control_point': (205, False), 'ringerControlPoint': (205, True), 'ringer_setting': (206, False), 'ringerSetting': (206, True), 'rsc_feature': (225, False), 'rscFeature': (225, True), 'rsc_measurement': (224, False), 'rscMeasurement': (224, True), 'sc_control_point': (226, False), 'scControlPoint': (226, True), 'scan_interval_window': (220, False), 'scanIntervalWindow': (220, True), 'scan_refresh': (195, False), 'scanRefresh': (195, True), 'sensor_location': (229, False), 'sensorLocation': (229, True), 'serial_number_string': (187, False), 'serialNumberString': (187, True), 'service_changed': (162, False), 'serviceChanged': (162, True), 'software_revision_string': (190, False), 'softwareRevisionString': (190, True), 'sport_type_for_aerobic_and_anaerobic_thresholds': (277, False), 'sportTypeForAerobicAndAnaerobicThresholds': (277, True), 'supported_new_alert_category': (212, False), 'supportedNewAlertCategory': (212, True), 'supported_unread_alert_category': (213, False), 'supportedUnreadAlertCategory': (213, True), 'system_id': (185, False), 'systemId': (185, True), 'temperature': (241, True), 'temperature_measurement': (180, False), 'temperatureMeasurement': (180, True), 'temperature_type': (181, False), 'temperatureType': (181, True), 'three_zone_heart_rate_limits': (278, False), 'threeZoneHeartRateLimits': (278, True), 'time_accuracy': (173, False), 'timeAccuracy': (173, True), 'time_source': (174, False), 'timeSource': (174, True), 'time_update_control_point': (176, False), 'timeUpdateControlPoint': (176, True), 'time_update_state': (177, False), 'timeUpdateState': (177, True), 'time_with_dst': (172, False), 'timeWithDst': (172, True), 'time_zone': (170, False), 'timeZone': (170, True), 'true_wind_direction': (244, False), 'trueWindDirection': (244, True), 'true_wind_speed': (243, False), 'trueWindSpeed': (243, True), 'two_zone_heart_rate_limit': (279, False), 'twoZoneHeartRateLimit': (279, True), 'tx_power_level': (164, False), 'txPowerLevel': (164, True), 'uncertainty': (310, True), 'unread_alert_status': (210, False), 'unreadAlertStatus': (210, True), 'user_control_point': (289, False), 'userControlPoint': (289, True), 'user_index': (284, False), 'userIndex': (284, True), 'uv_index': (249, False), 'uvIndex': (249, True), 'vo2_max': (280, False), 'vo2Max': (280, True), 'waist_circumference': (281, False), 'waistCircumference': (281, True), 'weight': (282, True), 'weight_measurement': (287, False), 'weightMeasurement': (287, True), 'weight_scale_feature': (288, False), 'weightScaleFeature': (288, True), 'wind_chill': (252, False), 'windChill': (252, True), 'characteristic_extended_properties': (145, False), 'characteristicExtendedProperties': (145, True), 'characteristic_user_description': (146, False), 'characteristicUserDescription': (146, True), 'client_characteristic_configuration': (147, False), 'clientCharacteristicConfiguration': (147, True), 'server_characteristic_configuration': (148, False), 'serverCharacteristicConfiguration': (148, True), 'characteristic_presentation_format': (149, False), 'characteristicPresentationFormat': (149, True), 'characteristic_aggregate_format': (150, False), 'characteristicAggregateFormat': (150, True), 'valid_range': (151, False), 'validRange': (151, True), 'external_report_reference': (152, False), 'externalReportReference': (152, True), 'report_reference': (153, False), 'reportReference': (153, True), 'es_configuration': (154, False), 'environmentalSensingConfiguration': (154, True), 'es_measurement': (155, False), 'environmentalSensingMeasurement': (155, True), 'es_trigger_setting': (156, False), 'environmentalSensingTriggerSetting': (156, True), 'alert_notification': (15, False), 'alertNotificationService': (15, True), 'battery_service': (13, False), 'batteryService': (13, True), 'blood_pressure': (14, False), 'bloodPressure': (14, True), 'body_composition': (23, False), 'bodyComposition': (23, True), 'bond_management': (26, False), 'bondManagement': (26, True), 'continuous_glucose_monitoring': (27, False), 'continuousGlucoseMonitoring': (27, True), 'currentTimeService': (5, True), 'cycling_power': (20, False), 'cyclingPower': (20, True), 'cycling_speed_and_cadence': (19, False), 'cyclingSpeedAndCadence': (19, True), 'device_information': (10, False), 'deviceInformation': (10, True), 'environmental_sensing': (22, False), 'environmentalSensing': (22, True), 'generic_access': (0, False), 'genericAccess': (0, True), 'generic_attribute': (1, False), 'genericAttribute': (1, True), 'glucose': (8, True), 'health_thermometer': (9, False), 'healthThermometer': (9, True), 'heart_rate': (11, False), 'heartRate': (11, True), 'human_interface_device': (16, False), 'humanInterfaceDevice': (16, True), 'immediate_alert': (2, False), 'immediateAlert': (2, True), 'indoor_positioning': (29, False), 'indoorPositioning': (29, True), 'internet_protocol_support': (28, False), 'internetProtocolSupport': (28, True), 'link_loss': (3, False), 'linkLoss': (3, True), 'location_and_navigation': (21, False), 'locationAndNavigation': (21, True), 'next_dst_change': (7, False), 'nextDstChangeService': (7, True), 'phone_alert_status': (12, False), 'phoneAlertStatusService': (12, True), 'reference_time_update': (6, False), 'referenceTimeUpdateService': (6, True), 'running_speed_and_cadence': (18, False), 'runningSpeedAndCadence': (18, True), 'scan_parameters': (17, False), 'scanParameters': (17, True), 'tx_power': (4, False), 'txPower': (4, True), 'user_data': (24, False), 'userData': (24, True), 'weight_scale': (25, False), 'weightScale': (25, True), 'unitless': (30, True), 'metre': (31, False), 'lengthMetre': (31, True), 'kilogram': (32, False), 'massKilogram': (32, True), 'second': (104, False), 'timeSecond': (33, True), 'ampere': (34, False), 'electricCurrentAmpere': (34, True), 'kelvin': (35, False), 'thermodynamicTemperatureKelvin': (35, True), 'mole': (36, False), 'amountOfSubstanceMole': (36, True), 'candela': (37, False), 'luminousIntensityCandela': (37, True), 'square_metres': (38, False), 'areaSquareMetres': (38, True), 'cubic_metres': (39, False), 'volumeCubicMetres': (39, True), 'metres_per_second': (40, False), 'velocityMetresPerSecond': (40, True), 'metres_per_second_squared': (41, False), 'accelerationMetresPerSecondSquared': (41, True), 'reciprocal_metre': (42, False), 'wavenumberReciprocalMetre': (42, True), 'kilogram_per_cubic_metre': (49, False), 'densityKilogramPerCubicMetre': (43, True), 'kilogram_per_square_metre': (44, False), 'surfaceDensityKilogramPerSquareMetre': (44, True), 'cubic_metre_per_kilogram': (45, False), 'specificVolumeCubicMetrePerKilogram': (45, True), 'ampere_per_square_metre': (46, False), 'currentDensityAmperePerSquareMetre': (46, True), 'ampere_per_metre': (47, False), 'magneticFieldStrengthAmperePerMetre': (47, True), 'mole_per_cubic_metre': (48, False), 'amountConcentrationMolePerCubicMetre': (48, True), 'massConcentrationKilogramPerCubicMetre': (49, True), 'candela_per_square_metre': (50, False), 'luminanceCandelaPerSquareMetre': (50, True), 'refractive_index': (51, False), 'refractiveIndex': (51, True), 'relative_permeability': (52, False), 'relativePermeability': (52, True), 'radian': (53, False), 'planeAngleRadian': (53, True), 'steradian': (54, False), 'solidAngleSteradian': (54, True), 'hertz': (55, False), 'frequencyHertz': (55, True), 'newton': (56, False), 'forceNewton': (56, True), 'pascal': (57, False), 'pressurePascal': (57, True), 'joule': (58, False), 'energyJoule': (58, True), 'watt': (59, False), 'powerWatt': (59, True), 'coulomb': (60, False), 'electricChargeCoulomb': (60, True), 'volt': (61, False), 'electricPotentialDifferenceVolt': (61, True), 'farad': (62, False), 'capacitanceFarad': (62, True), 'ohm': (63, False), 'electricResistanceOhm': (63, True), 'siemens': (64, False), 'electricConductanceSiemens': (64, True), 'weber': (65, False), 'magneticFluxWeber': (65, True), 'tesla': (66, False), 'magneticFluxDensityTesla': (66, True), 'henry': (67, False), 'inductanceHenry': (67, True), 'degree_celsius': (68, False), 'celsiusTemperatureDegreeCelsius': (68, True), 'lumen': (69, False), 'luminousFluxLumen': (69, True), 'lux': (70, False), 'illuminanceLux': (70, True), 'becquerel': (71, False), 'activityReferredToARadionuclideBecquerel': (71, True), 'gray': (72, False), 'absorbedDoseGray': (72, True), 'sievert': (73, False), 'doseEquivalentSievert': (73, True), 'katal': (74, False), 'catalyticActivityKatal': (74, True), 'pascal_second': (75, False), 'dynamicViscosityPascalSecond': (75, True), 'newton_metre': (76, False), 'momentOfForceNewtonMetre': (76, True), 'newton_per_metre': (77, False), 'surfaceTensionNewtonPerMetre': (77, True), 'radian_per_second': (78, False), 'angularVelocityRadianPerSecond': (78, True), 'radian_per_second_squared': (79, False), 'angularAccelerationRadianPerSecondSquared': (79, True), 'watt_per_square_metre': (138, False), 'heatFluxDensityWattPerSquareMetre': (80, True), 'joule_per_kelvin': (81, False), 'heatCapacityJoulePerKelvin': (81, True), 'joule_per_kilogram_kelvin': (82, False), 'specificHeatCapacityJoulePerKilogramKelvin': (82, True), 'joule_per_kilogram': (83, False), 'specificEnergyJoulePerKilogram': (83, True), 'watt_per_metre_kelvin': (84, False), 'thermalConductivityWattPerMetreKelvin': (84, True), 'joule_per_cubic_metre': (85, False), 'energyDensityJoulePerCubicMetre': (85, True), 'volt_per_metre': (86, False), 'electricFieldStrengthVoltPerMetre': (86, True), 'coulomb_per_cubic_metre': (87, False), 'electricChargeDensityCoulombPerCubicMetre': (87, True), 'coulomb_per_square_metre': (89, False), 'surfaceChargeDensityCoulombPerSquareMetre': (88, True), 'electricFluxDensityCoulombPerSquareMetre': (89, True), 'farad_per_metre': (90, False), 'permittivityFaradPerMetre': (90, True), 'henry_per_metre': (91, False), 'permeabilityHenryPerMetre': (91, True), 'joule_per_mole': (92, False), 'molarEnergyJoulePerMole': (92, True), 'joule_per_mole_kelvin': (93, False), 'molarEntropyJoulePerMoleKelvin': (93, True), 'coulomb_per_kilogram': (94, False), 'exposureCoulombPerKilogram': (94, True), 'gray_per_second': (95, False), 'absorbedDoseRateGrayPerSecond': (95, True), 'watt_per_steradian': (96, False), 'radiantIntensityWattPerSteradian': (96, True), 'watt_per_square_metre_steradian': (97, False), 'radianceWattPerSquareMetreSteradian': (97, True), 'katal_per_cubic_metre': (98, False), 'catalyticActivityConcentrationKatalPerCubicMetre': (98, True), 'minute': (103, False), 'timeMinute': (99, True), 'hour': (100, False), 'timeHour': (100, True), 'day': (101, False), 'timeDay': (101, True), 'degree': (102, False), 'planeAngleDegree': (102, True), 'planeAngleMinute': (103, True), 'planeAngleSecond': (104, True), 'hectare': (105, False), 'areaHectare': (105, True), 'litre': (106, False), 'volumeLitre': (106, True), 'tonne': (107, False), 'massTonne': (107, True), 'bar': (108, False), 'pressureBar': (108, True), 'millimetre_of_mercury': (109, False), 'pressureMillimetreOfMercury': (109, True), 'angstrom': (110, False), 'lengthÅngström': (110, True), 'nautical_mile': (111, False), 'lengthNauticalMile': (111, True), 'barn': (112, False), 'areaBarn': (112, True), 'knot': (113, False), 'velocityKnot': (113, True), 'neper': (114, False), 'logarithmicRadioQuantityNeper': (114, True), 'bel': (115, False), 'logarithmicRadioQuantityBel': (115, True), 'yard': (116, False), 'lengthYard': (116, True), 'parsec': (117, False), 'lengthParsec': (117, True), 'inch': (118, False), 'lengthInch': (118, True), 'foot': (119, False), 'lengthFoot': (119, True), 'mile': (120, False), 'lengthMile': (120, True), 'pound_force_per_square_inch': (121, False), 'pressurePoundForcePerSquareInch': (121, True), 'kilometre_per_hour': (122, False), 'velocityKilometrePerHour': (122, True), 'mile_per_hour': (123, False), 'velocityMilePerHour': (123, True), 'revolution_per_minute': (124, False), 'angularVelocityRevolutionPerMinute': (124, True), 'gram_calorie': (125, False), 'energyGramCalorie': (125, True), 'kilogram_calorie': (126, False), 'energyKilogramCalorie': (126, True), 'kilowatt_hour': (127, False), 'energyKilowattHour': (127, True), 'degree_fahrenheit': (128, False), 'thermodynamicTemperatureDegreeFahrenheit': (128, True), 'percentage': (129, True), 'per_mille': (130, False), 'perMille': (130, True), 'beats_per_minute': (131, False), 'periodBeatsPerMinute': (131, True), 'ampere_hours': (132, False), 'electricChargeAmpereHours': (132, True), 'milligram_per_decilitre': (133, False), 'massDensityMilligramPerDecilitre': (133, True), 'millimole_per_litre': (134, False), 'massDensityMillimolePerLitre': (134, True), 'year': (135, False), 'timeYear': (135, True), 'month': (136, False), 'timeMonth': (136, True), 'count_per_cubic_metre': (137, False), 'concentrationCountPerCubicMetre': (137, True), 'irradianceWattPerSquareMetre': (138, True), 'milliliter_per_kilogram_per_minute': (139, False), 'milliliterPerKilogramPerMinute': (139, True), 'pound': (140, False), 'massPound': (140, True)}
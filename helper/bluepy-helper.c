@@ -146,7 +146,10 @@ static const char
   *tag_ADDR       = "addr",
   *tag_TYPE       = "type",
   *tag_RSSI       = "rssi",
-  *tag_FLAG       = "flag";
+  *tag_FLAG       = "flag",
+  *tag_FORWARDED  = "fwd",
+  *tag_SUPPRESSED = "supp",
+  *tag_ENTRIES    = "nb";
 
 static const char
   *rsp_ERROR     = "err",
@@ -156,9 +159,13 @@ static const char
   *rsp_DISCOVERY = "find",
   *rsp_DESCRIPTORS = "desc",
   *rsp_READ      = "rd",
+  *rsp_READ_MULTI = "rdm",
   *rsp_WRITE     = "wr",
+  *rsp_WRITE_STREAM = "wrs",
   *rsp_MGMT      = "mgmt",
   *rsp_SCAN      = "scan",
+  *rsp_FILTER    = "filt",
+  *rsp_DEDUP_STAT = "dstat",
   *rsp_OOB       = "oob";
 
 static const char
@@ -185,28 +192,127 @@ static const char
 // delimits fields in response message
 #define RESP_DELIM "\x1e"
 
+/*
+ * Binary framing of the responses, selected at startup by BLUEPY_FRAMING=binary
+ * A frame is FRAME_START, the 16 bits little endian length of the body, then the body
+ * made of fields: tag code (index in frame_tags), type sigil and value
+ *   'h'       32 bits little endian
+ *   '$' '\'' 8 bits length + characters
+ *   'b'       16 bits length + raw bytes
+ * frame_tags shall be kept in sync with frameTags in btle.py
+ */
+#define FRAME_START 0x02
+
+static const char **frame_tags[] = {
+  &tag_RESPONSE, &tag_ERRCODE, &tag_ERRSTAT, &tag_ERRMSG, &tag_HANDLE,
+  &tag_UUID, &tag_DATA, &tag_CONNSTATE, &tag_SEC_LEVEL, &tag_MTU,
+  &tag_DEVICE, &tag_RANGE_START, &tag_RANGE_END, &tag_PROPERTIES,
+  &tag_VALUE_HANDLE, &tag_ADDR, &tag_TYPE, &tag_RSSI, &tag_FLAG,
+  &tag_FORWARDED, &tag_SUPPRESSED, &tag_ENTRIES
+};
+
+static int opt_binary = 0;
+static GByteArray *frame = NULL;
+
+static void frame_field(const char *tag, char type)
+{
+  guint8 hdr[2];
+  unsigned int i;
+
+  hdr[0] = 0xFF;
+  for (i = 0; i < G_N_ELEMENTS(frame_tags); i++)
+    if (*frame_tags[i] == tag) {
+      hdr[0] = i;
+      break;
+    }
+  hdr[1] = type;
+  g_byte_array_append(frame, hdr, 2);
+}
+
+static void frame_uint(const char *tag, unsigned int val)
+{
+  guint8 v[4];
+
+  v[0] = val & 0xFF;
+  v[1] = (val >> 8) & 0xFF;
+  v[2] = (val >> 16) & 0xFF;
+  v[3] = (val >> 24) & 0xFF;
+  frame_field(tag, 'h');
+  g_byte_array_append(frame, v, 4);
+}
+
+static void frame_str(const char *tag, char type, const char *val)
+{
+  size_t len = val ? strlen(val) : 0;
+  guint8 l;
+
+  if (len > 0xFF)
+    len = 0xFF;
+  l = len;
+  frame_field(tag, type);
+  g_byte_array_append(frame, &l, 1);
+  if (len)
+    g_byte_array_append(frame, (const guint8 *) val, len);
+}
+
+static void frame_data(const char *tag, const unsigned char *val, size_t len)
+{
+  guint8 l[2];
+
+  if (len > 0xFFFF)
+    len = 0xFFFF;
+  l[0] = len & 0xFF;
+  l[1] = (len >> 8) & 0xFF;
+  frame_field(tag, 'b');
+  g_byte_array_append(frame, l, 2);
+  if (len)
+    g_byte_array_append(frame, val, len);
+}
+
 static void resp_begin(const char *rsptype)
 {
+  if (opt_binary) {
+    /* room for the frame header, filled by resp_end */
+    g_byte_array_set_size(frame, 3);
+    frame_str(tag_RESPONSE, '$', rsptype);
+    return;
+  }
   printf("%s=$%s", tag_RESPONSE, rsptype);
 }
 
 static void send_sym(const char *tag, const char *val)
 {
+  if (opt_binary) {
+    frame_str(tag, '$', val);
+    return;
+  }
   printf(RESP_DELIM "%s=$%s", tag, val);
 }
 
 static void send_uint(const char *tag, unsigned int val)
 {
+  if (opt_binary) {
+    frame_uint(tag, val);
+    return;
+  }
   printf(RESP_DELIM "%s=h%X", tag, val);
 }
 
 static void send_str(const char *tag, const char *val)
 {
+  if (opt_binary) {
+    frame_str(tag, '\'', val);
+    return;
+  }
   printf(RESP_DELIM "%s='%s", tag, val);
 }
 
 static void send_data(const unsigned char *val, size_t len)
 {
+  if (opt_binary) {
+    frame_data(tag_DATA, val, len);
+    return;
+  }
   printf(RESP_DELIM "%s=b", tag_DATA);
   while ( len-- > 0 )
     printf("%02X", *val++);
@@ -215,17 +321,36 @@ static void send_data(const unsigned char *val, size_t len)
 static void send_addr(const struct mgmt_addr_info *addr)
 {
     const uint8_t *val = addr->bdaddr.b;
-    printf(RESP_DELIM "%s=b", tag_ADDR);
     int len = 6;
-    /* Human-readable byte order is reverse of bdaddr.b */
-    while ( len-- > 0 )
-        printf("%02X", val[len]);
+
+    if (opt_binary) {
+        uint8_t hval[6];
+        /* Human-readable byte order is reverse of bdaddr.b */
+        while ( len-- > 0 )
+            hval[5 - len] = val[len];
+        frame_data(tag_ADDR, hval, 6);
+    } else {
+        printf(RESP_DELIM "%s=b", tag_ADDR);
+        /* Human-readable byte order is reverse of bdaddr.b */
+        while ( len-- > 0 )
+            printf("%02X", val[len]);
+    }
 
     send_uint(tag_TYPE, addr->type);
 }
 
 static void resp_end()
 {
+  if (opt_binary) {
+    guint len = frame->len - 3;
+
+    frame->data[0] = FRAME_START;
+    frame->data[1] = len & 0xFF;
+    frame->data[2] = (len >> 8) & 0xFF;
+    fwrite(frame->data, 1, frame->len, stdout);
+    fflush(stdout);
+    return;
+  }
   printf("\n");
   fflush(stdout);
 }
@@ -261,6 +386,13 @@ static void resp_mgmt(const char *errcode)
   resp_end();
 }
 
+static void resp_filter(const char *errcode)
+{
+  resp_begin(rsp_FILTER);
+  send_sym(tag_ERRCODE, errcode);
+  resp_end();
+}
+
 static void resp_mgmt_err(uint8_t status)
 {
   resp_begin(rsp_MGMT);
@@ -1057,6 +1189,65 @@ static void cmd_read_uuid(int argcp, char **argvp)
                     char_read_by_uuid_cb, char_data);
 }
 
+static void char_read_multi_cb(guint8 status, const guint8 *pdu, guint16 plen,
+                            gpointer user_data)
+{
+    if (status != 0) {
+        DBG("status returned error : %s (0x%02x)",
+            att_ecode2str(status), status);
+        resp_att_error(status);
+        return;
+    }
+
+    if (plen < 1 || pdu[0] != ATT_OP_READ_MULTI_RESP) {
+        resp_error(err_DECODING);
+        return;
+    }
+
+    /* the values are concatenated, the caller knows their lengths */
+    resp_begin(rsp_READ_MULTI);
+    send_data(pdu + 1, plen - 1);
+    resp_end();
+}
+
+static void cmd_read_multi(int argcp, char **argvp)
+{
+    uint8_t *pdu;
+    size_t plen;
+    int i, handle;
+
+    if (conn_state != STATE_CONNECTED) {
+        resp_error(err_BAD_STATE);
+        return;
+    }
+
+    /* Read Multiple requires at least two handles */
+    if (argcp < 3) {
+        resp_error(err_BAD_PARAM);
+        return;
+    }
+
+    pdu = g_attrib_get_buffer(attrib, &plen);
+    if (plen < 1 + 2 * (size_t)(argcp - 1)) {
+        resp_error(err_BAD_PARAM);
+        return;
+    }
+
+    pdu[0] = ATT_OP_READ_MULTI_REQ;
+    for (i = 1; i < argcp; i++) {
+        handle = strtohandle(argvp[i]);
+        if (handle <= 0) {
+            resp_error(err_BAD_PARAM);
+            return;
+        }
+        bt_put_le16(handle, &pdu[2 * i - 1]);
+    }
+
+    if (g_attrib_send(attrib, 0, pdu, 1 + 2 * (argcp - 1),
+                    char_read_multi_cb, NULL, NULL) == 0)
+        resp_error(err_SEND_FAIL);
+}
+
 static void char_write_req_cb(guint8 status, const guint8 *pdu, guint16 plen,
                             gpointer user_data)
 {
@@ -1132,6 +1323,174 @@ static void cmd_char_write_rsp(int argcp, char **argvp)
   cmd_char_write_common(argcp, argvp, 1);
 }
 
+static void char_write_stream_cb(gpointer user_data)
+{
+    /* the write command has left the ATT queue: one credit back to the client */
+    resp_begin(rsp_WRITE_STREAM);
+    resp_end();
+}
+
+static void cmd_char_write_stream(int argcp, char **argvp)
+{
+    uint8_t *value = NULL;
+    size_t plen;
+    int handle;
+
+    if (conn_state != STATE_CONNECTED) {
+        resp_error(err_BAD_STATE);
+        return;
+    }
+
+    if (argcp < 3) {
+        resp_error(err_BAD_PARAM);
+        return;
+    }
+
+    handle = strtohandle(argvp[1]);
+    if (handle <= 0) {
+        resp_error(err_BAD_PARAM);
+        return;
+    }
+
+    plen = gatt_attr_data_from_string(argvp[2], &value);
+    if (plen == 0) {
+        resp_error(err_BAD_PARAM);
+        return;
+    }
+
+    /* unlike wr, the response is only sent once the packet is written to the link */
+    if (gatt_write_cmd(attrib, handle, value, plen,
+                    char_write_stream_cb, NULL) == 0)
+        resp_error(err_SEND_FAIL);
+
+    g_free(value);
+}
+
+/* Queued writes: prepared writes of one or several values then one execute */
+#define MAX_QUEUED_WRITES 16
+
+struct queued_write {
+    int count;
+    int index;
+    uint16_t offset;
+    uint16_t segment;
+    uint8_t status;
+    uint16_t handles[MAX_QUEUED_WRITES];
+    uint8_t *values[MAX_QUEUED_WRITES];
+    size_t vlens[MAX_QUEUED_WRITES];
+};
+
+static void queued_write_free(struct queued_write *qw)
+{
+    int i;
+
+    for (i = 0; i < qw->count; i++)
+        g_free(qw->values[i]);
+    g_free(qw);
+}
+
+static void queued_write_exec_cb(guint8 status, const guint8 *pdu, guint16 plen,
+                            gpointer user_data)
+{
+    struct queued_write *qw = user_data;
+
+    if (qw->status != 0)
+        /* cancel after a failed prepare: report the prepare error */
+        status = qw->status;
+    if (status != 0) {
+        DBG("status returned error : %s (0x%02x)",
+            att_ecode2str(status), status);
+        resp_att_error(status);
+    } else {
+        resp_begin(rsp_WRITE);
+        resp_end();
+    }
+    queued_write_free(qw);
+}
+
+static void queued_write_next(struct queued_write *qw);
+
+static void queued_write_prep_cb(guint8 status, const guint8 *pdu, guint16 plen,
+                            gpointer user_data)
+{
+    struct queued_write *qw = user_data;
+
+    if (status != 0) {
+        /* clear what the server has queued so far */
+        qw->status = status;
+        if (gatt_execute_write(attrib, ATT_CANCEL_ALL_PREP_WRITES,
+                        queued_write_exec_cb, qw) == 0) {
+            resp_att_error(status);
+            queued_write_free(qw);
+        }
+        return;
+    }
+
+    qw->offset += qw->segment;
+    if (qw->offset >= qw->vlens[qw->index]) {
+        qw->index++;
+        qw->offset = 0;
+    }
+    queued_write_next(qw);
+}
+
+static void queued_write_next(struct queued_write *qw)
+{
+    uint8_t *buf;
+    size_t buflen;
+    uint16_t plen;
+    guint id;
+
+    if (qw->index == qw->count)
+        id = gatt_execute_write(attrib, ATT_WRITE_ALL_PREP_WRITES,
+                        queued_write_exec_cb, qw);
+    else {
+        buf = g_attrib_get_buffer(attrib, &buflen);
+        plen = enc_prep_write_req(qw->handles[qw->index], qw->offset,
+                        qw->values[qw->index] + qw->offset,
+                        qw->vlens[qw->index] - qw->offset, buf, buflen);
+        qw->segment = plen - 5;
+        id = g_attrib_send(attrib, 0, buf, plen, queued_write_prep_cb, qw, NULL);
+    }
+    if (id == 0) {
+        resp_error(err_SEND_FAIL);
+        queued_write_free(qw);
+    }
+}
+
+static void cmd_char_write_queued(int argcp, char **argvp)
+{
+    struct queued_write *qw;
+    int i, handle;
+
+    if (conn_state != STATE_CONNECTED) {
+        resp_error(err_BAD_STATE);
+        return;
+    }
+
+    if (argcp < 3 || (argcp - 1) % 2 != 0 ||
+                (argcp - 1) / 2 > MAX_QUEUED_WRITES) {
+        resp_error(err_BAD_PARAM);
+        return;
+    }
+
+    qw = g_new0(struct queued_write, 1);
+    for (i = 1; i < argcp; i += 2) {
+        handle = strtohandle(argvp[i]);
+        qw->handles[qw->count] = handle;
+        qw->vlens[qw->count] = gatt_attr_data_from_string(argvp[i + 1],
+                                    &qw->values[qw->count]);
+        qw->count++;
+        if (handle <= 0 || qw->vlens[qw->count - 1] == 0) {
+            resp_error(err_BAD_PARAM);
+            queued_write_free(qw);
+            return;
+        }
+    }
+
+    queued_write_next(qw);
+}
+
 static void cmd_sec_level(int argcp, char **argvp)
 {
     GError *gerr = NULL;
@@ -1624,11 +1983,14 @@ static void scan(bool start)
     }
 }
 
+static void filter_scan_end(void);
+
 static void cmd_scanend(int argcp, char **argvp)
 {
     if (1 < argcp) {
         resp_mgmt(err_BAD_PARAM);
     } else {
+        filter_scan_end();
         scan(FALSE);
     }
 }
@@ -1642,6 +2004,412 @@ static void cmd_scan(int argcp, char **argvp)
     }
 }
 
+/*
+ * Scan filter rules installed by the filt command
+ * The reports not matching all the rules set are dropped before being sent
+ * The advertising data rules (mfg, uuid, name) may be satisfied by the scan
+ * response only: once matched, the device is accepted for all its reports
+ * until FILTER_HOLD seconds without a matching report. The accepted table is
+ * aged by a timer, bounded to FILTER_MAX_ACCEPTED and emptied at scan end
+ */
+#define FILTER_HOLD 30              /* seconds */
+#define FILTER_MAX_ACCEPTED 4096
+
+static struct {
+    gboolean active;
+    gboolean rssi_set;
+    int rssi_min;
+    int connectable;            /* -1 if not set */
+    int mfg_id;                 /* -1 if not set */
+    int uuid16;                 /* -1 if not set */
+    int name_len;               /* -1 if not set */
+    uint8_t name[31];
+    GHashTable *addrs;          /* NULL if not set */
+    GHashTable *accepted;       /* devices matching the advertising data rules -> last match, us */
+    guint timer;                /* ageing of accepted */
+} scan_filter = { FALSE, FALSE, 0, -1, -1, -1, -1 };
+
+static gint64 filter_addr(const bdaddr_t *ba)
+{
+    gint64 addr = 0;
+    int i;
+
+    for (i = 0; i < 6; i++)
+        addr = (addr << 8) | ba->b[i];
+    return addr;
+}
+
+static gint64 *filter_key(const bdaddr_t *ba)
+{
+    gint64 *key = g_new(gint64, 1);
+
+    *key = filter_addr(ba);
+    return key;
+}
+
+static gboolean filter_lookup(GHashTable *table, const bdaddr_t *ba)
+{
+    gint64 key = filter_addr(ba);
+
+    return g_hash_table_contains(table, &key);
+}
+
+static gboolean filter_aged(gpointer key, gpointer value, gpointer user_data)
+{
+    return *(gint64 *) value < *(gint64 *) user_data;
+}
+
+static void filter_expire(gint64 now)
+{
+    gint64 limit = now - (gint64) FILTER_HOLD * 1000000;
+
+    g_hash_table_foreach_remove(scan_filter.accepted, filter_aged, &limit);
+    if (g_hash_table_size(scan_filter.accepted) >= FILTER_MAX_ACCEPTED)
+        g_hash_table_remove_all(scan_filter.accepted);
+}
+
+static void filter_scan_end(void)
+{
+    if (scan_filter.accepted)
+        g_hash_table_remove_all(scan_filter.accepted);
+}
+
+static gboolean filter_timer(gpointer user_data)
+{
+    filter_expire(g_get_monotonic_time());
+    return TRUE;
+}
+
+static void filter_clear(void)
+{
+    scan_filter.active = FALSE;
+    scan_filter.rssi_set = FALSE;
+    scan_filter.connectable = -1;
+    scan_filter.mfg_id = -1;
+    scan_filter.uuid16 = -1;
+    scan_filter.name_len = -1;
+    if (scan_filter.addrs) {
+        g_hash_table_destroy(scan_filter.addrs);
+        scan_filter.addrs = NULL;
+    }
+    if (scan_filter.accepted)
+        g_hash_table_remove_all(scan_filter.accepted);
+}
+
+static gboolean filter_eir(const uint8_t *eir, uint16_t len)
+{
+    gboolean mfg = scan_filter.mfg_id < 0;
+    gboolean uuid = scan_filter.uuid16 < 0;
+    gboolean name = scan_filter.name_len < 0;
+    uint16_t pos = 0;
+
+    while (pos + 1 < len) {
+        uint8_t flen = eir[pos];
+        const uint8_t *field = eir + pos + 2;
+        int dlen, i;
+
+        if (flen == 0 || pos + 1 + flen > len)
+            break;
+        dlen = flen - 1;
+        switch (eir[pos + 1]) {
+        case 0xFF:  /* manufacturer data */
+            if (dlen >= 2 && bt_get_le16(field) == scan_filter.mfg_id)
+                mfg = TRUE;
+            break;
+        case 0x02:  /* 16 bits service UUIDs */
+        case 0x03:
+            for (i = 0; i + 1 < dlen; i += 2)
+                if (bt_get_le16(field + i) == scan_filter.uuid16)
+                    uuid = TRUE;
+            break;
+        case 0x16:  /* 16 bits service data */
+            if (dlen >= 2 && bt_get_le16(field) == scan_filter.uuid16)
+                uuid = TRUE;
+            break;
+        case 0x09:  /* complete local name */
+            if (dlen >= scan_filter.name_len && memcmp(field, scan_filter.name, scan_filter.name_len) == 0)
+                name = TRUE;
+            break;
+        }
+        pos += flen + 1;
+    }
+    return mfg && uuid && name;
+}
+
+static gboolean filter_match(const bdaddr_t *ba, int rssi, gboolean connectable,
+                             const uint8_t *eir, uint16_t len)
+{
+    gint64 now, key, *matched;
+
+    if (scan_filter.rssi_set && rssi < scan_filter.rssi_min)
+        return FALSE;
+    if (scan_filter.connectable >= 0 && connectable != scan_filter.connectable)
+        return FALSE;
+    if (scan_filter.addrs && !filter_lookup(scan_filter.addrs, ba))
+        return FALSE;
+    if (scan_filter.mfg_id < 0 && scan_filter.uuid16 < 0 && scan_filter.name_len < 0)
+        return TRUE;
+    now = g_get_monotonic_time();
+    key = filter_addr(ba);
+    matched = g_hash_table_lookup(scan_filter.accepted, &key);
+    if (!filter_eir(eir, len))
+        return matched != NULL && now - *matched < (gint64) FILTER_HOLD * 1000000;
+    if (matched == NULL) {
+        if (g_hash_table_size(scan_filter.accepted) >= FILTER_MAX_ACCEPTED)
+            filter_expire(now);
+        matched = g_new(gint64, 1);
+        g_hash_table_insert(scan_filter.accepted, filter_key(ba), matched);
+    }
+    *matched = now;
+    return TRUE;
+}
+
+static gboolean filter_number(const char *str, int min, int max, int *val)
+{
+    char *end;
+    long v = strtol(str, &end, 0);
+
+    if (*str == '\0' || *end != '\0' || v < min || v > max)
+        return FALSE;
+    *val = v;
+    return TRUE;
+}
+
+static void cmd_filter(int argcp, char **argvp)
+{
+    const char *rule;
+    int i;
+
+    if (argcp < 2) {
+        resp_filter(err_BAD_PARAM);
+        return;
+    }
+    if (!scan_filter.accepted) {
+        scan_filter.accepted = g_hash_table_new_full(g_int64_hash, g_int64_equal, g_free, g_free);
+        scan_filter.timer = g_timeout_add_seconds(FILTER_HOLD, filter_timer, NULL);
+    }
+    rule = argvp[1];
+
+    if (strcmp(rule, "clear") == 0) {
+        filter_clear();
+        resp_filter(err_SUCCESS);
+        return;
+    }
+    if (strncmp(rule, "addr", 4) == 0) {
+        if (!scan_filter.addrs)
+            scan_filter.addrs = g_hash_table_new_full(g_int64_hash, g_int64_equal, g_free, NULL);
+        if (strcmp(rule, "addrclr") == 0) {
+            g_hash_table_remove_all(scan_filter.addrs);
+        } else if (strcmp(rule, "addr") == 0 || strcmp(rule, "addrdel") == 0) {
+            for (i = 2; i < argcp; i++) {
+                bdaddr_t ba;
+                gint64 *key;
+
+                if (str2ba(argvp[i], &ba)) {
+                    DBG("invalid filter address %s", argvp[i]);
+                    continue;
+                }
+                key = filter_key(&ba);
+                if (rule[4] == '\0') {
+                    g_hash_table_add(scan_filter.addrs, key);
+                } else {
+                    g_hash_table_remove(scan_filter.addrs, key);
+                    g_free(key);
+                }
+            }
+        } else {
+            resp_filter(err_BAD_PARAM);
+            return;
+        }
+        scan_filter.active = TRUE;
+        resp_filter(err_SUCCESS);
+        return;
+    }
+
+    if (argcp != 3) {
+        resp_filter(err_BAD_PARAM);
+        return;
+    }
+    if (strcmp(rule, "rssi") == 0) {
+        if (!filter_number(argvp[2], -127, 20, &scan_filter.rssi_min)) {
+            resp_filter(err_BAD_PARAM);
+            return;
+        }
+        scan_filter.rssi_set = TRUE;
+    } else if (strcmp(rule, "conn") == 0) {
+        if (!filter_number(argvp[2], 0, 1, &scan_filter.connectable)) {
+            resp_filter(err_BAD_PARAM);
+            return;
+        }
+    } else if (strcmp(rule, "mfg") == 0) {
+        if (!filter_number(argvp[2], 0, 0xFFFF, &scan_filter.mfg_id)) {
+            resp_filter(err_BAD_PARAM);
+            return;
+        }
+    } else if (strcmp(rule, "uuid") == 0) {
+        if (!filter_number(argvp[2], 0, 0xFFFF, &scan_filter.uuid16)) {
+            resp_filter(err_BAD_PARAM);
+            return;
+        }
+    } else if (strcmp(rule, "name") == 0) {
+        uint8_t *value;
+        size_t plen = gatt_attr_data_from_string(argvp[2], &value);
+
+        if (plen == 0 || plen > sizeof(scan_filter.name)) {
+            if (plen)
+                g_free(value);
+            resp_filter(err_BAD_PARAM);
+            return;
+        }
+        memcpy(scan_filter.name, value, plen);
+        scan_filter.name_len = plen;
+        g_free(value);
+    } else {
+        resp_filter(err_BAD_PARAM);
+        return;
+    }
+    /* devices accepted with the former advertising data rules are checked again */
+    g_hash_table_remove_all(scan_filter.accepted);
+    scan_filter.active = TRUE;
+    resp_filter(err_SUCCESS);
+}
+
+/*
+ * Deduplication of the scan reports set by the dedup command
+ * A report is forwarded when its payload differs from the last two forwarded
+ * for the address (advertisement and scan response), when the RSSI moved by
+ * rssi_delta or more, or when min_interval has passed since the last one forwarded
+ * The counts are sent every stat_period seconds in a dstat response
+ */
+#define DEDUP_EXPIRY 60     /* seconds without report before an address is forgotten */
+
+struct dedup_entry {
+    guint32 digest[2];
+    int rssi;
+    gint64 forwarded;       /* last report forwarded, us */
+    gint64 seen;            /* last report received, us */
+};
+
+static struct {
+    gboolean active;
+    int rssi_delta;         /* 0: the RSSI changes are not forwarded */
+    gint64 min_interval;    /* us, 0: only the changes are forwarded */
+    guint stat_period;      /* s, 0: no dstat response */
+    guint timer;
+    GHashTable *table;
+    guint forwarded;
+    guint suppressed;
+} scan_dedup;
+
+static guint32 dedup_digest(const uint8_t *data, uint16_t len)
+{
+    /* FNV-1a */
+    guint32 h = 2166136261u;
+    uint16_t i;
+
+    for (i = 0; i < len; i++) {
+        h ^= data[i];
+        h *= 16777619u;
+    }
+    return h;
+}
+
+static gboolean dedup_forward(const bdaddr_t *ba, int rssi, const uint8_t *eir, uint16_t len)
+{
+    gint64 now = g_get_monotonic_time();
+    guint32 digest = dedup_digest(eir, len);
+    gint64 *key = filter_key(ba);
+    struct dedup_entry *entry = g_hash_table_lookup(scan_dedup.table, key);
+
+    if (entry == NULL) {
+        entry = g_new0(struct dedup_entry, 1);
+        entry->digest[0] = entry->digest[1] = digest;
+        g_hash_table_insert(scan_dedup.table, key, entry);
+    } else {
+        g_free(key);
+        if (digest == entry->digest[0] || digest == entry->digest[1]) {
+            gboolean moved = scan_dedup.rssi_delta > 0 && abs(rssi - entry->rssi) >= scan_dedup.rssi_delta;
+            gboolean due = scan_dedup.min_interval > 0 && now - entry->forwarded >= scan_dedup.min_interval;
+
+            entry->seen = now;
+            if (!moved && !due) {
+                scan_dedup.suppressed++;
+                return FALSE;
+            }
+        } else {
+            entry->digest[1] = entry->digest[0];
+            entry->digest[0] = digest;
+        }
+    }
+    entry->rssi = rssi;
+    entry->forwarded = entry->seen = now;
+    scan_dedup.forwarded++;
+    return TRUE;
+}
+
+static gboolean dedup_expired(gpointer key, gpointer value, gpointer user_data)
+{
+    return ((struct dedup_entry *) value)->seen < *(gint64 *) user_data;
+}
+
+static gboolean dedup_timer(gpointer user_data)
+{
+    gint64 limit = g_get_monotonic_time() - (gint64) DEDUP_EXPIRY * 1000000;
+
+    g_hash_table_foreach_remove(scan_dedup.table, dedup_expired, &limit);
+    if (scan_dedup.stat_period && conn_state == STATE_SCANNING) {
+        resp_begin(rsp_DEDUP_STAT);
+        send_uint(tag_FORWARDED, scan_dedup.forwarded);
+        send_uint(tag_SUPPRESSED, scan_dedup.suppressed);
+        send_uint(tag_ENTRIES, g_hash_table_size(scan_dedup.table));
+        resp_end();
+        scan_dedup.forwarded = 0;
+        scan_dedup.suppressed = 0;
+    }
+    return TRUE;
+}
+
+static void dedup_stop(void)
+{
+    if (scan_dedup.timer) {
+        g_source_remove(scan_dedup.timer);
+        scan_dedup.timer = 0;
+    }
+    if (scan_dedup.table) {
+        g_hash_table_destroy(scan_dedup.table);
+        scan_dedup.table = NULL;
+    }
+    scan_dedup.active = FALSE;
+}
+
+static void cmd_dedup(int argcp, char **argvp)
+{
+    int delta, interval, period = 0;
+
+    if (argcp == 2 && strcmp(argvp[1], "off") == 0) {
+        dedup_stop();
+        resp_filter(err_SUCCESS);
+        return;
+    }
+    if (argcp < 3 || argcp > 4
+        || !filter_number(argvp[1], 0, 255, &delta)
+        || !filter_number(argvp[2], 0, 3600000, &interval)
+        || (argcp == 4 && !filter_number(argvp[3], 0, 86400, &period))) {
+        resp_filter(err_BAD_PARAM);
+        return;
+    }
+    dedup_stop();
+    scan_dedup.rssi_delta = delta;
+    scan_dedup.min_interval = (gint64) interval * 1000;
+    scan_dedup.stat_period = period;
+    scan_dedup.forwarded = 0;
+    scan_dedup.suppressed = 0;
+    scan_dedup.table = g_hash_table_new_full(g_int64_hash, g_int64_equal, g_free, g_free);
+    scan_dedup.timer = g_timeout_add_seconds(period ? period : DEDUP_EXPIRY, dedup_timer, NULL);
+    scan_dedup.active = TRUE;
+    resp_filter(err_SUCCESS);
+}
+
 #include "hci.h"
 #include "hci_lib.h"
 
@@ -1735,6 +2503,11 @@ static gboolean hci_monitor_cb(GIOChannel *chan, GIOCondition cond, gpointer use
                                     DBG("buf: %02x", ev->data[i]);
                             }
 
+                            if (scan_filter.active && !filter_match(&addr.bdaddr, (int8_t) rssi, TRUE, ev->data, ev->length))
+                                break;
+                            if (scan_dedup.active && conn_state == STATE_SCANNING
+                                && !dedup_forward(&addr.bdaddr, (int8_t) rssi, ev->data, ev->length))
+                                break;
                             if (conn_state == STATE_SCANNING) {
                                 resp_begin(rsp_SCAN);
                                 send_addr(&addr);
@@ -1897,12 +2670,18 @@ static struct {
         "Characteristics Descriptor Discovery" },
     { "rd",         cmd_read_hnd,   "<handle>",
         "Characteristics Value/Descriptor Read by handle" },
+    { "rdm",        cmd_read_multi, "<handle> <handle> [<handle>...]",
+        "Characteristics Values Read Multiple by handles" },
     { "rdu",        cmd_read_uuid,  "<UUID> [start hnd] [end hnd]",
         "Characteristics Value/Descriptor Read by UUID" },
     { "wrr",        cmd_char_write_rsp, "<handle> [<new value>]",
         "Characteristic Value Write (Write Request)" },
     { "wr",         cmd_char_write, "<handle> [<new value>]",
         "Characteristic Value Write (No response)" },
+    { "wrq",        cmd_char_write_queued, "<handle> <new value> [<handle> <new value>...]",
+        "Characteristic Values Write (Prepared Writes then Execute)" },
+    { "wrs",        cmd_char_write_stream, "<handle> <new value>",
+        "Characteristic Value Write (No response), answered when sent" },
     { "secu",       cmd_sec_level,  "[low | medium | high]",
         "Set security level. Default: low" },
     { "mtu",        cmd_mtu,    "<value>",
@@ -1927,6 +2706,10 @@ static struct {
         "Start passive scan" },
     { "pasvend",    cmd_pasvend,  "",
         "Force passive scan end" },
+    { "filt",       cmd_filter,  "clear | rssi <min> | conn <0|1> | mfg <id> | uuid <uuid16> | name <hex prefix> | addr|addrdel <address>... | addrclr",
+        "Set scan filter rules" },
+    { "dedup",      cmd_dedup,  "off | <rssi delta> <min interval ms> [<stat period s>]",
+        "Forward only the scan reports changed or due" },
     { NULL, NULL, NULL}
 };
 
@@ -2046,6 +2829,13 @@ static void mgmt_device_found(uint16_t index, uint16_t length,
         return;
     //confirm_name(&ev->addr, 1);
 
+    // connectable as seen by the client from the flag sent
+    if (scan_filter.active && !filter_match(&ev->addr.bdaddr, ev->rssi,
+            ((-ev->flags) & MGMT_DEV_FOUND_NOT_CONNECTABLE) == 0, ev->eir, ev->eir_len))
+        return;
+    if (scan_dedup.active && !dedup_forward(&ev->addr.bdaddr, ev->rssi, ev->eir, ev->eir_len))
+        return;
+
     resp_begin(rsp_SCAN);
     send_addr(&ev->addr);
     send_uint(tag_RSSI, -ev->rssi);
@@ -2096,6 +2886,7 @@ int main(int argc, char *argv[])
 {
     GIOChannel *pchan;
     gint events;
+    const char *framing;
 
     opt_sec_level = g_strdup("low");
 
@@ -2105,6 +2896,14 @@ int main(int argc, char *argv[])
 
     printf("# " __FILE__ " version " VERSION_STRING " built at " __TIME__ " on " __DATE__ "\n");
 
+    framing = getenv("BLUEPY_FRAMING");
+    if (framing != NULL && strcmp(framing, "binary") == 0) {
+        opt_binary = 1;
+        frame = g_byte_array_sized_new(512);
+    }
+    printf("# framing %s\n", opt_binary ? "binary" : "text");
+    fflush(stdout);
+
     if (argc > 1) {
         int index;
 
@@ -2138,6 +2937,8 @@ int main(int argc, char *argv[])
     g_free(opt_src);
     g_free(opt_dst);
     g_free(opt_sec_level);
+    if (frame != NULL)
+        g_byte_array_free(frame, TRUE);
 
     mgmt_unregister_index(mgmt_master, mgmt_ind);
     mgmt_cancel_index(mgmt_master, mgmt_ind);
@@ -1 +1 @@
-#define VERSION_STRING "1.3.1 - SolidSense"
+#define VERSION_STRING "1.9.0 - SolidSense"